@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark emitting events with an EventEmitter, for several numbers of
+connected callbacks, with and without reusing the event instance.
+
+Usage: python event_emit.py [number]
+"""
+
+import sys
+import timeit
+
+from vispy.util.event import EventEmitter
+
+
+def time_emit(n_callbacks, reuse_events=False, number=10000):
+    """ Get the time per emit in seconds (the best of three runs).
+    """
+    em = EventEmitter(type='test_event', reuse_events=reuse_events)
+    for i in range(n_callbacks):
+        em.connect(lambda ev: None)  # distinct callbacks
+    return min(timeit.repeat(em, number=number, repeat=3)) / number
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for n_callbacks in (0, 1, 5):
+        for reuse_events in (False, True):
+            t = time_emit(n_callbacks, reuse_events, number)
+            print('%i callbacks%s: %0.2f us per emit'
+                  % (n_callbacks, ', reusing events' if reuse_events else '',
+                     1e6 * t))
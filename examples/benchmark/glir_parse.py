@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark the GLIR parser by replaying a recorded GLIR stream against
+the "stub" gl backend, so that no GPU is needed.
+
+A stream can be recorded with any vispy application by setting the
+``glir_file`` config option (e.g. ``python app.py --vispy-glir-file=x``),
+or in the binary format (files ending with ".glir") by attaching a
+``vispy.gloo.glir_stream.GlirWriter`` to a canvas. If no file is given,
+a synthetic stream is recorded first.
+
+Usage: python glir_parse.py [glir_file] [repeats]
+"""
+
+import sys
+import re
+import json
+import base64
+import tempfile
+from time import time
+
+import numpy as np
+
+from vispy import config, gloo
+from vispy.gloo import gl
+from vispy.gloo.context import FakeCanvas
+from vispy.gloo.glir import GlirParser
+from vispy.gloo.glir_stream import GlirReader
+
+vert = """
+uniform float u_scale;
+uniform vec4 u_color;
+attribute vec2 a_position;
+varying vec4 v_color;
+void main() {
+    v_color = u_color;
+    gl_Position = vec4(a_position * u_scale, 0.0, 1.0);
+}
+"""
+
+frag = """
+varying vec4 v_color;
+void main() {
+    gl_FragColor = v_color;
+}
+"""
+
+
+def record(filename, n_programs=200, n_frames=20):
+    """ Record a synthetic GLIR stream of many small programs.
+    """
+    config.update(glir_file=filename)
+    try:
+        canvas = FakeCanvas()
+    finally:
+        config.update(glir_file='')
+    programs = []
+    for i in range(n_programs):
+        program = gloo.Program(vert, frag)
+        program['a_position'] = np.random.rand(100, 2).astype(np.float32)
+        programs.append(program)
+    for frame in range(n_frames):
+        canvas.context.set_state(blend=True, depth_test=False)
+        canvas.context.clear()
+        for i, program in enumerate(programs):
+            program['u_scale'] = 1.0 + frame * 0.01
+            program['u_color'] = (i / float(n_programs), 0.0, 0.0, 1.0)
+            program.draw('line_strip')
+    canvas.context.finish()
+    canvas.context.shared.parser._file.close()
+
+
+def load(filename):
+    """ Load a binary GLIR stream, or a stream written by glir_logger
+    (in which case its conversions to JSON are undone).
+    """
+    if filename.endswith('.glir'):
+        return [command for commands in GlirReader(filename)
+                for command in commands]
+    with open(filename) as f:
+        commands = json.load(f)
+    texture_shapes = {}
+    for i, command in enumerate(commands):
+        cmd = command[0]
+        if cmd == 'FUNC':
+            command[1] = re.sub(r'^([a-z])', lambda m: 'gl' +
+                                m.group(1).upper(), command[1])
+        elif cmd == 'UNIFORM':
+            dtype = np.float32
+            if re.match(r'(int|ivec|bool|bvec|sampler)', command[3]):
+                dtype = np.int32
+            command[4] = np.array(command[4], dtype)
+        elif cmd == 'SIZE' and isinstance(command[2], list):
+            texture_shapes[command[1]] = command[2]
+        elif cmd == 'DATA':
+            data = base64.b64decode(command[3]['buffer'])
+            data = np.frombuffer(data, np.uint8)
+            shape = texture_shapes.get(command[1], None)
+            if shape is not None:
+                n = int(np.prod(shape[1:]))
+                if data.size // n > shape[0]:
+                    data = data.view(np.float32)
+                data = data.reshape((-1,) + tuple(shape[1:]))
+            command[3] = data
+        commands[i] = tuple(command)
+    return commands
+
+
+def benchmark(commands, repeats=10):
+    """ Parse the commands repeatedly and report the best time.
+    """
+    gl.use_gl('stub')
+    try:
+        parser = GlirParser()
+        parser.parse(commands)  # warm up
+        times = []
+        for i in range(repeats):
+            t0 = time()
+            parser.parse(commands)
+            times.append(time() - t0)
+    finally:
+        gl.use_gl()
+    t = min(times)
+    print('Parsed %i commands in %0.1f ms (best of %i, %0.2f us per command)'
+          % (len(commands), 1000 * t, repeats, 1e6 * t / len(commands)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    else:
+        filename = tempfile.mktemp('.json')
+        gl.use_gl('stub')
+        try:
+            record(filename)
+        finally:
+            gl.use_gl()
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    benchmark(load(filename), repeats)
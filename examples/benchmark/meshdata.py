@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark the conversions of MeshData on a large generated mesh: welding
+the vertices of a mesh that is given as three vertices per face, the
+vertex-face adjacency, and the vertex normals.
+
+Usage: python meshdata.py [n]
+
+The mesh is a grid of n x n quads, i.e. 2 * n * n triangles (2M for the
+default n=1000).
+"""
+
+import sys
+from time import time
+
+import numpy as np
+
+from vispy.geometry import MeshData
+
+
+def make_grid(n):
+    """ Make a wavy grid of n x n quads, as (Nf, 3, 3) array of vertices.
+    """
+    x, y = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(0, 1, n + 1))
+    z = 0.1 * np.sin(10 * x) * np.cos(10 * y)
+    verts = np.concatenate([x[..., np.newaxis], y[..., np.newaxis],
+                            z[..., np.newaxis]], axis=-1).astype(np.float32)
+    i = np.arange(n)
+    a = (i[:, np.newaxis] * (n + 1) + i).ravel()  # lower left corners
+    faces = np.concatenate([np.array([a, a + 1, a + n + 2]).T,
+                            np.array([a, a + n + 2, a + n + 1]).T])
+    return verts.reshape(-1, 3)[faces]
+
+
+def benchmark(n):
+    vertices = make_grid(n)
+    print('Mesh of %i triangles' % len(vertices))
+    mesh = MeshData(vertices=vertices)
+    t0 = time()
+    mesh.get_vertices()
+    t1 = time()
+    mesh.get_vertex_face_adjacency()
+    t2 = time()
+    mesh.get_vertex_normals()
+    t3 = time()
+    mesh.get_vertex_faces()
+    t4 = time()
+    print('Weld %i vertices: %0.2f s' % (mesh.n_vertices, t1 - t0))
+    print('Vertex-face adjacency: %0.2f s' % (t2 - t1))
+    print('Vertex normals: %0.2f s' % (t3 - t2))
+    print('Vertex faces as lists: %0.2f s' % (t4 - t3))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark drawing a static scenegraph with and without the retained draw
+list of the DrawingSystem. The "stub" gl backend is used, so that only
+the time spent in the scenegraph is measured (no GPU is needed).
+
+Usage: python scene_draw_list.py [n_groups] [n_children] [frames]
+"""
+
+import sys
+from time import time
+
+from vispy.gloo import gl
+from vispy.gloo.context import FakeCanvas
+from vispy.scene import Node
+from vispy.scene.subscene import SubScene
+from vispy.scene.events import SceneDrawEvent
+from vispy.visuals.transforms import STTransform
+
+
+def make_scene(n_groups, n_children):
+    scene = SubScene()
+    for i in range(n_groups):
+        group = Node(parent=scene)
+        group.transform = STTransform(translate=(i, 0))
+        for j in range(n_children):
+            node = Node(parent=group)
+            node.transform = STTransform(scale=(j + 1, 1))
+    return scene
+
+
+def benchmark(canvas, scene, retained, frames):
+    scene._systems['draw'].retained = retained
+    times = []
+    for i in range(frames):
+        t0 = time()
+        event = SceneDrawEvent(None, canvas)
+        event.push_node(scene)
+        scene.draw(event)
+        event.pop_node()
+        canvas.flush()
+        times.append(time() - t0)
+    return min(times)
+
+
+if __name__ == '__main__':
+    n_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_children = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    frames = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.dpi = 96
+        scene = make_scene(n_groups, n_children)
+        n = n_groups * (n_children + 1) + 1
+        for retained in (False, True):
+            t = benchmark(canvas, scene, retained, frames)
+            print('%s: %i nodes drawn in %0.1f ms (best of %i frames)'
+                  % ('Retained' if retained else 'Immediate', n, 1000 * t,
+                     frames))
+    finally:
+        gl.use_gl()
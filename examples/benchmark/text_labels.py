@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark drawing many text labels with a single TextVisual, while one
+label per frame is changed.
+
+Usage: python text_labels.py [n]
+"""
+import sys
+from time import time
+
+import numpy as np
+
+from vispy import app, gloo, visuals
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+class Canvas(app.Canvas):
+    def __init__(self):
+        app.Canvas.__init__(self, size=(800, 800), keys='interactive',
+                            title='%i text labels' % n)
+        pos = np.random.uniform(0, 800, (n, 2))
+        texts = ['label %05i' % i for i in range(n)]
+        self.text = visuals.TextVisual(texts, pos=pos, font_size=6,
+                                       color=np.random.uniform(size=(n, 3)))
+        self.tr_sys = visuals.transforms.TransformSystem(self)
+        self._count = 0
+
+    def on_draw(self, event):
+        gloo.clear('white')
+        gloo.set_viewport(0, 0, *self.size)
+        t0 = time()
+        self.text.draw(self.tr_sys)
+        if self._count == 0:
+            print('First draw (layout of %i labels): %0.3f s'
+                  % (n, time() - t0))
+        self._count += 1
+        self.text.set_labels(self._count % n,
+                             text='label %05i' % (self._count % 100000))
+        self.update()
+
+
+if __name__ == '__main__':
+    canvas = Canvas()
+    canvas.show()
+    canvas.measure_fps()
+    if sys.flags.interactive == 0:
+        app.run()
@@ -15,4 +15,5 @@ from ._default_app import use_app, create, run, quit, process_events  # noqa
 from .canvas import Canvas, MouseEvent, KeyEvent  # noqa
 from .inputhook import set_interactive  # noqa
 from .timer import Timer  # noqa
+from .scheduler import FrameScheduler, FrameStats  # noqa
 from . import base  # noqa
@@ -46,6 +46,7 @@ class Application(object):
     def __init__(self, backend_name=None):
         self._backend_module = None
         self._backend = None
+        self._frame_scheduler = None
         self._use(backend_name)
 
     def __repr__(self):
@@ -141,6 +142,49 @@ class Application(object):
         """
         return self._backend._vispy_get_native_app()
 
+    @property
+    def frame_scheduler(self):
+        """ The FrameScheduler that coalesces the redraws of the canvases
+        of this app, or None if canvases are redrawn whenever they are
+        updated. See `use_frame_scheduler()`.
+        """
+        return self._frame_scheduler
+
+    def use_frame_scheduler(self, fps=60., idle=True):
+        """ Coalesce the redraw requests of the canvases of this app.
+
+        With a frame scheduler, each canvas is redrawn at most once per
+        frame interval, however often ``Canvas.update()`` is called.
+
+        Parameters
+        ----------
+        fps : float | None
+            The maximum number of frames per second of each canvas. If None,
+            the scheduler is removed and canvases are redrawn whenever they
+            are updated.
+        idle : bool
+            If True, canvases are only redrawn after they are updated. If
+            False, canvases are redrawn at every frame once they have been
+            updated, e.g. for animations.
+
+        Returns
+        -------
+        scheduler : instance of FrameScheduler | None
+            The scheduler, which also gives the frame timing statistics of
+            each canvas.
+        """
+        from .scheduler import FrameScheduler
+        if fps is None:
+            if self._frame_scheduler is not None:
+                self._frame_scheduler.close()
+            self._frame_scheduler = None
+        elif self._frame_scheduler is None:
+            self._frame_scheduler = FrameScheduler(self, fps, idle)
+        else:
+            self._frame_scheduler.fps = fps
+            self._frame_scheduler.idle = idle
+        return self._frame_scheduler
+
     def _use(self, backend_name=None):
         """Select a backend by name. See class docstring for details.
         """
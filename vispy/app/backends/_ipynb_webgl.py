@@ -213,9 +213,7 @@ class CanvasBackend(BaseCanvasBackend):
         # HACK: override this method from the base canvas in order to
         # avoid breaking other backends.
         kwargs.update(self._vispy_mouse_data)
-        ev = self._vispy_canvas.events.mouse_release(**kwargs)
-        if ev is None:
-            return
+        ev = self._vispy_canvas.events.mouse_release.emit(**kwargs)
         self._vispy_mouse_data['press_event'] = None
         # TODO: this is a bit ugly, need to improve mouse button handling in
         # app
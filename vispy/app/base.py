@@ -162,7 +162,9 @@ class BaseCanvasBackend(object):
     def _vispy_mouse_press(self, **kwargs):
         # default method for delivering mouse press events to the canvas
         kwargs.update(self._vispy_mouse_data)
-        ev = self._vispy_canvas.events.mouse_press(**kwargs)
+        # Use emit() because emitters do not create events when nothing
+        # is connected, and we need it for tracking the mouse state
+        ev = self._vispy_canvas.events.mouse_press.emit(**kwargs)
         if self._vispy_mouse_data['press_event'] is None:
             self._vispy_mouse_data['press_event'] = ev
 
@@ -184,7 +186,7 @@ class BaseCanvasBackend(object):
         else:
             kwargs['button'] = self._vispy_mouse_data['press_event'].button
 
-        ev = self._vispy_canvas.events.mouse_move(**kwargs)
+        ev = self._vispy_canvas.events.mouse_move.emit(**kwargs)
         self._vispy_mouse_data['last_event'] = ev
         return ev
 
@@ -192,7 +194,7 @@ class BaseCanvasBackend(object):
         # default method for delivering mouse release events to the canvas
 
         kwargs.update(self._vispy_mouse_data)
-        ev = self._vispy_canvas.events.mouse_release(**kwargs)
+        ev = self._vispy_canvas.events.mouse_release.emit(**kwargs)
         if (self._vispy_mouse_data['press_event'] 
                 and self._vispy_mouse_data['press_event'].button == ev.button):
             self._vispy_mouse_data['press_event'] = None
@@ -398,9 +398,18 @@ class Canvas(object):
             self.app.run()
 
     def update(self, event=None):
-        """Inform the backend that the Canvas needs to be redrawn"""
+        """Inform the backend that the Canvas needs to be redrawn
+
+        If the app uses a frame scheduler (see
+        ``Application.use_frame_scheduler()``), the redraw is postponed
+        until the next frame, and merged with other updates.
+        """
         if self._backend is not None:
-            self._backend._vispy_update()
+            scheduler = self._app.frame_scheduler
+            if scheduler is None:
+                self._backend._vispy_update()
+            else:
+                scheduler.request(self)
 
     def close(self):
         """Close the canvas
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Scheduling of the redraws of canvases, so that many update requests
+result in a single draw per frame.
+"""
+
+from __future__ import division
+
+import weakref
+
+from ..util.ptime import time as precision_time
+from .timer import Timer
+
+
+class FrameStats(object):
+    """Frame timing statistics of a canvas
+
+    Attributes
+    ----------
+    n_frames : int
+        The number of frames that have been drawn.
+    dropped_frames : int
+        The number of frames that were missed, because the canvas was still
+        waiting for its previous draw at a frame, or because a draw took
+        longer than the frame interval.
+    total_draw_time : float
+        The total time spent in draw events, in seconds.
+    max_draw_time : float
+        The longest draw event, in seconds.
+    last_draw_time : float
+        The duration of the last draw event, in seconds.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Set all statistics to zero"""
+        self.n_frames = 0
+        self.dropped_frames = 0
+        self.total_draw_time = 0.
+        self.max_draw_time = 0.
+        self.last_draw_time = 0.
+
+    @property
+    def mean_draw_time(self):
+        """The mean duration of the draw events, in seconds"""
+        return self.total_draw_time / max(self.n_frames, 1)
+
+    def __repr__(self):
+        return ('<FrameStats: %d frames, %d dropped, %0.2f ms per draw>'
+                % (self.n_frames, self.dropped_frames,
+                   1000 * self.mean_draw_time))
+
+
+class _CanvasFrames(object):
+    # The scheduling state of one canvas
+    def __init__(self):
+        self.pending = False  # waiting for the next frame
+        self.dispatched = False  # backend asked to draw, draw not started
+        self.last_dispatch = -1e9
+        self.draw_start = None
+        self.stats = FrameStats()
+
+
+class FrameScheduler(object):
+    """Coalesce the redraw requests of canvases into frames
+
+    When an application uses a frame scheduler, ``Canvas.update()`` does
+    not ask the backend to redraw right away. Instead, each canvas is asked
+    to redraw at most once per frame interval, no matter how often it is
+    updated, and requests that arrive before a pending draw has started are
+    merged into that draw. The frames of all canvases of the application are
+    driven by a single Timer.
+
+    Use ``Application.use_frame_scheduler()`` to create one.
+
+    Parameters
+    ----------
+    app : instance of Application
+        The application of the canvases.
+    fps : float
+        The maximum number of frames per second of each canvas.
+    idle : bool
+        If True, canvases are only redrawn after they are updated, and the
+        timer only runs while redraws are pending. If False, every canvas
+        that has been updated once is redrawn at each frame.
+    """
+
+    def __init__(self, app, fps=60., idle=True):
+        self._app = app
+        self._timer = None
+        self._canvases = weakref.WeakKeyDictionary()
+        self._fps = None
+        self._idle = True
+        self.fps = fps
+        self.idle = idle
+
+    @property
+    def fps(self):
+        """The maximum number of frames per second of each canvas"""
+        return self._fps
+
+    @fps.setter
+    def fps(self, fps):
+        fps = float(fps)
+        if fps <= 0:
+            raise ValueError('fps must be positive, not %s' % fps)
+        self._fps = fps
+        if self._timer is not None:
+            self._timer.interval = 1. / fps
+
+    @property
+    def idle(self):
+        """Whether canvases are only redrawn after they are updated"""
+        return self._idle
+
+    @idle.setter
+    def idle(self, idle):
+        self._idle = bool(idle)
+        if not self._idle and len(self._canvases) > 0:
+            self._start()
+
+    @property
+    def canvases(self):
+        """The canvases that are handled by this scheduler"""
+        return list(self._canvases.keys())
+
+    def stats(self, canvas):
+        """Get the frame timing statistics of a canvas
+
+        Parameters
+        ----------
+        canvas : instance of Canvas
+            The canvas.
+
+        Returns
+        -------
+        stats : instance of FrameStats | None
+            The statistics, or None if the canvas has never been updated
+            through this scheduler.
+        """
+        state = self._canvases.get(canvas)
+        return None if state is None else state.stats
+
+    def request(self, canvas):
+        """Request a redraw of a canvas
+
+        The backend is asked to redraw the canvas right away if its last
+        frame was at least one frame interval ago, and at the next frame
+        otherwise.
+
+        Parameters
+        ----------
+        canvas : instance of Canvas
+            The canvas to redraw.
+        """
+        if canvas._closed:
+            return
+        state = self._canvases.get(canvas)
+        if state is None:
+            state = self._add(canvas)
+        if state.dispatched or state.pending:
+            return  # the coming draw will show this change too
+        now = precision_time()
+        if now - state.last_dispatch >= 1. / self._fps:
+            self._dispatch(canvas, state, now)
+        else:
+            state.pending = True
+            self._start()
+
+    def close(self):
+        """Stop scheduling, and redraw the canvases that are waiting"""
+        self._stop()
+        for canvas, state in list(self._canvases.items()):
+            self._remove(canvas)
+            if state.pending and not canvas._closed:
+                canvas._backend._vispy_update()
+
+    def _add(self, canvas):
+        state = _CanvasFrames()
+        self._canvases[canvas] = state
+        canvas.events.draw.connect(self._on_draw_start, position='first')
+        canvas.events.draw.connect(self._on_draw_end, position='last')
+        canvas.events.close.connect(self._on_close)
+        if not self._idle:
+            self._start()
+        return state
+
+    def _remove(self, canvas):
+        self._canvases.pop(canvas, None)
+        canvas.events.draw.disconnect(self._on_draw_start)
+        canvas.events.draw.disconnect(self._on_draw_end)
+        canvas.events.close.disconnect(self._on_close)
+
+    def _dispatch(self, canvas, state, now):
+        state.pending = False
+        state.dispatched = True
+        state.last_dispatch = now
+        canvas._backend._vispy_update()
+
+    def _start(self):
+        if self._timer is None:
+            self._timer = Timer(1. / self._fps, connect=self._tick,
+                                app=self._app)
+        self._timer.start()
+
+    def _stop(self):
+        if self._timer is not None and self._timer.running:
+            self._timer.stop()
+
+    def _tick(self, event=None):
+        # Called by the timer at each frame
+        now = precision_time()
+        waiting = False
+        for canvas, state in list(self._canvases.items()):
+            if canvas._closed:
+                self._remove(canvas)
+            elif state.dispatched:
+                # still waiting for the draw of an earlier frame
+                if not self._idle:
+                    state.stats.dropped_frames += 1
+            elif state.pending or not self._idle:
+                self._dispatch(canvas, state, now)
+                waiting = True
+        # When idle, new updates restart the timer
+        if (self._idle and not waiting) or len(self._canvases) == 0:
+            self._stop()
+
+    def _on_draw_start(self, event):
+        state = self._canvases.get(event.source)
+        if state is not None:
+            # Updates from now on need another draw
+            state.dispatched = False
+            state.draw_start = precision_time()
+
+    def _on_draw_end(self, event):
+        state = self._canvases.get(event.source)
+        if state is None or state.draw_start is None:
+            return
+        stats = state.stats
+        draw_time = precision_time() - state.draw_start
+        state.draw_start = None
+        stats.n_frames += 1
+        stats.last_draw_time = draw_time
+        stats.total_draw_time += draw_time
+        stats.max_draw_time = max(stats.max_draw_time, draw_time)
+        stats.dropped_frames += int(draw_time * self._fps)
+
+    def _on_close(self, event):
+        self._remove(event.source)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from time import sleep
+
+from vispy.app import Canvas, FrameScheduler, use_app
+from vispy.util.event import EmitterGroup, Event
+from vispy.util.ptime import time
+from vispy.testing import (requires_application, run_tests_if_main,
+                           assert_equal, assert_raises)
+
+
+class _Timer(object):
+    # Stands in for a Timer, so that frames are made by calling _tick
+    running = False
+    interval = None
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class _Backend(object):
+    def __init__(self):
+        self.n_updates = 0
+
+    def _vispy_update(self):
+        self.n_updates += 1
+
+
+class _Canvas(object):
+    def __init__(self):
+        self.events = EmitterGroup(source=self, draw=Event, close=Event)
+        self._backend = _Backend()
+        self._closed = False
+
+    def draw(self):
+        self.events.draw()
+
+
+def test_frame_scheduler():
+    """Test coalescing of redraw requests"""
+    assert_raises(ValueError, FrameScheduler, None, fps=0)
+    scheduler = FrameScheduler(None, fps=50.)
+    scheduler._timer = timer = _Timer()
+    c1, c2 = _Canvas(), _Canvas()
+    # The first request is sent to the backend right away, later ones are
+    # merged into the draw that is still to come
+    for i in range(100):
+        scheduler.request(c1)
+        scheduler.request(c2)
+    assert_equal(c1._backend.n_updates, 1)
+    assert_equal(c2._backend.n_updates, 1)
+    assert not timer.running
+    assert_equal(len(scheduler.canvases), 2)
+    c1.draw()
+    c2.draw()
+    stats = scheduler.stats(c1)
+    assert_equal(stats.n_frames, 1)
+    assert 0 <= stats.max_draw_time < 0.02
+    # Requests within a frame interval of the last one wait for the timer
+    for i in range(100):
+        scheduler.request(c1)
+    assert_equal(c1._backend.n_updates, 1)
+    assert timer.running
+    scheduler._tick()
+    assert_equal(c1._backend.n_updates, 2)
+    assert_equal(c2._backend.n_updates, 1)
+    scheduler._tick()  # nothing to do, so the timer stops
+    assert not timer.running
+    c1.draw()
+    # A request after a frame interval is sent right away
+    sleep(0.03)
+    scheduler.request(c1)
+    assert_equal(c1._backend.n_updates, 3)
+    assert_equal(stats.n_frames, 2)
+    assert_equal(stats.dropped_frames, 0)
+
+    # Redraw at every frame
+    scheduler.idle = False
+    assert timer.running
+    c1.draw()
+    c2.draw()
+    scheduler._tick()
+    assert_equal(c1._backend.n_updates, 4)
+    assert_equal(c2._backend.n_updates, 2)
+    # c1 could not keep up
+    c2.draw()
+    scheduler._tick()
+    assert_equal(c1._backend.n_updates, 4)
+    assert_equal(c2._backend.n_updates, 3)
+    assert_equal(stats.dropped_frames, 1)
+    assert_equal(scheduler.stats(c2).dropped_frames, 0)
+
+    # Closed canvases are forgotten
+    c2._closed = True
+    c2.events.close()
+    assert_equal(scheduler.canvases, [c1])
+    assert scheduler.stats(c2) is None
+    scheduler.request(c2)
+    assert_equal(c2._backend.n_updates, 3)
+    # Pending requests are sent when the scheduler is closed
+    scheduler.idle = True
+    c1.draw()
+    scheduler.request(c1)
+    scheduler.close()
+    assert not timer.running
+    assert_equal(c1._backend.n_updates, 5)
+    assert_equal(scheduler.canvases, [])
+
+
+@requires_application()
+def test_frame_scheduler_app():
+    """Test frame scheduler with an application"""
+    app = use_app()
+    scheduler = app.use_frame_scheduler(fps=20.)
+    try:
+        assert app.frame_scheduler is scheduler
+        with Canvas(size=(100, 100), show=True, app=app) as c:
+            n_draws = [0]
+
+            @c.connect
+            def on_draw(event):
+                n_draws[0] += 1
+
+            app.process_events()
+            t0 = time()
+            while time() - t0 < 0.5:
+                c.update()
+                app.process_events()
+            # at most 20 FPS, plus some slack for the drawing by the backend
+            assert 1 < n_draws[0] < 14
+            assert scheduler.stats(c).n_frames > 0
+    finally:
+        app.use_frame_scheduler(None)
+    assert app.frame_scheduler is None
+
+
+run_tests_if_main()
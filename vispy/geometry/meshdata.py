@@ -4,8 +4,6 @@
 
 import numpy as np
 
-from ..ext.six.moves import xrange
-
 
 def _fix_colors(colors):
     colors = np.asarray(colors)
@@ -74,7 +72,8 @@ class MeshData(object):
         self._edges_indexed_by_faces = None  # (Ne, 3, 2) indices into
         # self._vertices, 3 edge / face and 2 verts/edge
         # inverse mappings
-        self._vertex_faces = None  # maps vertex ID to a list of face IDs
+        self._vertex_faces = None  # (offsets, face IDs) of each vertex ID
+        self._vertex_faces_lists = None  # maps vertex ID to list of face IDs
         self._vertex_edges = None  # maps vertex ID to a list of edge IDs
 
         # Per-vertex data
@@ -142,6 +141,7 @@ class MeshData(object):
         self._edges = None
         self._edges_indexed_by_faces = None
         self._vertex_faces = None
+        self._vertex_faces_lists = None
         self._vertices_indexed_by_faces = None
         self.reset_normals()
         self._vertex_colors_indexed_by_faces = None
@@ -263,18 +263,16 @@ class MeshData(object):
         """
         if self._vertex_normals is None:
             faceNorms = self.get_face_normals()
-            vertFaces = self.get_vertex_faces()
-            self._vertex_normals = np.empty(self._vertices.shape,
-                                            dtype=np.float32)
-            for vindex in xrange(self._vertices.shape[0]):
-                faces = vertFaces[vindex]
-                if len(faces) == 0:
-                    self._vertex_normals[vindex] = (0, 0, 0)
-                    continue
-                norms = faceNorms[faces]  # get all face normals
-                norm = norms.sum(axis=0)  # sum normals
-                norm /= (norm**2).sum()**0.5  # and re-normalize
-                self._vertex_normals[vindex] = norm
+            offsets, faces = self.get_vertex_face_adjacency()
+            # sum the normals of the faces of each vertex
+            used = offsets[:-1] < offsets[1:]
+            norms = np.zeros(self._vertices.shape, dtype=faceNorms.dtype)
+            if len(faces):
+                norms[used] = np.add.reduceat(faceNorms[faces],
+                                              offsets[:-1][used], axis=0)
+            # and re-normalize; vertices without faces get (0, 0, 0)
+            norms[used] /= ((norms[used]**2).sum(axis=1)**0.5)[:, np.newaxis]
+            self._vertex_normals = norms.astype(np.float32)
 
         if indexed is None:
             return self._vertex_normals
@@ -404,41 +402,57 @@ class MeshData(object):
 
         # I think generally this should be discouraged..
         faces = self._vertices_indexed_by_faces
-        verts = {}  # used to remember the index of each vertex position
-        self._faces = np.empty(faces.shape[:2], dtype=np.uint32)
-        self._vertices = []
-        self._vertex_faces = []
+        pts = faces.reshape(-1, faces.shape[-1])
+        # quantize to ensure nearly-identical points will be merged (adding
+        # zero turns -0.0 into 0.0), and view each point as one value
+        quantized = np.round(pts.astype(np.float64) * 1e14) + 0.0
+        quantized = np.ascontiguousarray(quantized)
+        keys = quantized.view(np.dtype((np.void, quantized.strides[0])))
+        _, first, inverse = np.unique(keys.ravel(), return_index=True,
+                                      return_inverse=True)
+        # number the vertices in order of first appearance
+        order = np.argsort(first)
+        rank = np.empty(len(first), dtype=np.uint32)
+        rank[order] = np.arange(len(first))
+        self._faces = rank[inverse].reshape(faces.shape[:2])
+        self._vertices = np.array(pts[first[order]], dtype=np.float32)
+        self._vertex_faces = None
+        self._vertex_faces_lists = None
         self._face_normals = None
         self._vertex_normals = None
-        for i in xrange(faces.shape[0]):
-            face = faces[i]
-            for j in range(face.shape[0]):
-                pt = face[j]
-                # quantize to ensure nearly-identical points will be merged
-                pt2 = tuple([round(x*1e14) for x in pt])
-                index = verts.get(pt2, None)
-                if index is None:
-                    self._vertices.append(pt)
-                    self._vertex_faces.append([])
-                    index = len(self._vertices)-1
-                    verts[pt2] = index
-                # track which vertices belong to which faces
-                self._vertex_faces[index].append(i)
-                self._faces[i, j] = index
-        self._vertices = np.array(self._vertices, dtype=np.float32)
 
-    def get_vertex_faces(self):
+    def get_vertex_face_adjacency(self):
         """
-        List mapping each vertex index to a list of face indices that use it.
+        Return the faces that use each vertex, in compressed form.
+
+        Returns
+        -------
+        offsets : ndarray, shape (Nv + 1,)
+            The faces of vertex i are ``faces[offsets[i]:offsets[i + 1]]``.
+        faces : ndarray, shape (3 * Nf,)
+            Face indices, grouped by vertex, in increasing order per vertex.
         """
         if self._vertex_faces is None:
-            self._vertex_faces = [[] for i in xrange(len(self.get_vertices()))]
-            for i in xrange(self._faces.shape[0]):
-                face = self._faces[i]
-                for ind in face:
-                    self._vertex_faces[ind].append(i)
+            n_vertices = len(self.get_vertices())
+            corners = np.asarray(self._faces).ravel().astype(np.intp)
+            # a stable sort keeps the faces of each vertex in order
+            faces = np.argsort(corners, kind='mergesort') // 3
+            offsets = np.zeros(n_vertices + 1, dtype=np.intp)
+            np.cumsum(np.bincount(corners, minlength=n_vertices),
+                      out=offsets[1:])
+            self._vertex_faces = offsets, faces
         return self._vertex_faces
 
+    def get_vertex_faces(self):
+        """
+        List mapping each vertex index to a list of face indices that use it.
+        """
+        if self._vertex_faces_lists is None:
+            offsets, faces = self.get_vertex_face_adjacency()
+            self._vertex_faces_lists = [
+                f.tolist() for f in np.split(faces, offsets[1:-1])]
+        return self._vertex_faces_lists
+
     def _compute_edges(self, indexed=None):
         if indexed is None:
             if self._faces is not None:
@@ -3,7 +3,7 @@
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
 
 import numpy as np
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_equal, assert_allclose
 
 from vispy.testing import run_tests_if_main
 from vispy.geometry.meshdata import MeshData
@@ -31,4 +31,50 @@ def test_meshdata():
     assert_array_equal(square_edges, mesh.get_edges())
 
 
+def test_meshdata_indexed_by_faces():
+    """Test welding of vertices and the vertex-face adjacency"""
+    rng = np.random.RandomState(0)
+    vertices = rng.randn(50, 3).astype(np.float32)
+    vertices[0] = 0  # not used by any face
+    faces = np.array([rng.permutation(np.arange(1, 50))[:3]
+                      for i in range(80)], dtype=np.uint32)
+    indexed = vertices[faces]
+    indexed[0, 0] += 1e-16  # merged with the same vertex
+
+    mesh = MeshData(vertices=indexed)
+    # vertices are numbered in order of appearance
+    order = []
+    for i in faces.ravel():
+        if i not in order:
+            order.append(i)
+    rank = np.zeros(50, np.uint32)
+    rank[order] = np.arange(len(order))
+    assert_array_equal(mesh.get_vertices(), vertices[order])
+    assert_array_equal(mesh.get_faces(), rank[faces])
+
+    # the faces of each vertex, in both forms
+    mesh = MeshData(vertices=vertices, faces=faces)
+    vertex_faces = [[] for i in range(50)]
+    for i, face in enumerate(faces):
+        for j in face:
+            vertex_faces[j].append(i)
+    assert mesh.get_vertex_faces() == vertex_faces
+    offsets, adjacent = mesh.get_vertex_face_adjacency()
+    assert_array_equal(offsets[0:2], [0, 0])
+    for i in range(50):
+        assert_array_equal(adjacent[offsets[i]:offsets[i + 1]],
+                           vertex_faces[i])
+
+    # vertex normals are the normalized sum of the face normals
+    face_normals = mesh.get_face_normals()
+    normals = mesh.get_vertex_normals()
+    for i in range(50):
+        if not vertex_faces[i]:
+            assert_array_equal(normals[i], [0, 0, 0])
+            continue
+        norm = face_normals[vertex_faces[i]].sum(axis=0)
+        assert_allclose(normals[i], norm / (norm ** 2).sum() ** 0.5,
+                        rtol=1e-5, atol=1e-6)
+
+
 run_tests_if_main()
@@ -49,7 +49,7 @@ from .wrappers import *  # noqa
 from .context import (GLContext, get_default_config,  # noqa
                       get_current_canvas)  # noqa
 from .globject import GLObject  # noqa
-from .buffer import VertexBuffer, IndexBuffer  # noqa
+from .buffer import VertexBuffer, IndexBuffer, StreamBuffer  # noqa
 from .texture import Texture1D, Texture2D, TextureAtlas, Texture3D, TextureEmulated3D  # noqa
 from .program import Program  # noqa
 from .framebuffer import FrameBuffer, RenderBuffer  # noqa
@@ -147,14 +147,28 @@ class DataBuffer(Buffer):
         Base buffer of this buffer
     offset : int
         Byte offset of this buffer relative to base buffer
+    shadow : bool
+        Keep a copy of the data on the CPU, so that only the parts of
+        the data that actually change are uploaded (default False). In
+        this mode, writes mark byte ranges as dirty, and the dirty
+        ranges are merged and uploaded when the commands are flushed.
     """
 
-    def __init__(self, data=None):
+    # Dirty ranges that are less than this many bytes apart are uploaded
+    # as one range, because each upload has a fixed overhead.
+    _merge_gap = 1024
+
+    def __init__(self, data=None, shadow=False):
         self._size = 0  # number of elements in buffer, set in resize_bytes()
         self._dtype = None
         self._stride = 0
         self._itemsize = 0
         self._last_dim = None
+        # CPU copy of the data as bytes, and byte ranges to upload
+        self._shadow = np.zeros(0, np.uint8) if shadow else None
+        self._dirty = []
+        self._upload_scheduled = False
+        self._upload_stats = dict(uploaded_bytes=0, skipped_bytes=0)
         Buffer.__init__(self, data)
 
     def _prepare_data(self, data):
@@ -166,7 +180,10 @@ class DataBuffer(Buffer):
     def set_subdata(self, data, offset=0, copy=False, **kwargs):
         data = self._prepare_data(data, **kwargs)
         offset = offset * self.itemsize
-        Buffer.set_subdata(self, data=data, offset=offset, copy=copy)
+        if self._shadow is not None:
+            self._write_shadow(data, offset)
+        else:
+            Buffer.set_subdata(self, data=data, offset=offset, copy=copy)
 
     def set_data(self, data, copy=False, **kwargs):
         """ Set data (deferred operation)
@@ -187,7 +204,85 @@ class DataBuffer(Buffer):
         self._dtype = data.dtype
         self._stride = data.strides[-1]
         self._itemsize = self._dtype.itemsize
-        Buffer.set_data(self, data=data, copy=copy)
+        if self._shadow is None:
+            Buffer.set_data(self, data=data, copy=copy)
+        elif data.nbytes != self._nbytes:
+            self.resize_bytes(data.nbytes)
+            self._write_shadow(data)
+        else:
+            self._write_shadow(data, compare=True)
+
+    def _write_shadow(self, data, offset=0, compare=False):
+        """ Write data (at the given byte offset) into the shadow copy,
+        and mark the byte ranges that need uploading as dirty. If
+        compare is True, only the elements that differ from the current
+        data are marked.
+        """
+        data = np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+        stop = offset + data.nbytes
+        if offset < 0:
+            raise ValueError("Offset must be positive")
+        elif stop > self._nbytes:
+            raise ValueError("Data does not fit into buffer")
+        if not data.nbytes:
+            return
+        itemsize = self.itemsize
+        if compare and itemsize and data.nbytes % itemsize == 0:
+            old = self._shadow[offset:stop].reshape(-1, itemsize)
+            changed = (old != data.reshape(-1, itemsize)).any(axis=1)
+            # Get start and stop of runs of changed elements
+            edges = np.diff(np.concatenate([[0], changed.view(np.int8), [0]]))
+            starts = np.where(edges == 1)[0] * itemsize + offset
+            stops = np.where(edges == -1)[0] * itemsize + offset
+            ranges = list(zip(starts.tolist(), stops.tolist()))
+        else:
+            ranges = [(offset, stop)]
+        self._shadow[offset:stop] = data
+        if ranges:
+            # Also when a resize dropped the dirty ranges of the upload
+            # that is already scheduled
+            if not self._upload_scheduled:
+                self._glir.defer(self._upload_dirty)
+                self._upload_scheduled = True
+            self._dirty.extend(ranges)
+
+    def _upload_dirty(self):
+        """ Merge the dirty ranges and send one DATA command per range.
+        Called right before our GLIR queue is cleared.
+        """
+        ranges, self._dirty = sorted(self._dirty), []
+        self._upload_scheduled = False
+        if not hasattr(self, '_glir'):
+            return  # deleted
+        merged = []
+        for start, stop in ranges:
+            if merged and start <= merged[-1][1] + self._merge_gap:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        nbytes = 0
+        for start, stop in merged:
+            self._glir.command('DATA', self._id, start,
+                               self._shadow[start:stop].copy())
+            nbytes += stop - start
+        self._upload_stats['uploaded_bytes'] += nbytes
+        self._upload_stats['skipped_bytes'] += self._nbytes - nbytes
+
+    @property
+    def shadow(self):
+        """ Whether this buffer keeps a copy of the data on the CPU and
+        only uploads the parts that changed.
+        """
+        return self._shadow is not None
+
+    @property
+    def upload_stats(self):
+        """ Dict with the total number of bytes that were uploaded, and
+        the number of bytes that were skipped because they did not
+        change (compared to uploading the whole buffer on each flush).
+        Only counted in shadow mode.
+        """
+        return self._upload_stats
 
     @property
     def dtype(self):
@@ -246,6 +341,9 @@ class DataBuffer(Buffer):
         """
         Buffer.resize_bytes(self, size)
         self._size = size // self.itemsize
+        if self._shadow is not None:
+            self._shadow = np.zeros(size, np.uint8)
+            self._dirty = []
 
     def __getitem__(self, key):
         """ Create a view on this buffer. """
@@ -419,40 +517,53 @@ class VertexBuffer(DataBuffer):
         Buffer data type (optional)
     size : int
         Buffer size (optional)
+    shadow : bool
+        Keep a copy of the data on the CPU and only upload the parts
+        that change (default False).
     """
     
     _GLIR_TYPE = 'VertexBuffer'
 
     def _prepare_data(self, data, convert=False):
-        # Build a structured view of the data if:
-        #  -> it is not already a structured array
-        #  -> shape if 1-D or last dimension is 1,2,3 or 4
-        if isinstance(data, list):
-            data = np.array(data, dtype=np.float32)
-        if not isinstance(data, np.ndarray):
-            raise ValueError('Data must be a ndarray (got %s)' % type(data))
-        if data.dtype.isbuiltin:
-            if convert is True:
-                data = data.astype(np.float32)
-            if data.dtype in (np.float64, np.int64):
-                raise TypeError('data must be 32-bit not %s'
-                                % data.dtype)
-            c = data.shape[-1] if data.ndim > 1 else 1
-            if c in [2, 3, 4]:
-                if not data.flags['C_CONTIGUOUS']:
-                    logger.warning('Copying discontiguous data for struct '
-                                   'dtype:\n%s' % _last_stack_str())
-                    data = data.copy()
-            else:
-                c = 1
+        data, c = _prepare_vertex_data(data, convert)
+        if c is not None:
             if self._last_dim and c != self._last_dim:
                 raise ValueError('Last dimension should be %s not %s'
                                  % (self._last_dim, c))
-            data = data.view(dtype=[('f0', data.dtype.base, c)])
             self._last_dim = c
         return data
 
 
+def _prepare_vertex_data(data, convert=False):
+    """ Get vertex data as an array, and its last dimension
+
+    A structured view of the data is built if it is not already a
+    structured array. The last dimension is 1, 2, 3 or 4 for such data,
+    and None for structured arrays.
+    """
+    if isinstance(data, list):
+        data = np.array(data, dtype=np.float32)
+    if not isinstance(data, np.ndarray):
+        raise ValueError('Data must be a ndarray (got %s)' % type(data))
+    if not data.dtype.isbuiltin:
+        return data, None
+    if convert is True:
+        data = data.astype(np.float32)
+    if data.dtype in (np.float64, np.int64):
+        raise TypeError('data must be 32-bit not %s'
+                        % data.dtype)
+    c = data.shape[-1] if data.ndim > 1 else 1
+    if c in [2, 3, 4]:
+        if not data.flags['C_CONTIGUOUS']:
+            logger.warning('Copying discontiguous data for struct '
+                           'dtype:\n%s' % _last_stack_str())
+            data = data.copy()
+    else:
+        c = 1
+    data = data.view(dtype=[('f0', data.dtype.base, c)])
+    return data, c
+
+
 def _last_stack_str():
     """Print stack trace from call that didn't originate from here"""
     stack = extract_stack()
@@ -475,12 +586,15 @@ class IndexBuffer(DataBuffer):
         Buffer data type (optional)
     size : int
         Buffer size (optional)
+    shadow : bool
+        Keep a copy of the data on the CPU and only upload the parts
+        that change (default False).
     """
     
     _GLIR_TYPE = 'IndexBuffer'
 
-    def __init__(self, data=None):
-        DataBuffer.__init__(self, data)
+    def __init__(self, data=None, shadow=False):
+        DataBuffer.__init__(self, data, shadow)
         self._last_dim = 1
 
     def _prepare_data(self, data, convert=False):
@@ -499,3 +613,169 @@ class IndexBuffer(DataBuffer):
                     raise TypeError("Invalid dtype for IndexBuffer: %r" %
                                     data.dtype)
         return data
+
+
+# ------------------------------------------------------ StreamBuffer class ---
+class StreamBuffer(Buffer):
+    """ Vertex buffer for data that is written anew each frame
+
+    Data is written into a ring of bytes; each call to ``write()``
+    returns a view at the offset where the data is stored, which can be
+    bound to a program attribute. Data for different attributes (and
+    with different dtypes) can share the same buffer. When the ring is
+    full, the buffer store is orphaned (reallocated with a SIZE command),
+    so that the driver can hand out new memory rather than wait until
+    the GPU is done with the old data. Data that was written since the
+    last flush is uploaded again after orphaning, so that views of the
+    current frame stay valid.
+
+    Parameters
+    ----------
+    nbytes : int
+        The size of the ring in bytes. It should be large enough to hold
+        the data of a couple of frames. The buffer grows if a single
+        frame does not fit.
+    usage : str
+        Usage hint for the driver: 'stream' (data is written once and
+        used a few times, default), 'dynamic' (written repeatedly, used
+        many times) or 'static' (written once, used many times).
+
+    Notes
+    -----
+    Data passed to ``write()`` is not copied, and should not be modified
+    before the commands are flushed (i.e. before drawing).
+    """
+
+    _GLIR_TYPE = 'VertexBuffer'
+
+    _usages = {'static': 'static_draw', 'dynamic': 'dynamic_draw',
+               'stream': 'stream_draw'}
+
+    # Offsets are aligned to this many bytes
+    _alignment = 16
+
+    def __init__(self, nbytes, usage='stream'):
+        if usage not in self._usages:
+            raise ValueError('Invalid usage %r, must be one of %s'
+                             % (usage, ', '.join(sorted(self._usages))))
+        self._usage = usage
+        self._head = 0  # Where the next write goes
+        self._pending = []  # (offset, data) written since the last flush
+        self._orphan_count = 0
+        Buffer.__init__(self, nbytes=int(nbytes))
+
+    @property
+    def usage(self):
+        """ The usage hint for this buffer """
+        return self._usage
+
+    @property
+    def orphan_count(self):
+        """ The number of times that the buffer store has been orphaned
+        (or grown) because the ring was full.
+        """
+        return self._orphan_count
+
+    def write(self, data):
+        """ Write data for the current frame (deferred operation).
+
+        Parameters
+        ----------
+        data : ndarray
+            Vertex data, as accepted by VertexBuffer.
+
+        Returns
+        -------
+        view : StreamBufferView
+            The view on the written data, to bind to a program attribute.
+        """
+        data, last_dim = _prepare_vertex_data(data)
+        data = np.ascontiguousarray(data)
+        offset = self._allocate(data.nbytes)
+        self._glir.command('DATA', self._id, offset, data)
+        if not self._pending:
+            self._glir.defer(self._on_flush)
+        self._pending.append((offset, data))
+        return StreamBufferView(self, offset, data, last_dim)
+
+    def _allocate(self, nbytes):
+        """ Get the offset for the given number of bytes, orphaning the
+        buffer store if the ring is full.
+        """
+        # Writes cannot go beyond the end, nor into pending data
+        offset, limit = self._head, self._nbytes
+        for o, data in self._pending:
+            if o >= offset:
+                limit = min(limit, o)
+        if offset + nbytes > limit:
+            # Wrap around: start at the beginning if there is room before
+            # the pending data, else after it (growing if needed)
+            lo = min([o for o, d in self._pending] + [self._nbytes])
+            hi = max([o + d.nbytes for o, d in self._pending] + [0])
+            if nbytes <= lo:
+                offset = 0
+            else:
+                offset = self._align(hi)
+                if offset + nbytes > self._nbytes:
+                    self._nbytes = max(2 * self._nbytes, offset + nbytes)
+            self.resize_bytes(self._nbytes)
+            self._orphan_count += 1
+            for o, data in self._pending:
+                self._glir.command('DATA', self._id, o, data)
+        self._head = self._align(offset + nbytes)
+        return offset
+
+    def _align(self, offset):
+        a = self._alignment
+        return ((offset + a - 1) // a) * a
+
+    def _on_flush(self):
+        # The pending data is submitted with the commands being flushed
+        self._pending = []
+
+    def resize_bytes(self, size):
+        """ Resize (and orphan) the buffer store (deferred operation).
+
+        Parameters
+        ----------
+        size : int
+            New buffer size in bytes.
+        """
+        self._nbytes = size
+        self._glir.command('SIZE', self._id, size, self._usages[self._usage])
+
+    def set_subdata(self, data, offset=0, copy=False):
+        raise RuntimeError('Use write() to set data on a StreamBuffer.')
+
+    def set_data(self, data, copy=False):
+        raise RuntimeError('Use write() to set data on a StreamBuffer.')
+
+    def __repr__(self):
+        return ("<%s nbytes=%d usage=%s>"
+                % (self.__class__.__name__, self.nbytes, self.usage))
+
+
+class StreamBufferView(DataBufferView):
+    """ View on the data of one write to a StreamBuffer
+
+    Notes
+    -----
+    It is generally not necessary to instantiate this class manually; it
+    is returned by ``StreamBuffer.write()``.
+    """
+
+    def __init__(self, base, offset, data, last_dim):
+        # Like DataBufferView, the super's __init__ is not called
+        self._base = base
+        self._key = None
+        self._offset = offset
+        self._dtype = data.dtype
+        self._stride = data.strides[-1]
+        self._itemsize = data.dtype.itemsize
+        self._size = data.size
+        self._nbytes = data.nbytes
+        self._view_last_dim = last_dim
+
+    @property
+    def _last_dim(self):
+        return self._view_last_dim
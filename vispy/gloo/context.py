@@ -93,6 +93,9 @@ class GLContext(BaseGlooFunctions):
         self._set_config(config)
         self._shared = shared if (shared is not None) else GLShared()
         assert isinstance(self._shared, GLShared)
+        if shared is not None:
+            # Vertex array objects cannot be shared between contexts
+            self._shared.parser.use_vertex_arrays = False
         self._glir = GlirQueue()
         self._do_CURRENT_command = False  # flag that CURRENT cmd must be given
     
@@ -114,6 +114,8 @@ def use_gl(target='gl2'):
     * es2 - Use the ES2 library (Angle/DirectX on Windows)
     * pyopengl2 - Use ES 2.0 subset of pyopengl (for fallback and testing)
     * dummy - Prevent usage of gloo.gl (for when rendering occurs elsewhere)
+    * stub - Accept all gl calls without doing anything (for testing and
+      benchmarking without a GPU)
     
     You can use vispy's config option "gl_debug" to check for errors
     on each API call. Or, one can specify it as the target, e.g. "gl2
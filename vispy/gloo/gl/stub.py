@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+""" A stub backend.
+"""
+
+from . import BaseGLProxy, _copy_gl_functions
+from ._constants import *  # noqa
+
+
+class StubProxy(BaseGLProxy):
+    """ A stub backend that accepts all GL function calls without doing
+    anything. Functions that return a value return something plausible
+    (e.g. a new handle, or a success status). The number of calls per
+    function is counted in ``calls``. This backend can be used to test
+    and benchmark the GLIR parser without a GPU.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self._handle_count = 0
+        self._locations = {}
+
+    def reset(self):
+        """ Reset the call counters.
+        """
+        self.calls.clear()
+
+    def __call__(self, funcname, returns, *args):
+        self.calls[funcname] = self.calls.get(funcname, 0) + 1
+        if not returns:
+            return
+        elif funcname.startswith(('glCreate', 'glGen')):
+            self._handle_count += 1
+            return self._handle_count
+        elif funcname in ('glGetUniformLocation', 'glGetAttribLocation'):
+            key = args[0], args[1]
+            if key not in self._locations:
+                self._locations[key] = len(self._locations)
+            return self._locations[key]
+        elif funcname in ('glGetProgramParameter', 'glGetShaderParameter'):
+            if args[1] in (GL_ACTIVE_UNIFORMS, GL_ACTIVE_ATTRIBUTES):  # noqa
+                return 0
+            return True  # compile/link/validate status
+        elif funcname == 'glCheckFramebufferStatus':
+            return GL_FRAMEBUFFER_COMPLETE  # noqa
+        elif funcname in ('glGetShaderInfoLog', 'glGetProgramInfoLog',
+                          'glGetShaderSource'):
+            return ''
+        elif funcname == 'glGetParameter':
+            if args[0] in (GL_VIEWPORT, GL_SCISSOR_BOX):  # noqa
+                return (0, 0, 1, 1)
+            return 0
+        return 0  # e.g. GL_NO_ERROR for glGetError
+
+
+# Instantiate proxy and inject functions
+_proxy = StubProxy()
+_copy_gl_functions(_proxy, globals())
+
+
+# Functions for instanced drawing and vertex array objects, which are not
+# in the ES 2.0 API, but are provided so that the code paths in GLIR that
+# use them can be tested. The signatures are those of PyOpenGL.
+
+def glVertexAttribDivisor(index, divisor):
+    _proxy('glVertexAttribDivisor', False, index, divisor)
+
+
+def glDrawArraysInstanced(mode, first, count, instances):
+    _proxy('glDrawArraysInstanced', False, mode, first, count, instances)
+
+
+def glDrawElementsInstanced(mode, count, type, indices, instances):
+    _proxy('glDrawElementsInstanced', False, mode, count, type, indices,
+           instances)
+
+
+def glGenVertexArrays(n):
+    return _proxy('glGenVertexArrays', True, n)
+
+
+def glBindVertexArray(array):
+    _proxy('glBindVertexArray', False, array)
+
+
+def glDeleteVertexArrays(n, arrays):
+    _proxy('glDeleteVertexArrays', False, n, arrays)
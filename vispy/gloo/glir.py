@@ -11,6 +11,7 @@ Implementation to execute GL Intermediate Representation (GLIR)
 import sys
 import re
 import json
+from numbers import Integral
 
 import numpy as np
 
@@ -52,17 +53,35 @@ _internalformats = dict([(enum.name, enum) for enum in _internalformats])
 JUST_DELETED = 'JUST_DELETED'
 
 
+# Cache of string -> enum lookups done in as_enum()
+_enum_cache = {}
+
+# GL functions that set a single piece of GL state (all their arguments)
+_state_funcs = set(['glBlendColor', 'glClearColor', 'glClearDepth',
+                    'glClearStencil', 'glColorMask', 'glCullFace',
+                    'glDepthFunc', 'glDepthMask', 'glDepthRange',
+                    'glFrontFace', 'glLineWidth', 'glPolygonOffset',
+                    'glSampleCoverage', 'glScissor', 'glViewport'])
+
+
 def as_enum(enum):
     """ Turn a possibly string enum into an integer enum.
     """
     if isinstance(enum, string_types):
         try:
-            enum = getattr(gl, 'GL_' + enum.upper())
+            return _enum_cache[enum]
+        except KeyError:
+            pass
+        name = 'GL_' + enum.upper()
+        try:
+            value = getattr(gl, name)
         except AttributeError:
             try:
-                enum = _internalformats['GL_' + enum.upper()]
+                value = _internalformats[name]
             except KeyError:
                 raise ValueError('Could not find int value for enum %r' % enum)
+        _enum_cache[enum] = value
+        return value
     return enum
 
 
@@ -82,6 +101,8 @@ class GlirQueue(object):
         self._commands = []  # local commands
         self._verbose = False
         self._associations = set()
+        self._deferred = []
+        self._filter_stats = dict(commands_removed=0, bytes_removed=0)
     
     def command(self, *args):
         """ Send a command. See the command spec at:
@@ -89,6 +110,13 @@ class GlirQueue(object):
         """
         self._commands.append(args)
     
+    def defer(self, callback):
+        """ Register a callback that is called (once) right before the
+        queue is cleared. This allows an object to send its commands
+        lazily, e.g. to combine many small updates into few commands.
+        """
+        self._deferred.append(callback)
+    
     def set_verbose(self, verbose):
         """ Set verbose or not. If True, the GLIR commands are printed
         right before they get parsed. If a string is given, use it as
@@ -133,6 +161,9 @@ class GlirQueue(object):
             commands.extend(q.clear())
             if hasattr(q, '_deletable'):  # this flag gets set by GLObject
                 self._associations.discard(q)
+        deferred, self._deferred = self._deferred, []
+        for callback in deferred:
+            callback()
         commands.extend(self._commands)
         self._commands[:] = []
         return commands
@@ -158,29 +189,165 @@ class GlirQueue(object):
         parser.parse(self._filter(self.clear(), parser))
     
     def _filter(self, commands, parser):
+        """ Optimize the list of commands before it is parsed.
+        
+        Objects that are created and deleted without being used are
+        removed, DATA/SIZE commands that are overridden by a SIZE
+        command are removed, as are state commands (UNIFORM, ATTRIBUTE,
+        WRAPPING, INTERPOLATION) that are overridden before the next
+        draw. Finally, DATA commands for adjacent or overlapping byte
+        ranges of a buffer are merged into a single upload.
+        """
+        ncommands, nbytes = len(commands), _commands_nbytes(commands)
+        commands = self._filter_dead_objects(commands)
+        commands = self._filter_overridden(commands, parser)
+        commands = self._merge_data(commands)
+        # Keep track of how much work we saved
+        stats = self._filter_stats
+        stats['commands_removed'] += ncommands - len(commands)
+        stats['bytes_removed'] += nbytes - _commands_nbytes(commands)
+        return commands
+    
+    @property
+    def filter_stats(self):
+        """ A dict with the accumulated number of commands and bytes
+        that were removed by the command optimizer when this queue was
+        flushed. The dict can be cleared to reset the counters.
+        """
+        return self._filter_stats
+    
+    def _filter_dead_objects(self, commands):
+        """ Remove all commands for objects that are created and deleted
+        again without a draw (or gl function call) in between.
+        """
+        candidates = {}  # objects created since last DRAW/FUNC
+        dead = set()
+        for command in commands:
+            cmd = command[0]
+            if cmd == 'CREATE':
+                candidates[command[1]] = True
+            elif cmd == 'DELETE':
+                if command[1] in candidates:
+                    dead.add(command[1])
+            elif cmd in ('DRAW', 'FUNC', 'CURRENT'):
+                candidates.clear()
+        if not dead:
+            return commands
+        return [command for command in commands 
+                if not _references_object(command, dead)]
+    
+    def _filter_overridden(self, commands, parser):
         """ Filter DATA/SIZE commands that are overridden by a 
-        SIZE command.
+        SIZE command, and state commands that are overridden by a
+        later command for the same object (and variable) before any
+        draw.
         """
         resized = set()
+        overridden = set()  # (id, cmd, name) that is set later on
         commands2 = []
         for command in reversed(commands):
-            if command[0] == 'SHADERS':
+            cmd = command[0]
+            if cmd == 'SHADERS':
+                overridden.clear()
                 convert = parser.convert_shaders()
                 if convert:
                     shaders = self._convert_shaders(convert, command[2:])
                     command = command[:2] + shaders
+            elif cmd == 'DRAW':
+                overridden.clear()
+            elif cmd in ('UNIFORM', 'ATTRIBUTE', 
+                         'WRAPPING', 'INTERPOLATION'):
+                if cmd in ('UNIFORM', 'ATTRIBUTE'):
+                    key = command[1], cmd, command[2]
+                else:
+                    key = command[1], cmd
+                if key in overridden:
+                    continue  # remove this command
+                overridden.add(key)
             elif command[1] in resized:
-                if command[0] in ('SIZE', 'DATA'):
+                if cmd in ('SIZE', 'DATA'):
                     continue  # remove this command
-            elif command[0] == 'SIZE':
+            elif cmd == 'SIZE':
                 resized.add(command[1])
             commands2.append(command)
         return list(reversed(commands2))
+    
+    def _merge_data(self, commands):
+        """ Merge DATA commands for a buffer that write to adjacent
+        or overlapping byte ranges, so that they result in a single
+        upload. Only consecutive DATA commands for the same buffer are
+        merged, and never across a draw.
+        """
+        pending = {}  # id -> index of last DATA command in commands2
+        commands2 = []
+        for command in commands:
+            cmd = command[0]
+            if (cmd == 'DATA' and len(command) == 4 and 
+                    isinstance(command[2], Integral)):
+                i = pending.get(command[1], None)
+                if i is not None:
+                    merged = _merge_data_commands(commands2[i], command)
+                    if merged is not None:
+                        commands2[i] = merged
+                        continue
+                pending[command[1]] = len(commands2)
+            elif cmd == 'DRAW':
+                pending.clear()
+            elif cmd in ('SIZE', 'DELETE'):
+                pending.pop(command[1], None)
+            commands2.append(command)
+        return commands2
 
     def _convert_shaders(self, convert, shaders):
         return convert_shaders(convert, shaders)
 
 
+def _commands_nbytes(commands):
+    """ Get the total number of bytes of the array data in the given
+    commands (arrays are always the last element of a command).
+    """
+    return sum([command[-1].nbytes for command in commands 
+                if isinstance(command[-1], np.ndarray)])
+
+
+def _references_object(command, ids):
+    """ Get whether the given command refers to any of the given
+    object ids.
+    """
+    if command[1] in ids:
+        return True
+    elif command[0] == 'ATTRIBUTE':
+        return command[-1][0] in ids  # (vbo-id, stride, offset) or (0, ...)
+    elif command[0] in ('TEXTURE', 'ATTACH'):
+        return command[-1] in ids
+    return False
+
+
+def _as_bytes(data):
+    """ Get a flat uint8 view (or copy if needed) of an array.
+    """
+    return np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+
+
+def _merge_data_commands(command1, command2):
+    """ Merge two DATA commands for a buffer into one. The data of the
+    second command takes precedence where the ranges overlap. Returns
+    None if the byte ranges are not adjacent or overlapping.
+    """
+    id_, offset1, data1 = command1[1:]
+    offset2, data2 = command2[2:]
+    end1, end2 = offset1 + data1.nbytes, offset2 + data2.nbytes
+    if offset2 > end1 or offset1 > end2:
+        return None
+    elif offset2 <= offset1 and end2 >= end1:
+        return command2  # The second write covers the first completely
+    start = min(offset1, offset2)
+    data = np.empty(max(end1, end2) - start, np.uint8)
+    data[offset1 - start:end1 - start] = _as_bytes(data1)
+    data[offset2 - start:end2 - start] = _as_bytes(data2)
+    return 'DATA', id_, start, data
+
+
 def convert_shaders(convert, shaders):
     """ Modify shading code so that we can write code once
     and make it run "everywhere".
@@ -272,6 +439,20 @@ class BaseGlirParser(object):
         """
         raise NotImplementedError()
     
+    def supports_instancing(self):
+        """ Whether instanced drawing is supported, i.e. the DIVISOR
+        command and the number of instances in the DRAW command. If not,
+        gloo expands the instances on the CPU.
+        """
+        return False
+    
+    def supports_float_textures(self):
+        """ Whether 16-bit and float internal formats of textures, such
+        as 'r16' and 'r32f', are supported. These are not available in
+        ES 2.0 and WebGL.
+        """
+        return False
+    
     def parse(self, commands):
         """ Parse the GLIR commands. Or sent them away.
         """
@@ -285,8 +466,39 @@ class GlirParser(BaseGlirParser):
     on CREATE commands. These objects are stored by their id in a
     dictionary so that commands like ACTIVATE and DATA can easily
     be executed on the corresponding objects.
+    
+    The attribute state of programs is cached, so that the GL calls to
+    bind vertex buffers are only made when something changed. If
+    available, each program uses a vertex array object (VAO) for this.
+    VAOs cannot be shared between contexts, so ``use_vertex_arrays``
+    is set to False for a parser that is used by multiple contexts.
+    The number of GL calls that were avoided is counted in
+    ``avoided_calls``.
+    
+    Similarly, the GL state that is set with FUNC commands (e.g. via
+    ``gloo.set_state()``) is tracked, and commands that would not change
+    the state are dropped. Their number is counted in
+    ``dropped_state_changes``. If ``verbose`` is True, the number of
+    dropped state changes is logged for each frame (i.e. each time that
+    a context is made current).
     """
     
+    # Map commands that act on an object to the name of its method
+    _methods = {'DRAW': 'draw',  # Program
+                'TEXTURE': 'set_texture',  # Program
+                'UNIFORM': 'set_uniform',  # Program
+                'ATTRIBUTE': 'set_attribute',  # Program
+                'DATA': 'set_data',  # VertexBuffer, IndexBuffer, Texture
+                'SIZE': 'set_size',  # VertexBuffer, IndexBuffer,
+                                     # Texture[1D, 2D, 3D], RenderBuffer
+                'ATTACH': 'attach',  # FrameBuffer
+                'FRAMEBUFFER': 'set_framebuffer',  # FrameBuffer
+                'SHADERS': 'set_shaders',  # Program
+                'DIVISOR': 'set_divisor',  # Program
+                'WRAPPING': 'set_wrapping',  # Texture1D, Texture2D, Texture3D
+                'INTERPOLATION': 'set_interpolation',  # Texture1D, 2D, 3D
+                }
+    
     def __init__(self):
         self._objects = {}
         self._invalid_objects = set()
@@ -301,6 +513,39 @@ class GlirParser(BaseGlirParser):
                           'FrameBuffer': GlirFrameBuffer,
                           }
         
+        # Commands that act on the parser rather than on an object
+        self._handlers = {'CURRENT': self._current,
+                          'FUNC': self._func,
+                          'CREATE': self._create,
+                          'DELETE': self._delete,
+                          }
+        
+        # Cache of (command, id) -> bound method of the GLIR object
+        self._handler_cache = {}
+        
+        # Cache of gl function objects, reset if the gl backend changes
+        self._gl_funcs = {}
+        self._gl_key = None
+        
+        # Linked GL programs, shared by GlirPrograms with the same code
+        self._programs = {}  # (vert, frag) -> _LinkedProgram
+        
+        # Version per vertex buffer handle, increased when the data store
+        # of the buffer is reallocated or when it is deleted. Attribute
+        # bindings made with an older version are invalid. The epoch is
+        # increased on any such change.
+        self._buffer_versions = {}
+        self._buffer_epoch = 0
+        
+        # Caching of attribute state
+        self.use_vertex_arrays = True
+        self.avoided_calls = 0
+        
+        # Tracking of GL state that is set via FUNC commands
+        self.verbose = False
+        self.dropped_state_changes = 0
+        self._frame_state_changes = [0, 0]  # dropped, total
+        
         # We keep a dict that the GLIR objects use for storing
         # per-context information. This dict is cleared each time
         # that the context is made current. This seems necessary for
@@ -315,75 +560,134 @@ class GlirParser(BaseGlirParser):
             return 'es2'
         else:
             return 'desktop'
-
-    def _parse(self, command):
-        """ Parse a single command.
+    
+    def supports_instancing(self):
+        # These are not in the ES 2.0 API, but available with e.g. gl+
+        return all([self.get_gl_function(name) for name in 
+                    ('glVertexAttribDivisor', 'glDrawArraysInstanced',
+                     'glDrawElementsInstanced')])
+    
+    def supports_float_textures(self):
+        return self.convert_shaders() == 'desktop'
+    
+    def supports_vertex_arrays(self):
+        """ Whether vertex array objects are used to store the attribute
+        state of programs.
         """
-
-        cmd, id_, args = command[0], command[1], command[2:]
-            
-        if cmd == 'CURRENT':
-            # This context is made current
-            self.env.clear()
-            self._gl_initialize()
-            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
-        elif cmd == 'FUNC':
-            # GL function call
-            args = [as_enum(a) for a in args]
-            try:
-                getattr(gl, id_)(*args)
-            except AttributeError:
-                logger.warning('Invalid gl command: %r' % id_)
-        elif cmd == 'CREATE':
-            # Creating an object
-            if args[0] is not None:
-                klass = self._classmap[args[0]]
-                self._objects[id_] = klass(self, id_)
-            else:
-                self._invalid_objects.add(id_)
-        elif cmd == 'DELETE':
-            # Deleting an object
-            ob = self._objects.get(id_, None)
-            if ob is not None:
-                self._objects[id_] = JUST_DELETED
-                ob.delete()
+        # These are not in the ES 2.0 API, but available with e.g. gl+
+        return self.use_vertex_arrays and all(
+            [self.get_gl_function(name) for name in 
+             ('glGenVertexArrays', 'glBindVertexArray', 
+              'glDeleteVertexArrays')])
+    
+    def _invalidate_buffer(self, handle):
+        """ Invalidate the attribute bindings to the vertex buffer with
+        the given handle.
+        """
+        versions = self._buffer_versions
+        versions[handle] = versions.get(handle, 0) + 1
+        self._buffer_epoch += 1
+
+    def _current(self, id_):
+        # This context is made current
+        dropped, total = self._frame_state_changes
+        if self.verbose and total:
+            logger.info('Dropped %i of %i GL state changes in the last '
+                        'frame' % (dropped, total))
+        self._frame_state_changes = [0, 0]
+        self.env.clear()
+        self._gl_initialize()
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+    
+    def _func(self, name, *args):
+        # GL function call
+        func = self.get_gl_function(name)
+        if func is None:
+            logger.warning('Invalid gl command: %r' % name)
+            return
+        args = tuple([as_enum(a) for a in args])
+        state = self._get_state(name, args)
+        if state is None:
+            func(*args)
+            return
+        # Drop the call if it would not change the state of the context
+        counts = self._frame_state_changes
+        counts[1] += 1
+        shadow = self.env.setdefault('state', {})
+        for key, value in state:
+            if shadow.get(key, None) != value:
+                break
         else:
-            # Doing somthing to an object
-            ob = self._objects.get(id_, None)
-            if ob == JUST_DELETED:
-                return
-            if ob is None:
-                if id_ not in self._invalid_objects:
-                    raise RuntimeError('Cannot %s object %i because it '
-                                       'does not exist' % (cmd, id_))
-                return
-            # Triage over command. Order of commands is set so most
-            # common ones occur first.
-            if cmd == 'DRAW':  # Program
-                ob.draw(*args)
-            elif cmd == 'TEXTURE':  # Program
-                ob.set_texture(*args)
-            elif cmd == 'UNIFORM':  # Program
-                ob.set_uniform(*args)
-            elif cmd == 'ATTRIBUTE':  # Program
-                ob.set_attribute(*args)
-            elif cmd == 'DATA':  # VertexBuffer, IndexBuffer, Texture
-                ob.set_data(*args)
-            elif cmd == 'SIZE':  # VertexBuffer, IndexBuffer,
-                ob.set_size(*args)  # Texture[1D, 2D, 3D], RenderBuffer
-            elif cmd == 'ATTACH':  # FrameBuffer
-                ob.attach(*args)
-            elif cmd == 'FRAMEBUFFER':  # FrameBuffer
-                ob.set_framebuffer(*args)
-            elif cmd == 'SHADERS':  # Program
-                ob.set_shaders(*args)
-            elif cmd == 'WRAPPING':  # Texture1D, Texture2D, Texture3D
-                ob.set_wrapping(*args)
-            elif cmd == 'INTERPOLATION':  # Texture1D, Texture2D, Texture3D
-                ob.set_interpolation(*args)
-            else:
-                logger.warning('Invalid GLIR command %r' % cmd)
-   
+            counts[0] += 1
+            self.dropped_state_changes += 1
+            return
+        func(*args)
+        shadow.update(state)
+    
+    def _get_state(self, name, args):
+        """ Get the parts of the GL state that the given GL call sets, as
+        a list of (key, value) tuples, or None if the function does not
+        just set state.
+        """
+        if name in _state_funcs:
+            return [(name, args)]
+        elif name == 'glEnable' or name == 'glDisable':
+            return [(args[0], name == 'glEnable')]
+        elif name in ('glBlendFunc', 'glBlendEquation'):
+            name += 'Separate'
+            return [((name, 'rgb'), args), ((name, 'alpha'), args)]
+        elif name in ('glBlendFuncSeparate', 'glBlendEquationSeparate'):
+            n = len(args) // 2
+            return [((name, 'rgb'), args[:n]), ((name, 'alpha'), args[n:])]
+        elif name in ('glStencilFunc', 'glStencilMask', 'glStencilOp'):
+            name += 'Separate'
+            return [((name, gl.GL_FRONT), args), ((name, gl.GL_BACK), args)]
+        elif name in ('glStencilFuncSeparate', 'glStencilMaskSeparate',
+                      'glStencilOpSeparate'):
+            faces = (args[0], )
+            if args[0] not in (gl.GL_FRONT, gl.GL_BACK):
+                faces = gl.GL_FRONT, gl.GL_BACK
+            return [((name, face), args[1:]) for face in faces]
+        elif name == 'glHint':
+            return [((name, args[0]), args[1])]
+        return None
+    
+    def _create(self, id_, type_):
+        # Creating an object
+        self._handler_cache.clear()
+        if type_ is not None:
+            klass = self._classmap[type_]
+            self._objects[id_] = klass(self, id_)
+        else:
+            self._invalid_objects.add(id_)
+    
+    def _delete(self, id_):
+        # Deleting an object
+        self._handler_cache.clear()
+        ob = self._objects.get(id_, None)
+        if ob is not None:
+            self._objects[id_] = JUST_DELETED
+            ob.delete()
+    
+    def _get_handler(self, cmd, id_):
+        """ Get the bound method of the object with the given id that
+        handles the given command, or None if the command should be
+        ignored. Raises an error if the object does not exist.
+        """
+        ob = self._objects.get(id_, None)
+        if ob == JUST_DELETED:
+            return None
+        if ob is None:
+            if id_ not in self._invalid_objects:
+                raise RuntimeError('Cannot %s object %i because it '
+                                   'does not exist' % (cmd, id_))
+            return None
+        methodname = self._methods.get(cmd, None)
+        if methodname is None:
+            logger.warning('Invalid GLIR command %r' % cmd)
+            return None
+        return getattr(ob, methodname)
+    
     def parse(self, commands):
         """ Parse a list of commands.
         """
@@ -396,15 +700,47 @@ class GlirParser(BaseGlirParser):
                 to_delete.append(id_)
         for id_ in to_delete:
             self._objects.pop(id_)
+        if to_delete:
+            self._handler_cache.clear()
         
+        # Reset the cache of gl functions if the gl backend has changed
+        gl_key = gl.current_backend, gl.glGetError
+        if gl_key != self._gl_key:
+            self._gl_key = gl_key
+            self._gl_funcs = {}
+        
+        # Look up handlers via a cache, which is cleared when objects
+        # get created or deleted.
+        handlers, cache = self._handlers, self._handler_cache
         for command in commands:
-            self._parse(command)
+            cmd = command[0]
+            if cmd in handlers:
+                handlers[cmd](*command[1:])
+                continue
+            key = cmd, command[1]
+            try:
+                handler = cache[key]
+            except KeyError:
+                handler = cache[key] = self._get_handler(*key)
+            if handler is not None:
+                handler(*command[2:])
 
     def get_object(self, id_):
         """ Get the object with the given id or None if it does not exist.
         """
         return self._objects.get(id_, None)
     
+    def get_gl_function(self, name):
+        """ Get the gl function with the given name or None if it does
+        not exist. The function objects are cached, but the cache is
+        reset when another gl backend is used.
+        """
+        try:
+            return self._gl_funcs[name]
+        except KeyError:
+            func = self._gl_funcs[name] = getattr(gl, name, None)
+            return func
+    
     def _gl_initialize(self):
         """ Deal with compatibility; desktop does not have sprites
         enabled by default. ES has.
@@ -434,9 +770,14 @@ def glir_logger(parser_cls, file_or_filename):
             self._file.write('[]')
             self._empty = True
 
-        def _parse(self, command):
-            parser_cls._parse(self, command)
+        def parse(self, commands):
+            try:
+                parser_cls.parse(self, commands)
+            finally:
+                for command in commands:
+                    self._log(command)
 
+        def _log(self, command):
             self._file.seek(self._file.tell() - 1)
             if self._empty:
                 self._empty = False
@@ -470,7 +811,28 @@ class GlirObject(object):
         return '<%s %i at 0x%x>' % (self.__class__.__name__, self.id, id(self))
 
 
+class _LinkedProgram(object):
+    """ A linked GL program that is shared by all GlirProgram objects
+    with the same shader code. Also holds the information that depends
+    only on the code: the active variables and their locations.
+    """
+    
+    def __init__(self, key, handle, active_variables):
+        self.key = key
+        self.handle = handle
+        self.active_variables = active_variables
+        self.handles = {}  # cache with handles to attributes/uniforms
+        self.known_invalid = set()  # variables that we know are invalid
+        self.refcount = 0
+        self.owner = None  # The GlirProgram whose uniforms are applied
+
+
 class GlirProgram(GlirObject):
+    """ A GLIR program. Programs with the same shader code share one
+    linked GL program. Each GlirProgram keeps its own uniform values,
+    which are applied again on drawing if another GlirProgram has used
+    the GL program in the meantime.
+    """
     
     UTYPEMAP = {
         'float': 'glUniform1fv',
@@ -509,7 +871,7 @@ class GlirProgram(GlirObject):
     }
     
     def create(self):
-        self._handle = gl.glCreateProgram()
+        self._linked_program = None  # Created in set_shaders()
         self._validated = False
         self._linked = False
         # Keeping track of uniforms/attributes
@@ -518,10 +880,39 @@ class GlirProgram(GlirObject):
         # Store samplers in buffers that are bount to uniforms/attributes
         self._samplers = {}  # name -> (tex-target, tex-handle, unit)
         self._attributes = {}  # name -> (vbo-handle, attr-handle, func, args)
+        self._uniforms = {}  # name -> (func, args), including sampler units
+        self._divisors = {}  # name -> divisor, for instanced drawing
         self._known_invalid = set()  # variables that we know are invalid
+        # Vertex array object (if supported) and the attribute state in it
+        self._vao = None
+        self._vao_state = {}  # attr-handle -> state, see _set_attributes()
+        self._vao_epoch = -1  # buffer epoch at which the state was checked
     
     def delete(self):
-        gl.glDeleteProgram(self._handle)
+        self._release()
+        if self._vao is not None:
+            if self._parser.env.get('current_vao', 0) == self._vao:
+                self._parser.env['current_vao'] = 0
+            self._parser.get_gl_function('glDeleteVertexArrays')(
+                1, [self._vao])
+            self._vao = None
+    
+    def _release(self):
+        """ Stop using our linked program, and delete it if no other
+        GlirProgram uses it.
+        """
+        linked = self._linked_program
+        if linked is None:
+            return
+        self._linked_program = None
+        if linked.owner is self:
+            linked.owner = None
+        linked.refcount -= 1
+        if linked.refcount == 0:
+            self._parser._programs.pop(linked.key, None)
+            if self._parser.env.get('current_program', 0) == linked.handle:
+                self._parser.env['current_program'] = 0
+            gl.glDeleteProgram(linked.handle)
     
     def activate(self):
         """ Avoid overhead in calling glUseProgram with same arg.
@@ -544,9 +935,40 @@ class GlirProgram(GlirObject):
     def set_shaders(self, vert, frag):
         """ This function takes care of setting the shading code and
         compiling+linking it into a working program object that is ready
-        to use.
+        to use. If another program has the same code, its GL program is
+        used instead.
         """
         self._linked = False
+        key = vert, frag
+        linked = self._parser._programs.get(key, None)
+        if linked is None:
+            handle, old_handle = gl.glCreateProgram(), self._handle
+            self._handle = handle
+            try:
+                self._link(vert, frag)
+                # Now we know what variables will be used by the program
+                variables = self._get_active_attributes_and_uniforms()
+            except Exception:
+                self._handle = old_handle
+                gl.glDeleteProgram(handle)
+                raise
+            linked = _LinkedProgram(key, handle, variables)
+            linked.owner = self
+            self._parser._programs[key] = linked
+        linked.refcount += 1
+        self._release()
+        self._linked_program = linked
+        self._handle = linked.handle
+        self._unset_variables = set(linked.active_variables)
+        self._handles = linked.handles
+        self._known_invalid = linked.known_invalid
+        self._uniforms = {}
+        self._vao_epoch = -1
+        self._linked = True
+    
+    def _link(self, vert, frag):
+        """ Compile the shaders and link them into our GL program.
+        """
         # Create temporary shader objects
         vert_handle = gl.glCreateShader(gl.GL_VERTEX_SHADER)
         frag_handle = gl.glCreateShader(gl.GL_FRAGMENT_SHADER)
@@ -576,11 +998,6 @@ class GlirProgram(GlirObject):
         gl.glDetachShader(self._handle, frag_handle)
         gl.glDeleteShader(vert_handle)
         gl.glDeleteShader(frag_handle)
-        # Now we know what variables will be used by the program
-        self._unset_variables = self._get_active_attributes_and_uniforms()
-        self._handles = {}
-        self._known_invalid = set()
-        self._linked = True
         
     def _get_active_attributes_and_uniforms(self):
         """ Retrieve active attributes and uniforms to be able to check that
@@ -690,7 +1107,7 @@ class GlirProgram(GlirObject):
             if name in self._samplers:
                 unit = self._samplers[name][-1]  # Use existing unit            
             self._samplers[name] = tex._target, tex.handle, unit
-            gl.glUniform1i(handle, unit)
+            self._set_uniform_value(name, gl.glUniform1i, (handle, unit))
 
     def set_uniform(self, name, type_, value):
         """ Set a uniform value. Value is assumed to have been checked.
@@ -719,18 +1136,25 @@ class GlirProgram(GlirObject):
                 logger.info('Variable %s is not an active uniform' % name)
                 return
         # Look up function to call
-        funcname = self.UTYPEMAP[type_]
-        func = getattr(gl, funcname)
-        # Program needs to be active in order to set uniforms
-        self.activate()
+        func = self._parser.get_gl_function(self.UTYPEMAP[type_])
         # Triage depending on type 
         if type_.startswith('mat'):
             # Value is matrix, these gl funcs have alternative signature
             transpose = False  # OpenGL ES 2.0 does not support transpose
-            func(handle, 1, transpose, value)
+            self._set_uniform_value(name, func, (handle, 1, transpose, value))
         else:
             # Regular uniform
-            func(handle, count, value)
+            self._set_uniform_value(name, func, (handle, count, value))
+    
+    def _set_uniform_value(self, name, func, args):
+        """ Store the call to set a uniform, and make it now if our
+        uniforms are the ones applied to the (shared) GL program.
+        """
+        self._uniforms[name] = func, args
+        if self._linked_program.owner is self:
+            # Program needs to be active in order to set uniforms
+            self.activate()
+            func(*args)
     
     def set_attribute(self, name, type_, value):
         """ Set an attribute value. Value is assumed to have been checked.
@@ -756,8 +1180,7 @@ class GlirProgram(GlirObject):
         # Triage depending on VBO or tuple data
         if value[0] == 0:
             # Look up function call
-            funcname = self.ATYPEMAP[type_]
-            func = getattr(gl, funcname)
+            func = self._parser.get_gl_function(self.ATYPEMAP[type_])
             # Set data
             self._attributes[name] = 0, handle, func, value[1:]
         else:
@@ -774,28 +1197,105 @@ class GlirProgram(GlirObject):
             func = gl.glVertexAttribPointer
             args = size, gtype, gl.GL_FALSE, stride, offset
             self._attributes[name] = vbo.handle, handle, func, args
+        self._vao_epoch = -1
+    
+    def set_divisor(self, name, divisor):
+        """ Set the divisor of an attribute, for instanced drawing.
+        """
+        if divisor:
+            self._divisors[name] = divisor
+        else:
+            self._divisors.pop(name, None)
+        self._vao_epoch = -1
     
     def _pre_draw(self):
         self.activate()
+        # Apply our uniforms if another program used the GL program
+        linked = self._linked_program
+        if linked.owner is not self:
+            linked.owner = self
+            for func, args in self._uniforms.values():
+                func(*args)
         # Activate textures
         for tex_target, tex_handle, unit in self._samplers.values():
             gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
             gl.glBindTexture(tex_target, tex_handle)
         # Activate attributes
-        for vbo_handle, attr_handle, func, args in self._attributes.values():
-            if vbo_handle:
-                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo_handle)
-                gl.glEnableVertexAttribArray(attr_handle)
-                func(attr_handle, *args)
-            else:
-                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
-                gl.glDisableVertexAttribArray(attr_handle)
-                func(attr_handle, *args)
+        self._set_attributes()
         # Validate. We need to validate after textures units get assigned
         if not self._validated:
             self._validated = True
             self._validate()
     
+    def _set_attributes(self):
+        """ Bind the attributes. The attribute state is not program state,
+        so we keep track of it per attribute location, and only make the
+        GL calls for attributes that changed. This state is stored in
+        our VAO if supported, or else in the context (which we keep track
+        of in the env). The values of constant attributes are always
+        context state.
+        """
+        parser = self._parser
+        env = parser.env
+        if parser.supports_vertex_arrays():
+            if self._vao is None:
+                self._vao = parser.get_gl_function('glGenVertexArrays')(1)
+            if env.get('current_vao', 0) != self._vao:
+                env['current_vao'] = self._vao
+                parser.get_gl_function('glBindVertexArray')(self._vao)
+            # If nothing changed, the buffers in our VAO are still valid
+            check = self._vao_epoch != parser._buffer_epoch
+            self._vao_epoch = parser._buffer_epoch
+            state = self._vao_state
+        else:
+            check = True
+            state = env.setdefault('attributes', {})
+        values = env.setdefault('attribute_values', {})
+        set_divisor = parser.get_gl_function('glVertexAttribDivisor')
+        versions = parser._buffer_versions
+        avoided = 0
+        for name, attribute in self._attributes.items():
+            vbo_handle, attr_handle, func, args = attribute
+            old = state.get(attr_handle, None)
+            if not vbo_handle:
+                # Disabled array, with a constant value
+                avoided += 1  # No need to unbind the buffer
+                if old is None or old[0]:
+                    gl.glDisableVertexAttribArray(attr_handle)
+                    state[attr_handle] = (0, 0, None, None, 
+                                          None if old is None else old[4])
+                else:
+                    avoided += 1
+                if values.get(attr_handle, None) != (func, args):
+                    values[attr_handle] = func, args
+                    func(attr_handle, *args)
+                else:
+                    avoided += 1
+                continue
+            elif not check:
+                avoided += 3
+                continue
+            new = vbo_handle, versions.get(vbo_handle, 0), func, args
+            if old is not None and old[:4] == new:
+                avoided += 3
+            else:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo_handle)
+                gl.glEnableVertexAttribArray(attr_handle)
+                func(attr_handle, *args)
+            # Set divisor (for instanced drawing)
+            divisor = self._divisors.get(name, 0)
+            if set_divisor and (old is None or old[4] != divisor):
+                set_divisor(attr_handle, divisor)
+            state[attr_handle] = new + (divisor, )
+        # Disable arrays in our VAO that are no longer used
+        if state is self._vao_state and len(state) > len(self._attributes):
+            used = set([a[1] for a in self._attributes.values()])
+            for attr_handle in list(state):
+                if attr_handle not in used:
+                    gl.glDisableVertexAttribArray(attr_handle)
+                    del state[attr_handle]
+        parser.avoided_calls += avoided
+    
     def _validate(self):
         # Validate ourselves
         if self._unset_variables:
@@ -820,12 +1320,14 @@ class GlirProgram(GlirObject):
         #apps it would not even make sense.
         #self.deactivate()
     
-    def draw(self, mode, selection):
+    def draw(self, mode, selection, instances=None):
         """ Draw program in given mode, with given selection (IndexBuffer or
-        first, count).
+        first, count), and optionally the number of instances.
         """
         if not self._linked:
             raise RuntimeError('Cannot draw program if code has not been set')
+        if instances is not None and not self._parser.supports_instancing():
+            raise RuntimeError('Instanced drawing is not supported')
         # Init
         gl.check_error('Check before draw')
         mode = as_enum(mode)
@@ -837,14 +1339,24 @@ class GlirProgram(GlirObject):
                 self._pre_draw()
                 ibuf = self._parser.get_object(id_)
                 ibuf.activate()
-                gl.glDrawElements(mode, count, as_enum(gtype), None)
+                if instances is None:
+                    gl.glDrawElements(mode, count, as_enum(gtype), None)
+                else:
+                    func = self._parser.get_gl_function(
+                        'glDrawElementsInstanced')
+                    func(mode, count, as_enum(gtype), None, instances)
                 ibuf.deactivate()
         else:
             # Selection based on start and count
             first, count = selection
             if count:
                 self._pre_draw()
-                gl.glDrawArrays(mode, first, count)
+                if instances is None:
+                    gl.glDrawArrays(mode, first, count)
+                else:
+                    func = self._parser.get_gl_function(
+                        'glDrawArraysInstanced')
+                    func(mode, first, count, instances)
         # Wrap up
         gl.check_error('Check after draw')
         self._post_draw()
@@ -868,11 +1380,16 @@ class GlirBuffer(GlirObject):
     def deactivate(self):
         gl.glBindBuffer(self._target, 0)
     
-    def set_size(self, nbytes):  # in bytes
-        if nbytes != self._buffer_size:
-            self.activate()
-            gl.glBufferData(self._target, nbytes, self._usage)
-            self._buffer_size = nbytes
+    def set_size(self, nbytes, usage=None):  # in bytes
+        if usage is not None:
+            # A usage hint always (re)allocates the data store, which
+            # orphans the old store if the size is the same.
+            self._usage = as_enum(usage)
+        elif nbytes == self._buffer_size:
+            return
+        self.activate()
+        gl.glBufferData(self._target, nbytes, self._usage)
+        self._buffer_size = nbytes
     
     def set_data(self, offset, data):
         self.activate()
@@ -906,6 +1423,15 @@ class GlirBuffer(GlirObject):
 class GlirVertexBuffer(GlirBuffer):
     _target = gl.GL_ARRAY_BUFFER
     
+    def delete(self):
+        self._parser._invalidate_buffer(self._handle)
+        GlirBuffer.delete(self)
+    
+    def set_size(self, nbytes, usage=None):
+        if usage is not None or nbytes != self._buffer_size:
+            self._parser._invalidate_buffer(self._handle)
+        GlirBuffer.set_size(self, nbytes, usage)
+    
 
 class GlirIndexBuffer(GlirBuffer):
     _target = gl.GL_ELEMENT_ARRAY_BUFFER
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+
+"""
+Compact binary encoding of GLIR command streams
+
+A stream starts with a header (the magic bytes ``GLIR``, a uint16
+version and a uint16 that is reserved), followed by any number of
+messages. Each message holds the commands of one call to
+``parser.parse()`` and is prefixed with its size in bytes (uint32), so
+that a reader can read a message in one go, and skip it if needed.
+
+A message body starts with the number of commands (uint32). Each
+command starts with a uint8 command code (0 means that the command
+name follows as a string, with its ``s`` or ``S`` tag), followed by a
+uint8 with the number of arguments, and the arguments. Each argument is
+a one-byte tag followed by its value:
+
+  * ``N``, ``T``, ``F``: None, True, False
+  * ``i``, ``q``: int32, int64
+  * ``f``: float64
+  * ``s``, ``S``: uint8 or uint32 size + utf-8 encoded string
+  * ``t``: uint32 count + items (tuples and lists)
+  * ``a``: array; dtype as string (with its tag), uint8 ndim,
+    uint32 shape per dimension, uint8 compression (0 none, 1 zlib),
+    uint32 size in bytes, data.
+
+All numbers are little endian. Array data is decoded without copying
+(via ``np.frombuffer``) unless it is compressed; such arrays are
+read-only.
+"""
+
+import ast
+import struct
+import zlib
+
+import numpy as np
+
+from .glir import BaseGlirParser, _as_bytes
+from ..ext.six import string_types, integer_types
+
+MAGIC = b'GLIR'
+VERSION = 1
+
+# Commands are stored by their index in this tuple (plus one). New
+# commands should be appended, to keep existing streams readable.
+COMMANDS = ('CURRENT', 'FUNC', 'CREATE', 'DELETE', 'DRAW', 'TEXTURE',
+            'UNIFORM', 'ATTRIBUTE', 'DATA', 'SIZE', 'ATTACH',
+            'FRAMEBUFFER', 'SHADERS', 'WRAPPING', 'INTERPOLATION',
+            'DIVISOR')
+_command_codes = dict([(name, i + 1) for i, name in enumerate(COMMANDS)])
+
+# Arrays smaller than this are never compressed
+COMPRESS_MIN_BYTES = 1024
+
+_uint8 = struct.Struct('<B')
+_uint32 = struct.Struct('<I')
+_int32 = struct.Struct('<i')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+
+
+def _encode_string(s, chunks):
+    s = s.encode('utf-8')
+    if len(s) < 256:
+        chunks.append(b's' + _uint8.pack(len(s)))
+    else:
+        chunks.append(b'S' + _uint32.pack(len(s)))
+    chunks.append(s)
+
+
+def _encode_value(value, chunks, compress):
+    if value is None:
+        chunks.append(b'N')
+    elif value is True:
+        chunks.append(b'T')
+    elif value is False:
+        chunks.append(b'F')
+    elif isinstance(value, np.bool_):
+        chunks.append(b'T' if value else b'F')
+    elif isinstance(value, integer_types + (np.integer,)):
+        if -2**31 <= value < 2**31:
+            chunks.append(b'i' + _int32.pack(value))
+        else:
+            chunks.append(b'q' + _int64.pack(value))
+    elif isinstance(value, (float, np.floating)):
+        chunks.append(b'f' + _float64.pack(value))
+    elif isinstance(value, string_types):
+        _encode_string(value, chunks)
+    elif isinstance(value, (tuple, list)):
+        chunks.append(b't' + _uint32.pack(len(value)))
+        for item in value:
+            _encode_value(item, chunks, compress)
+    elif isinstance(value, np.ndarray):
+        dtype = value.dtype
+        chunks.append(b'a')
+        _encode_string(repr(dtype.descr) if dtype.fields else dtype.str,
+                       chunks)
+        chunks.append(_uint8.pack(value.ndim))
+        chunks.extend([_uint32.pack(n) for n in value.shape])
+        data = _as_bytes(value)
+        compression = 0
+        if compress and data.nbytes >= COMPRESS_MIN_BYTES:
+            zdata = zlib.compress(data.data)
+            if len(zdata) < data.nbytes:
+                data, compression = zdata, 1
+        chunks.append(_uint8.pack(compression))
+        chunks.append(_uint32.pack(len(data)))
+        chunks.append(data if compression else data.data)
+    else:
+        raise TypeError('Cannot encode %r in GLIR stream' % type(value))
+
+
+def _encode_commands(commands, compress=False):
+    """ Get the list of byte chunks that encode the commands.
+    """
+    chunks = [_uint32.pack(len(commands))]
+    for command in commands:
+        code = _command_codes.get(command[0], 0)
+        chunks.append(_uint8.pack(code))
+        if code == 0:
+            _encode_string(command[0], chunks)
+        chunks.append(_uint8.pack(len(command) - 1))
+        for arg in command[1:]:
+            _encode_value(arg, chunks, compress)
+    return chunks
+
+
+def encode_commands(commands, compress=False):
+    """ Encode a list of GLIR commands into a message body (bytes).
+
+    Parameters
+    ----------
+    commands : list
+        The GLIR commands.
+    compress : bool
+        Whether to compress array data with zlib (only done for arrays
+        larger than ``COMPRESS_MIN_BYTES`` that actually get smaller).
+    """
+    return b''.join(_encode_commands(commands, compress))
+
+
+class _Decoder(object):
+    """ Decode values from a buffer, keeping track of the position.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def unpack(self, fmt):
+        value, = fmt.unpack_from(self._data, self._pos)
+        self._pos += fmt.size
+        return value
+
+    def tag(self):
+        self._pos += 1
+        return self._view[self._pos - 1:self._pos].tobytes()
+
+    def string(self, tag=None):
+        tag = self.tag() if tag is None else tag
+        if tag == b's':
+            n = self.unpack(_uint8)
+        elif tag == b'S':
+            n = self.unpack(_uint32)
+        else:
+            raise ValueError('Invalid string tag %r in GLIR stream' % tag)
+        self._pos += n
+        return self._view[self._pos - n:self._pos].tobytes().decode('utf-8')
+
+    def value(self):
+        tag = self.tag()
+        if tag == b'N':
+            return None
+        elif tag == b'T':
+            return True
+        elif tag == b'F':
+            return False
+        elif tag == b'i':
+            return self.unpack(_int32)
+        elif tag == b'q':
+            return self.unpack(_int64)
+        elif tag == b'f':
+            return self.unpack(_float64)
+        elif tag in (b's', b'S'):
+            return self.string(tag)
+        elif tag == b't':
+            return tuple([self.value() for i in range(self.unpack(_uint32))])
+        elif tag == b'a':
+            return self.array()
+        raise ValueError('Invalid tag %r in GLIR stream' % tag)
+
+    def array(self):
+        dtype = self.string()
+        if dtype.startswith('['):
+            dtype = ast.literal_eval(dtype)
+        dtype = np.dtype(dtype)
+        ndim = self.unpack(_uint8)
+        shape = tuple([self.unpack(_uint32) for i in range(ndim)])
+        compression = self.unpack(_uint8)
+        nbytes = self.unpack(_uint32)
+        if compression == 0:
+            data = np.frombuffer(self._data, np.uint8, nbytes, self._pos)
+        elif compression == 1:
+            data = self._view[self._pos:self._pos + nbytes]
+            data = np.frombuffer(zlib.decompress(data), np.uint8)
+        else:
+            raise ValueError('Invalid compression %r in GLIR stream' %
+                             compression)
+        self._pos += nbytes
+        return data.view(dtype).reshape(shape)
+
+    def commands(self):
+        commands = []
+        for i in range(self.unpack(_uint32)):
+            code = self.unpack(_uint8)
+            name = COMMANDS[code - 1] if code else self.string()
+            args = [self.value() for j in range(self.unpack(_uint8))]
+            commands.append((name, ) + tuple(args))
+        return commands
+
+
+def decode_commands(data):
+    """ Decode a message body (as produced by ``encode_commands``) into
+    a list of GLIR commands. Array data is not copied.
+    """
+    return _Decoder(data).commands()
+
+
+class GlirWriter(object):
+    """ Write GLIR commands to a file in the binary GLIR stream format
+
+    Parameters
+    ----------
+    file_or_filename : str | file
+        The file to write to. A file object must be opened in binary
+        mode. If a filename is given, the file is closed on close().
+    compress : bool
+        Whether to compress array data with zlib.
+
+    Notes
+    -----
+    Use ``attach(canvas)`` to record all commands that get parsed for
+    the given canvas.
+    """
+
+    def __init__(self, file_or_filename, compress=False):
+        if isinstance(file_or_filename, string_types):
+            self._file = open(file_or_filename, 'wb')
+            self._own_file = True
+        else:
+            self._file = file_or_filename
+            self._own_file = False
+        self._compress = compress
+        self._file.write(MAGIC + struct.pack('<HH', VERSION, 0))
+
+    def write(self, commands):
+        """ Write a list of commands as one message.
+        """
+        chunks = _encode_commands(commands, self._compress)
+        nbytes = sum([len(c) if isinstance(c, bytes) else c.nbytes
+                      for c in chunks])
+        self._file.write(_uint32.pack(nbytes))
+        for chunk in chunks:
+            self._file.write(chunk)
+
+    def attach(self, canvas):
+        """ Record all commands that are parsed for the given canvas
+        (or anything else that has a GLContext as ``context``).
+        """
+        shared = canvas.context.shared
+        shared.parser = GlirRecordingParser(shared.parser, self)
+
+    def close(self):
+        """ Flush the file, and close it if it was opened by the writer.
+        """
+        self._file.flush()
+        if self._own_file:
+            self._file.close()
+
+
+class GlirReader(object):
+    """ Read GLIR commands from a file in the binary GLIR stream format
+
+    Parameters
+    ----------
+    file_or_filename : str | file
+        The file to read from. A file object must be opened in binary
+        mode.
+
+    Notes
+    -----
+    Iterating over the reader yields the list of commands for each
+    message. Use ``replay(parser)`` to parse all messages.
+    """
+
+    def __init__(self, file_or_filename):
+        if isinstance(file_or_filename, string_types):
+            self._file = open(file_or_filename, 'rb')
+            self._own_file = True
+        else:
+            self._file = file_or_filename
+            self._own_file = False
+        header = self._file.read(8)
+        if len(header) != 8 or header[:4] != MAGIC:
+            raise ValueError('Not a GLIR stream')
+        version, _ = struct.unpack('<HH', header[4:])
+        if version > VERSION:
+            raise ValueError('GLIR stream version %i is not supported'
+                             % version)
+        self._version = version
+
+    @property
+    def version(self):
+        """ The version of the stream format.
+        """
+        return self._version
+
+    def __iter__(self):
+        while True:
+            header = self._file.read(4)
+            if not header:
+                break
+            nbytes, = _uint32.unpack(header)
+            data = self._file.read(nbytes)
+            if len(data) != nbytes:
+                raise ValueError('Truncated GLIR stream')
+            yield decode_commands(data)
+
+    def replay(self, parser):
+        """ Parse all messages in the stream with the given parser.
+        """
+        for commands in self:
+            parser.parse(commands)
+
+    def close(self):
+        """ Close the file if it was opened by the reader.
+        """
+        if self._own_file:
+            self._file.close()
+
+
+class GlirRecordingParser(BaseGlirParser):
+    """ Parser that writes all commands to a GlirWriter before passing
+    them on to the given parser.
+    """
+
+    def __init__(self, parser, writer):
+        self._parser = parser
+        self._writer = writer
+
+    def is_remote(self):
+        return self._parser.is_remote()
+
+    def convert_shaders(self):
+        return self._parser.convert_shaders()
+
+    def supports_instancing(self):
+        return self._parser.supports_instancing()
+
+    def supports_float_textures(self):
+        return self._parser.supports_float_textures()
+
+    def parse(self, commands):
+        self._writer.write(commands)
+        self._parser.parse(commands)
+
+    def __getattr__(self, name):
+        # Give access to e.g. get_object() and env of the real parser
+        return getattr(self._parser, name)
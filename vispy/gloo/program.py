@@ -31,7 +31,7 @@ import re
 import numpy as np
 
 from .globject import GLObject
-from .buffer import VertexBuffer, IndexBuffer, DataBuffer
+from .buffer import VertexBuffer, IndexBuffer, DataBuffer, DataBufferView
 from .texture import BaseTexture, Texture2D, Texture3D, Texture1D
 from ..util import logger
 from .util import check_enum 
@@ -66,6 +66,15 @@ class Program(GLObject):
     -----
     If several shaders are specified, only one can contain the main
     function. OpenGL ES 2.0 does not support a list of shaders.
+    
+    Instanced drawing is done with ``draw(..., instances=n)``; use
+    ``set_divisor()`` to make attributes advance per instance rather
+    than per vertex. If the GL implementation does not support
+    instancing, the instances are drawn one by one, with the attributes
+    that have a divisor set to a constant value. This requires that the
+    data of these attributes is known, i.e. that they are set with numpy
+    arrays (before the first draw, or after the divisor is set), or with
+    buffers that have ``shadow=True``.
     """
     
     _GLIR_TYPE = 'Program'
@@ -105,6 +114,15 @@ class Program(GLObject):
         # Init pending user-defined data
         self._pending_variables = {}  # name -> data
         
+        # Init attribute divisors for instanced drawing. The arrays that
+        # were given as attribute data are kept until the first draw, so
+        # that a shadow buffer can be made if a divisor is set; the data
+        # of such attributes is needed if instancing is not supported.
+        self._divisors = {}  # name -> divisor
+        self._divisors_sent = {}  # name -> divisor, as last sent to GLIR
+        self._vertex_data = {}  # name -> array that was given as data
+        self._drawn = False
+        
         # NOTE: we *could* allow vert and frag to be a tuple/list of shaders,
         # but that would complicate the GLIR implementation, and it seems 
         # unncessary
@@ -281,6 +299,7 @@ class Program(GLObject):
         if data is None:
             self._user_variables.pop(name, None)
             self._pending_variables.pop(name, None)
+            self._vertex_data.pop(name, None)
             return
         
         if name in self._code_variables:
@@ -348,11 +367,17 @@ class Program(GLObject):
                     # VBO data; overwrite or update
                     vbo = self._user_variables.get(name, None)
                     if isinstance(data, DataBuffer):
-                        pass
+                        self._vertex_data.pop(name, None)
                     elif vbo is not None and hasattr(vbo, 'set_data'):
                         vbo.set_data(data)
+                        if name in self._vertex_data:
+                            self._vertex_data[name] = data
                         return
+                    elif name in self._divisors:
+                        data = VertexBuffer(data, shadow=True)
                     else:
+                        if not self._drawn:
+                            self._vertex_data[name] = data
                         data = VertexBuffer(data)
                     # Store and send GLIR command
                     if data.dtype is not None:
@@ -398,7 +423,34 @@ class Program(GLObject):
         else:
             raise KeyError("Unknown uniform or attribute %s" % name)
     
-    def draw(self, mode='triangles', indices=None, check_error=True):
+    def set_divisor(self, name, divisor):
+        """ Set the divisor of an attribute, for instanced drawing.
+        
+        Parameters
+        ----------
+        name : str
+            The name of the attribute.
+        divisor : int
+            The attribute advances once per *divisor* instances. If 0
+            (the default) it advances per vertex.
+        """
+        divisor = int(divisor)
+        if divisor < 0:
+            raise ValueError('Divisor must not be negative')
+        if name in self._code_variables:
+            if self._code_variables[name][0] != 'attribute':
+                raise ValueError('Can only set divisor for attributes')
+        if divisor:
+            self._divisors[name] = divisor
+            # Keep the data on the CPU, for drawing without instancing
+            if name in self._vertex_data:
+                self[name] = VertexBuffer(self._vertex_data.pop(name),
+                                          shadow=True)
+        else:
+            self._divisors.pop(name, None)
+    
+    def draw(self, mode='triangles', indices=None, check_error=True,
+             instances=None):
         """ Draw the attribute arrays in the specified mode.
 
         Parameters
@@ -406,16 +458,26 @@ class Program(GLObject):
         mode : str | GL_ENUM
             'points', 'lines', 'line_strip', 'line_loop', 'triangles',
             'triangle_strip', or 'triangle_fan'.
-        indices : array
-            Array of indices to draw.
+        indices : IndexBuffer
+            The indices to draw. Can also be a view on an IndexBuffer that
+            starts at the first index (e.g. ``indices[:n]``) to draw only
+            part of the indices.
         check_error:
             Check error after draw.
+        instances : int | None
+            The number of instances to draw. Attributes for which a
+            divisor is set advance per instance. The default is 1 if any
+            divisors are set (else instancing is not used).
         
         """
         
         # Invalidate buffer (data has already been sent)
         self._buffer = None
         
+        # The arrays given as attribute data are no longer needed
+        self._drawn = True
+        self._vertex_data = {}
+        
         # Check if mode is valid
         mode = check_enum(mode)
         if mode not in ['points', 'lines', 'line_strip', 'line_loop',
@@ -428,9 +490,10 @@ class Program(GLObject):
             logger.warn('Variable %r is given but not known.' % name)
         self._pending_variables = {}
         
-        # Check attribute sizes
-        attributes = [vbo for vbo in self._user_variables.values() 
-                      if isinstance(vbo, DataBuffer)]
+        # Check attribute sizes (of the attributes that are per vertex)
+        attributes = [vbo for name, vbo in self._user_variables.items()
+                      if isinstance(vbo, DataBuffer) and 
+                      name not in self._divisors]
         sizes = [a.size for a in attributes]
         if len(attributes) < 1:
             raise RuntimeError('Must have at least one attribute')
@@ -439,6 +502,21 @@ class Program(GLObject):
             raise RuntimeError('All attributes must have the same size, got:\n'
                                '%s' % msg)
         
+        # Check instances, and the sizes of the attributes per instance
+        if instances is None and self._divisors:
+            instances = 1
+        if instances is not None:
+            instances = int(instances)
+            if instances < 1:
+                raise ValueError('Number of instances must be at least 1')
+            for name, divisor in self._divisors.items():
+                vbo = self._user_variables.get(name, None)
+                need = (instances + divisor - 1) // divisor
+                if isinstance(vbo, DataBuffer) and vbo.size < need:
+                    raise RuntimeError('Attribute %r needs %i elements for '
+                                       '%i instances, not %i' % 
+                                       (name, need, instances, vbo.size))
+        
         # Get the glir queue that we need now
         canvas = get_current_canvas()
         assert canvas is not None
@@ -447,21 +525,87 @@ class Program(GLObject):
         canvas.context.glir.associate(self.glir)
         
         # Indexbuffer
-        if isinstance(indices, IndexBuffer):
+        index_base = indices
+        if isinstance(indices, DataBufferView):
+            index_base = indices.base
+            if indices.offset:
+                raise ValueError('A view on an IndexBuffer must start at '
+                                 'the first index')
+        if isinstance(index_base, IndexBuffer):
             canvas.context.glir.associate(indices.glir)
             logger.debug("Program drawing %r with index buffer" % mode)
             gltypes = {np.dtype(np.uint8): 'UNSIGNED_BYTE',
                        np.dtype(np.uint16): 'UNSIGNED_SHORT',
                        np.dtype(np.uint32): 'UNSIGNED_INT'}
             selection = indices.id, gltypes[indices.dtype], indices.size
-            canvas.context.glir.command('DRAW', self._id, mode, selection)
         elif indices is None:
             selection = 0, attributes[0].size
             logger.debug("Program drawing %r with %r" % (mode, selection))
-            canvas.context.glir.command('DRAW', self._id, mode, selection)
         else:
             raise TypeError("Invalid index: %r (must be IndexBuffer)" %
                             indices)
         
+        instancing = canvas.context.shared.parser.supports_instancing()
+        if instancing:
+            # Also on plain draws, so that reset divisors are applied
+            for name in set(self._divisors) | set(self._divisors_sent):
+                divisor = self._divisors.get(name, 0)
+                if self._divisors_sent.get(name, 0) != divisor:
+                    self._glir.command('DIVISOR', self._id, name, divisor)
+                    self._divisors_sent[name] = divisor
+        if instances is None:
+            canvas.context.glir.command('DRAW', self._id, mode, selection)
+        elif instancing:
+            canvas.context.glir.command('DRAW', self._id, mode, selection,
+                                        instances)
+        else:
+            self._draw_instances(canvas, mode, selection, instances)
+        
         # Process GLIR commands
         canvas.context.flush_commands()
+    
+    def _draw_instances(self, canvas, mode, selection, instances):
+        """ Draw instances one by one, for when the GL implementation does
+        not support instancing. For each instance, the attributes that
+        have a divisor are set to a constant value.
+        """
+        glir = canvas.context.glir
+        per_instance = []
+        for name, divisor in self._divisors.items():
+            vbo = self._user_variables.get(name, None)
+            if not isinstance(vbo, DataBuffer):
+                continue  # a constant value already
+            type_ = self._code_variables[name][1]
+            if type_ not in ('float', 'vec2', 'vec3', 'vec4'):
+                raise RuntimeError('Cannot draw instances without instancing '
+                                   'support for attribute %r of type %s'
+                                   % (name, type_))
+            per_instance.append((name, type_, divisor,
+                                 self._get_cpu_data(name, vbo)))
+        # These commands go in the same queue as the draw commands
+        for i in range(instances):
+            for name, type_, divisor, data in per_instance:
+                value = [0] + data[i // divisor].ravel().tolist()
+                glir.command('ATTRIBUTE', self._id, name, type_, tuple(value))
+            glir.command('DRAW', self._id, mode, selection)
+        # Bind the buffers again
+        for name, type_, divisor, data in per_instance:
+            vbo = self._user_variables[name]
+            glir.command('ATTRIBUTE', self._id, name, type_,
+                         (vbo.id, vbo.stride, vbo.offset))
+    
+    def _get_cpu_data(self, name, buffer):
+        """ Get the data of an attribute from its shadow buffer, as an
+        (N, numel) array.
+        """
+        base = getattr(buffer, 'base', buffer)
+        if not base.shadow:
+            raise RuntimeError('Cannot draw instances because the data of '
+                               'attribute %r is not known; set it with a '
+                               'numpy array or a buffer with shadow=True.'
+                               % name)
+        data = np.ndarray((buffer.size, ), buffer.dtype, base._shadow,
+                          buffer.offset, (buffer.stride, ))
+        if data.dtype.names:
+            data = data[data.dtype.names[0]]
+        return data.reshape(buffer.size, -1)
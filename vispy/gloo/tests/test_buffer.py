@@ -7,8 +7,9 @@ import unittest
 import numpy as np
 
 from vispy.testing import run_tests_if_main
+from vispy.gloo import gl, glir, Program
 from vispy.gloo.buffer import (Buffer, DataBuffer, DataBufferView, 
-                               VertexBuffer, IndexBuffer)
+                               VertexBuffer, IndexBuffer, StreamBuffer)
 
 
 # -----------------------------------------------------------------------------
@@ -408,6 +409,57 @@ class DataBufferTest(unittest.TestCase):
         glir_cmd = B._glir.clear()[-1]
         assert glir_cmd[-1].shape == (10,)
 
+    # Shadow copy: only upload what changed
+    # -------------------------------------
+    def test_shadow(self):
+        data = np.zeros(10000, np.float32)
+        B = DataBuffer(data=data, shadow=True)
+        assert B.shadow
+        glir_cmds = B._glir.clear()
+        assert [c[0] for c in glir_cmds] == ['CREATE', 'SIZE', 'DATA']
+        assert glir_cmds[-1][2:4] == (0, glir_cmds[-1][3])
+        assert glir_cmds[-1][3].nbytes == data.nbytes
+
+        # Setting the same data uploads nothing
+        B.set_data(data)
+        assert B._glir.clear() == []
+
+        # Only changed elements are uploaded, nearby ranges are merged
+        data = data.copy()
+        data[[10, 12, 5000]] = 1
+        B.set_data(data)
+        glir_cmds = B._glir.clear()
+        assert [c[2] for c in glir_cmds] == [40, 20000]
+        assert [c[3].nbytes for c in glir_cmds] == [12, 4]
+        assert B.upload_stats['uploaded_bytes'] == data.nbytes + 16
+        assert B.upload_stats['skipped_bytes'] == data.nbytes - 16
+
+        # Writes only mark ranges, which are merged on flush
+        B[100:200] = np.ones(100, np.float32)
+        B[150:300] = np.ones(150, np.float32)
+        B.set_subdata(np.ones(10, np.float32), offset=9000)
+        glir_cmds = B._glir.clear()
+        assert [c[2:3] + (c[3].nbytes,) for c in glir_cmds] == \
+            [(400, 800), (36000, 40)]
+        self.assertRaises(ValueError, B.set_subdata, data, 10)
+
+        # Resize uploads everything
+        B.set_data(np.zeros(20, np.float32))
+        glir_cmds = B._glir.clear()
+        assert [c[0] for c in glir_cmds] == ['SIZE', 'DATA']
+        assert glir_cmds[-1][3].nbytes == 80
+
+        # A write followed by a resize is uploaded once
+        stats = dict(B.upload_stats)
+        B[0:5] = np.ones(5, np.float32)
+        B.set_data(np.ones(30, np.float32))
+        assert len(B._glir._deferred) == 1
+        glir_cmds = B._glir.clear()
+        assert [c[0] for c in glir_cmds] == ['SIZE', 'DATA']
+        assert B.upload_stats['uploaded_bytes'] == \
+            stats['uploaded_bytes'] + 120
+        assert B.upload_stats['skipped_bytes'] == stats['skipped_bytes']
+
 
 class DataBufferViewTest(unittest.TestCase):
     
@@ -550,4 +602,82 @@ class IndexBufferTest(unittest.TestCase):
         self.assertRaises(TypeError, B.set_data, sdata)
 
 
+# -----------------------------------------------------------------------------
+class StreamBufferTest(unittest.TestCase):
+
+    def test_init(self):
+        B = StreamBuffer(512)
+        assert B.usage == 'stream'
+        assert B._glir.clear()[1:] == [('SIZE', B.id, 512, 'stream_draw')]
+        B = StreamBuffer(512, usage='dynamic')
+        assert B._glir.clear()[-1][3] == 'dynamic_draw'
+        self.assertRaises(ValueError, StreamBuffer, 512, 'foo')
+        self.assertRaises(RuntimeError, B.set_data, np.zeros(10, np.uint8))
+
+    def test_frames(self):
+        B = StreamBuffer(512)
+        B._glir.clear()
+        program = Program('attribute vec2 a_pos; attribute vec4 a_color;'
+                          'void main() {}', 'void main() {}')
+        pos = np.zeros((10, 2), np.float32)  # 80 bytes
+        color = np.zeros((10, 4), np.float32)  # 160 bytes
+
+        def frame():
+            program['a_pos'] = B.write(pos)
+            program['a_color'] = B.write(color)
+            program.glir.associate(B.glir)
+            commands = program.glir.clear()
+            return ([c[2] for c in commands if c[0] == 'DATA'],
+                    [c[4][1:] for c in commands if c[0] == 'ATTRIBUTE'],
+                    [c[3] for c in commands if c[0] == 'SIZE'])
+
+        # Views have the offset, stride and size of the written data
+        view = StreamBuffer(512).write(pos)
+        assert (view.offset, view.stride, view.size) == (0, 8, 10)
+        assert view._last_dim == 2
+        assert isinstance(view.base, StreamBuffer)
+
+        # Data is written at increasing (aligned) offsets
+        assert frame() == ([0, 80], [(8, 0), (16, 80)], [])
+        assert frame() == ([240, 320], [(8, 240), (16, 320)], [])
+        # Wrap around: orphan and start at the beginning
+        assert frame() == ([0, 80], [(8, 0), (16, 80)], ['stream_draw'])
+        assert B.orphan_count == 1
+        assert B.nbytes == 512
+
+        # Data that is not flushed yet is written again after orphaning
+        program['a_pos'] = B.write(np.zeros((25, 2), np.float32))
+        assert B._head == 448
+        program['a_color'] = B.write(color)
+        program.glir.associate(B.glir)
+        commands = program.glir.clear()
+        commands = program.glir._filter(commands, glir.GlirParser())
+        commands = [c[:3] for c in commands if c[1] == B.id]
+        assert commands == [('SIZE', B.id, 512), ('DATA', B.id, 240),
+                            ('DATA', B.id, 0)]
+        assert B.orphan_count == 2
+
+        # The buffer grows if the data does not fit
+        B.write(np.zeros((100, 2), np.float32))
+        assert B.nbytes == 1024
+        assert B.orphan_count == 3
+
+    def test_glir_usage(self):
+        gl.use_gl('stub')
+        try:
+            calls = gl.current_backend._proxy.calls
+            parser = glir.GlirParser()
+            parser.parse([('CREATE', 1, 'VertexBuffer'),
+                          ('SIZE', 1, 512),
+                          ('SIZE', 1, 512)])
+            assert calls['glBufferData'] == 1
+            # A usage hint always reallocates (orphans) the store
+            parser.parse([('SIZE', 1, 512, 'stream_draw'),
+                          ('SIZE', 1, 512, 'stream_draw')])
+            assert calls['glBufferData'] == 3
+            assert parser.get_object(1)._usage == gl.GL_STREAM_DRAW
+        finally:
+            gl.use_gl()
+
+
 run_tests_if_main()
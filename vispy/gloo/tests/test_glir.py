@@ -3,10 +3,14 @@
 import json
 import tempfile
 
+import numpy as np
+
 from vispy import config
 from vispy.app import Canvas
-from vispy.gloo import glir
-from vispy.testing import requires_application, run_tests_if_main
+from vispy.gloo import glir, gl
+from vispy.testing import (requires_application, run_tests_if_main,
+                           assert_raises)
+from vispy.util import use_log_level
 
 
 def test_queue():
@@ -49,6 +53,275 @@ def test_queue():
     assert 'precision highp float;' in shader3
 
 
+def test_queue_optimize():
+    q = glir.GlirQueue()
+    parser = glir.GlirParser()
+    u1, u2 = np.zeros(4, np.float32), np.ones(4, np.float32)
+
+    # Overridden state commands are removed, but not across a draw
+    cmds1 = [('UNIFORM', 1, 'u_a', 'vec4', u1),
+             ('ATTRIBUTE', 1, 'a_b', 'float', (0, 1.0)),
+             ('WRAPPING', 2, ('repeat', 'repeat')),
+             ('UNIFORM', 1, 'u_a', 'vec4', u2),
+             ('ATTRIBUTE', 1, 'a_b', 'float', (0, 2.0)),
+             ('WRAPPING', 2, ('clamp_to_edge', 'clamp_to_edge')),
+             ('DRAW', 1, 'points', (0, 10)),
+             ('UNIFORM', 1, 'u_a', 'vec4', u1)]
+    cmds2 = q._filter(cmds1, parser)
+    assert cmds2 == cmds1[3:]
+    assert q.filter_stats['commands_removed'] == 3
+    assert q.filter_stats['bytes_removed'] == 16
+
+    # Adjacent and overlapping DATA commands are merged
+    d = np.arange(8, dtype=np.uint8)
+    cmds1 = [('DATA', 3, 0, d[:4]), ('DATA', 3, 4, d[4:]),
+             ('DATA', 3, 2, d[:2]),
+             ('DATA', 3, 20, d),  # not adjacent
+             ('DRAW', 1, 'points', (0, 10)),
+             ('DATA', 3, 28, d)]  # not merged across draw
+    cmds2 = q._filter(cmds1, parser)
+    assert [c[0] for c in cmds2] == ['DATA', 'DATA', 'DRAW', 'DATA']
+    assert cmds2[0][2] == 0
+    assert list(cmds2[0][3]) == [0, 1, 0, 1, 4, 5, 6, 7]
+    assert cmds2[1][2] == 20
+
+    # Data commands for textures are not merged
+    cmds1 = [('DATA', 4, (0, 0), d), ('DATA', 4, (0, 0), d)]
+    assert len(q._filter(cmds1, parser)) == 2
+
+    # Objects that are created and deleted without being used are removed
+    cmds1 = [('CREATE', 5, 'VertexBuffer'), ('SIZE', 5, 8),
+             ('DATA', 5, 0, d), ('ATTRIBUTE', 1, 'a_c', 'float', (5, 4, 0)),
+             ('CREATE', 6, 'Texture2D'), ('TEXTURE', 1, 's_d', 6),
+             ('DELETE', 5), ('DRAW', 1, 'points', (0, 10)), ('DELETE', 6)]
+    cmds2 = q._filter(cmds1, parser)
+    assert [c[0] for c in cmds2] == ['CREATE', 'TEXTURE', 'DRAW', 'DELETE']
+
+
+def test_parser():
+    gl.use_gl('stub')
+    try:
+        calls = gl.current_backend._proxy.calls
+        parser = glir.GlirParser()
+        vert = 'attribute vec2 a_pos; void main() {gl_Position = a_pos;}'
+        frag = 'void main() {gl_FragColor = vec4(1.0);}'
+        data = np.zeros((10, 2), np.float32)
+        parser.parse([('CURRENT', 0),
+                      ('CREATE', 1, 'Program'),
+                      ('CREATE', 2, 'VertexBuffer'),
+                      ('SHADERS', 1, vert, frag),
+                      ('SIZE', 2, data.nbytes),
+                      ('DATA', 2, 0, data),
+                      ('ATTRIBUTE', 1, 'a_pos', 'vec2', (2, 8, 0)),
+                      ('FUNC', 'glClearColor', 0.0, 0.0, 0.0, 1.0),
+                      ('FUNC', 'glBlendFunc', 'src_alpha', 'one'),
+                      ('DRAW', 1, 'triangles', (0, 10)),
+                      ('DRAW', 1, 'points', (0, 10))])
+        assert isinstance(parser.get_object(1), glir.GlirProgram)
+        assert isinstance(parser.get_object(2), glir.GlirVertexBuffer)
+        assert calls['glDrawArrays'] == 2
+        assert calls['glBlendFunc'] == 1
+        assert glir.as_enum('src_alpha') == gl.GL_SRC_ALPHA
+        # Invalid commands and objects
+        parser.parse([('FUNC', 'glFooBar')])  # warning
+        parser.parse([('FOO', 1)])  # warning
+        assert_raises(RuntimeError, parser.parse, [('DRAW', 3, 'points', ())])
+        # Deleted objects are ignored
+        parser.parse([('DELETE', 2), ('DATA', 2, 0, data)])
+        assert parser.get_object(2) == glir.JUST_DELETED
+    finally:
+        gl.use_gl()
+
+
+def test_shared_programs():
+    gl.use_gl('stub')
+    try:
+        calls = gl.current_backend._proxy.calls
+        calls.clear()
+        parser = glir.GlirParser()
+        vert = 'uniform float u_a; void main() {gl_Position = vec4(u_a);}'
+        frag = 'void main() {gl_FragColor = vec4(1.0);}'
+        u1, u2 = np.ones(1, np.float32), np.zeros(1, np.float32)
+        parser.parse([('CREATE', 1, 'Program'),
+                      ('CREATE', 2, 'Program'),
+                      ('SHADERS', 1, vert, frag),
+                      ('SHADERS', 2, vert, frag),
+                      ('UNIFORM', 1, 'u_a', 'float', u1),
+                      ('UNIFORM', 2, 'u_a', 'float', u2)])
+        # Programs with the same code share one GL program
+        p1, p2 = parser.get_object(1), parser.get_object(2)
+        assert p1.handle == p2.handle
+        assert calls['glLinkProgram'] == 1
+        # The uniforms of the program that draws are applied
+        assert calls['glUniform1fv'] == 1
+        parser.parse([('DRAW', 1, 'points', (0, 1))])
+        assert calls['glUniform1fv'] == 1
+        parser.parse([('DRAW', 2, 'points', (0, 1)),
+                      ('DRAW', 2, 'points', (0, 1))])
+        assert calls['glUniform1fv'] == 2
+        parser.parse([('DRAW', 1, 'points', (0, 1))])
+        assert calls['glUniform1fv'] == 3
+        # Different code gives a new GL program
+        parser.parse([('SHADERS', 2, vert + ' ', frag)])
+        assert p1.handle != p2.handle
+        assert calls['glLinkProgram'] == 2
+        # GL programs are deleted when no longer used
+        parser.parse([('SHADERS', 1, vert + ' ', frag)])
+        assert p1.handle == p2.handle
+        assert calls['glDeleteProgram'] == 1
+        parser.parse([('DELETE', 1)])
+        assert calls['glDeleteProgram'] == 1
+        parser.parse([('DELETE', 2)])
+        assert calls['glDeleteProgram'] == 2
+        assert parser._programs == {}
+    finally:
+        gl.use_gl()
+
+
+def test_instanced_drawing():
+    gl.use_gl('stub')
+    try:
+        calls = gl.current_backend._proxy.calls
+        calls.clear()
+        parser = glir.GlirParser()
+        assert parser.supports_instancing()
+        vert = ('attribute vec2 a_pos; attribute vec2 a_offset; '
+                'void main() {gl_Position = vec4(a_pos + a_offset, 0, 1);}')
+        frag = 'void main() {gl_FragColor = vec4(1.0);}'
+        data = np.zeros((4, 2), np.float32)
+        parser.parse([('CREATE', 1, 'Program'),
+                      ('CREATE', 2, 'VertexBuffer'),
+                      ('SIZE', 2, data.nbytes),
+                      ('DATA', 2, 0, data),
+                      ('SHADERS', 1, vert, frag),
+                      ('ATTRIBUTE', 1, 'a_pos', 'vec2', (2, 8, 0)),
+                      ('ATTRIBUTE', 1, 'a_offset', 'vec2', (2, 8, 0)),
+                      ('DIVISOR', 1, 'a_offset', 1),
+                      ('DRAW', 1, 'triangles', (0, 4), 10)])
+        assert calls['glDrawArraysInstanced'] == 1
+        assert calls.get('glDrawArrays', 0) == 0
+        assert calls['glVertexAttribDivisor'] == 2
+        # Divisors are only set when they change
+        parser.parse([('DRAW', 1, 'triangles', (0, 4), 10),
+                      ('DRAW', 1, 'triangles', (0, 4))])
+        assert calls['glVertexAttribDivisor'] == 2
+        assert calls['glDrawArrays'] == 1
+        parser.parse([('DIVISOR', 1, 'a_offset', 0),
+                      ('DRAW', 1, 'triangles', (0, 4), 10)])
+        assert calls['glVertexAttribDivisor'] == 3
+        assert calls['glDrawArraysInstanced'] == 3
+    finally:
+        gl.use_gl()
+
+
+def test_attribute_caching():
+    vert = ('attribute vec2 a_pos; attribute float a_size; '
+            'void main() {gl_Position = vec4(a_pos * a_size, 0, 1);}')
+    frag = 'void main() {gl_FragColor = vec4(1.0);}'
+    data = np.zeros((4, 2), np.float32)
+    commands = [('CREATE', 1, 'Program'),
+                ('CREATE', 2, 'Program'),
+                ('CREATE', 3, 'VertexBuffer'),
+                ('CREATE', 4, 'VertexBuffer')]
+    for id_ in (3, 4):
+        commands += [('SIZE', id_, data.nbytes), ('DATA', id_, 0, data)]
+    for id_, vbo_id in ((1, 3), (2, 4)):
+        commands += [('SHADERS', id_, vert, frag),
+                     ('ATTRIBUTE', id_, 'a_pos', 'vec2', (vbo_id, 8, 0)),
+                     ('ATTRIBUTE', id_, 'a_size', 'float', (0, 1.0))]
+    draw1 = ('DRAW', 1, 'points', (0, 4))
+    draw2 = ('DRAW', 2, 'points', (0, 4))
+    gl.use_gl('stub')
+    try:
+        calls = gl.current_backend._proxy.calls
+        for vao in (False, True):
+            calls.clear()
+            parser = glir.GlirParser()
+            parser.use_vertex_arrays = vao
+            parser.parse(commands + [draw1])
+            assert calls['glVertexAttribPointer'] == 1
+            assert calls['glVertexAttrib1f'] == 1
+            # Drawing again needs no attribute calls
+            avoided = parser.avoided_calls
+            parser.parse([draw1])
+            assert calls['glVertexAttribPointer'] == 1
+            assert calls['glVertexAttrib1f'] == 1
+            assert parser.avoided_calls - avoided == 3 + 3
+            # Another program with another buffer, at the same location.
+            # Without VAOs, the buffer is bound at each switch.
+            parser.parse([draw2, draw1, draw2])
+            assert calls['glVertexAttribPointer'] == (2 if vao else 4)
+            # Resizing a buffer invalidates bindings to that buffer
+            parser.parse([('SIZE', 3, 2 * data.nbytes), draw1, draw2])
+            assert calls['glVertexAttribPointer'] == (3 if vao else 6)
+            # As does setting an attribute
+            parser.parse([('ATTRIBUTE', 1, 'a_pos', 'vec2', (3, 8, 8)), 
+                          draw1])
+            assert calls['glVertexAttribPointer'] == (4 if vao else 7)
+            # The values of constant attributes are context state
+            assert calls['glVertexAttrib1f'] == 1
+            parser.parse([('ATTRIBUTE', 2, 'a_size', 'float', (0, 2.0)), 
+                          draw2, draw1])
+            assert calls['glVertexAttrib1f'] == 3
+            # Making the context current resets the context state
+            parser.parse([('CURRENT', 0), draw1])
+            assert calls['glVertexAttrib1f'] == 4
+            assert calls['glVertexAttribPointer'] == (4 if vao else 10)
+            if vao:
+                assert calls['glGenVertexArrays'] == 2
+                parser.parse([('DELETE', 1), ('DELETE', 2)])
+                assert calls['glDeleteVertexArrays'] == 2
+            else:
+                assert 'glGenVertexArrays' not in calls
+    finally:
+        gl.use_gl()
+
+
+def test_state_tracking():
+    gl.use_gl('stub')
+    try:
+        calls = gl.current_backend._proxy.calls
+        calls.clear()
+        parser = glir.GlirParser()
+        parser.parse([('CURRENT', 0),
+                      ('FUNC', 'glEnable', 'blend'),
+                      ('FUNC', 'glEnable', gl.GL_BLEND),
+                      ('FUNC', 'glDisable', 'depth_test'),
+                      ('FUNC', 'glBlendFuncSeparate', 'src_alpha',
+                       'one_minus_src_alpha', 'one', 'one'),
+                      ('FUNC', 'glClear', gl.GL_COLOR_BUFFER_BIT),
+                      ('FUNC', 'glClear', gl.GL_COLOR_BUFFER_BIT)])
+        assert calls['glEnable'] == 1 + 2  # point sprites are enabled too
+        assert calls['glClear'] == 2
+        assert parser.dropped_state_changes == 1
+        # Calls are only made if the state changes
+        parser.parse([('FUNC', 'glBlendFunc', 'one', 'one'),
+                      ('FUNC', 'glBlendFuncSeparate', 'one', 'one', 
+                       'one', 'one'),
+                      ('FUNC', 'glDisable', 'blend'),
+                      ('FUNC', 'glEnable', 'blend'),
+                      ('FUNC', 'glStencilOp', 'keep', 'keep', 'keep'),
+                      ('FUNC', 'glStencilOpSeparate', 'back', 
+                       'keep', 'keep', 'keep'),
+                      ('FUNC', 'glDisable', 'depth_test')])
+        assert calls['glBlendFunc'] == 1
+        assert calls['glBlendFuncSeparate'] == 1
+        assert calls['glEnable'] == 1 + 3
+        assert calls['glDisable'] == 2
+        assert calls['glStencilOp'] == 1
+        assert 'glStencilOpSeparate' not in calls
+        assert parser.dropped_state_changes == 4
+        # The state is reset when a context is made current, and the
+        # number of dropped changes can be reported per frame
+        parser.verbose = True
+        with use_log_level('info', record=True, print_msg=False) as log:
+            parser.parse([('CURRENT', 0), ('FUNC', 'glEnable', 'blend')])
+        assert calls['glEnable'] == 1 + 3 + 3
+        assert 'Dropped 4 of 11 GL state changes' in log[0]
+    finally:
+        gl.use_gl()
+
+
 @requires_application()
 def test_log_parser():
     glir_file = tempfile.TemporaryFile(mode='r+')
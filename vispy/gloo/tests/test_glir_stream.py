@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy import gloo
+from vispy.gloo import gl, glir
+from vispy.gloo.context import FakeCanvas
+from vispy.gloo.glir_stream import (encode_commands, decode_commands,
+                                    GlirWriter, GlirReader)
+from vispy.testing import run_tests_if_main, assert_raises, assert_equal
+
+
+def test_encode_decode():
+    vbo = np.zeros(10, [('a_pos', np.float32, 2), ('a_col', np.uint8, 4)])
+    vbo['a_pos'] = np.random.rand(10, 2)
+    tex = np.arange(3 * 4 * 2, dtype=np.uint16).reshape(3, 4, 2)
+    # A dtype whose description takes more than 255 characters
+    long_dtype = np.zeros(3, [('field_%d' % i, np.float32)
+                              for i in range(12)])
+    long_dtype['field_11'] = 1
+    commands = [('CURRENT', 0),
+                ('FUNC', 'glClearColor', 0.0, 0.5, 1.0, 1.0),
+                ('CREATE', 1, 'Program'),
+                ('SHADERS', 1, 'void main() {}', u'void main() {\xe9}'),
+                ('UNIFORM', 1, 'u_color', 'vec4', np.ones(4, np.float32)),
+                ('ATTRIBUTE', 1, 'a_pos', 'vec2', (2, 12, 0)),
+                ('DATA', 2, 0, vbo),
+                ('DATA', 3, (1, 0), tex),
+                ('SIZE', 3, (3, 4, 2), 'luminance_alpha', None),
+                ('DRAW', 1, 'triangles', (0, 10)),
+                ('DATA', 4, 0, long_dtype),
+                ('FOO', 4, True, False, 2 ** 40, 'x' * 300),  # unknown
+                ('BAR' * 100, 5)]  # unknown, with a long name
+    for compress in (False, True):
+        data = encode_commands(commands, compress)
+        commands2 = decode_commands(data)
+        assert_equal(len(commands2), len(commands))
+        for c1, c2 in zip(commands, commands2):
+            assert_equal(c1[0], c2[0])
+            for a1, a2 in zip(c1[1:], c2[1:]):
+                if isinstance(a1, np.ndarray):
+                    assert_equal(a1.dtype, a2.dtype)
+                    assert_array_equal(a1, a2)
+                else:
+                    assert_equal(a1, a2)
+    # Compression only kicks in for larger arrays that compress well
+    big = [('DATA', 2, 0, np.zeros(10000, np.float32))]
+    assert len(encode_commands(big, True)) < len(encode_commands(big))
+    assert_raises(TypeError, encode_commands, [('FOO', object())])
+
+
+def test_writer_reader():
+    f = io.BytesIO()
+    writer = GlirWriter(f, compress=True)
+    writer.write([('CREATE', 1, 'VertexBuffer')])
+    writer.write([('SIZE', 1, 40), ('DATA', 1, 0, np.zeros(10, np.float32))])
+    writer.close()
+    f.seek(0)
+    reader = GlirReader(f)
+    assert_equal(reader.version, 1)
+    messages = list(reader)
+    assert_equal(len(messages), 2)
+    assert_equal(messages[0], [('CREATE', 1, 'VertexBuffer')])
+    assert_equal(messages[1][1][3].shape, (10,))
+    assert_raises(ValueError, GlirReader, io.BytesIO(b'nope'))
+
+
+def test_record_replay():
+    gl.use_gl('stub')
+    try:
+        # Record the commands of a canvas
+        canvas = FakeCanvas()
+        f = io.BytesIO()
+        writer = GlirWriter(f)
+        writer.attach(canvas)
+        program = gloo.Program('attribute vec2 a_pos; void main() {}',
+                               'void main() {}')
+        program['a_pos'] = np.zeros((10, 2), np.float32)
+        program.draw('points')
+        assert canvas.context.shared.parser.get_object(program.id)
+        writer.close()
+        # Replay into a fresh parser
+        f.seek(0)
+        parser = glir.GlirParser()
+        calls = gl.current_backend._proxy.calls
+        calls.clear()
+        GlirReader(f).replay(parser)
+        assert isinstance(parser.get_object(program.id), glir.GlirProgram)
+        assert_equal(calls['glDrawArrays'], 1)
+    finally:
+        gl.use_gl()
+
+
+run_tests_if_main()
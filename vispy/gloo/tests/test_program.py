@@ -282,5 +282,101 @@ class ProgramTest(unittest.TestCase):
         
         finally:
             forget_canvas(dummy_canvas)
+    
+    def test_draw_instanced(self):
+        vert = "attribute vec2 A; attribute float B; uniform float foo;"
+        
+        # GL implementation that supports instancing
+        dummy_canvas = DummyCanvas()
+        dummy_canvas.context.shared.parser.supports_instancing = lambda: True
+        glir = dummy_canvas.context.glir
+        set_current_canvas(dummy_canvas)
+        try:
+            program = Program(vert, "foo")
+            program['A'] = np.zeros((4, 2), np.float32)
+            program['B'] = np.zeros((3, ), np.float32)
+            program.set_divisor('B', 2)
+            # Not enough data for the number of instances
+            self.assertRaises(RuntimeError, program.draw, 'points',
+                              instances=7)
+            self.assertRaises(ValueError, program.draw, 'points',
+                              instances=0)
+            self.assertRaises(ValueError, program.set_divisor, 'B', -1)
+            self.assertRaises(ValueError, program.set_divisor, 'foo', 1)
+            glir.clear()
+            program.draw('points', instances=6)
+            commands = glir.clear()
+            assert ('DIVISOR', program.id, 'B', 2) in commands
+            assert commands[-1] == ('DRAW', program.id, 'points', (0, 4), 6)
+            # The divisor is only sent when it changes
+            program.draw('points', instances=6)
+            commands = glir.clear()
+            assert [c for c in commands if c[0] == 'DIVISOR'] == []
+            # A reset divisor is also sent for a plain draw
+            program.set_divisor('B', 0)
+            program['B'] = np.zeros((4, ), np.float32)
+            program.draw('points')
+            commands = glir.clear()
+            assert ('DIVISOR', program.id, 'B', 0) in commands
+            assert commands[-1] == ('DRAW', program.id, 'points', (0, 4))
+            program.set_divisor('B', 1)
+            program.draw('points', instances=4)
+            commands = glir.clear()
+            assert ('DIVISOR', program.id, 'B', 1) in commands
+        finally:
+            forget_canvas(dummy_canvas)
+        
+        # GL implementation that does not support instancing
+        dummy_canvas = DummyCanvas()
+        glir = dummy_canvas.context.glir
+        set_current_canvas(dummy_canvas)
+        try:
+            program = Program(vert, "foo")
+            program['A'] = np.arange(8, dtype=np.float32).reshape(4, 2)
+            program['B'] = np.arange(3, dtype=np.float32)
+            program.set_divisor('B', 2)
+            glir.clear()
+            # The array of B is kept in a shadow buffer, the one of A not
+            assert program['B'].shadow
+            assert not program['A'].shadow
+            program.draw('points', instances=6)
+            commands = glir.clear()
+            draws = [c for c in commands if c[0] == 'DRAW']
+            assert draws == [('DRAW', program.id, 'points', (0, 4))] * 6
+            # B is set to a constant value for each instance, and bound
+            # again after drawing
+            values = [c[4] for c in commands if c[0] == 'ATTRIBUTE' 
+                      and c[2] == 'B']
+            assert values[-7:] == [(0, 0.), (0, 0.), (0, 1.), (0, 1.),
+                                   (0, 2.), (0, 2.),
+                                   (program['B'].id, 4, 0)]
+            # Changes of the buffer are seen
+            program['B'].set_data(np.array([5, 6, 7], np.float32))
+            program.draw('points', instances=1)
+            commands = glir.clear()
+            assert ('ATTRIBUTE', program.id, 'B', 'float', 
+                    (0, 5.)) in commands
+            # Indices are used as they are
+            indices = gloo.IndexBuffer(np.array([0, 1, 2], np.uint32))
+            program.draw('triangles', indices, instances=2)
+            draws = [c for c in glir.clear() if c[0] == 'DRAW']
+            assert draws == [('DRAW', program.id, 'triangles',
+                              (indices.id, 'UNSIGNED_INT', 3))] * 2
+            # After the first draw, arrays are not kept for attributes
+            # without divisor
+            program['A'] = np.zeros((4, 2), np.float32)
+            program.set_divisor('A', 1)
+            self.assertRaises(RuntimeError, program.draw, 'points',
+                              instances=2)
+            # But they are if the divisor is set first
+            program['A'] = None
+            program['A'] = np.ones((4, 2), np.float32)
+            program.set_divisor('B', 0)
+            program.draw('points', instances=2)
+            commands = glir.clear()
+            assert ('ATTRIBUTE', program.id, 'A', 'vec2', 
+                    (0, 1., 1.)) in commands
+        finally:
+            forget_canvas(dummy_canvas)
 
 run_tests_if_main()
@@ -577,6 +577,31 @@ class TextureAtlasTest(unittest.TestCase):
         
         reg = T.get_free_region(129, 129)
         assert reg is None
+
+    def test_atlas_free_grow(self):
+        T = TextureAtlas((64, 64), max_shape=(128, 128))
+        regions = [T.get_free_region(20, 30) for i in range(6)]
+        assert regions[:4] == [(0, 0, 20, 30), (20, 0, 20, 30),
+                               (40, 0, 20, 30), (0, 30, 20, 30)]
+        assert T.n_shelves == 2
+        assert T.occupancy == 6 * 20 * 30 / 64. ** 2
+        assert T.get_free_region(20, 30) is None
+        # Freed regions are used again
+        T.free_region(regions[1])
+        assert T.get_free_region(10, 20) == (20, 0, 10, 20)
+        assert T.get_free_region(10, 30) == (30, 0, 10, 30)
+        # Empty shelves can be used for higher regions
+        for region in regions[3:]:
+            T.free_region(region)
+        assert T.n_shelves == 1
+        assert T.get_free_region(5, 34) == (0, 30, 5, 34)
+        # Growing keeps the regions
+        assert T.get_free_region(64, 10) is None
+        assert T.grow()
+        assert T.shape == (128, 128, 3)
+        assert T.get_free_region(64, 10) == (0, 64, 64, 10)
+        assert not T.grow()
+        assert T.shape == (128, 128, 3)
     
     
 # --------------------------------------------------------- Texture formats ---
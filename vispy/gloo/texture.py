@@ -641,16 +641,16 @@ class TextureEmulated3D(Texture2D):
 class TextureAtlas(Texture2D):
     """Group multiple small data regions into a larger texture.
 
-    The algorithm is based on the article by Jukka Jylänki : "A Thousand Ways
-    to Pack the Bin - A Practical Approach to Two-Dimensional Rectangle Bin
-    Packing", February 27, 2010. More precisely, this is an implementation of
-    the Skyline Bottom-Left algorithm based on C++ sources provided by Jukka
-    Jylänki at: http://clb.demon.fi/files/RectangleBinPack/.
+    The regions are packed in shelves (rows of regions), using the shelf
+    with the best fitting height. Regions can be freed, after which their
+    space is reused, and the atlas can grow up to a maximum shape.
 
     Parameters
     ----------
     shape : tuple of int
         Texture width and height (optional).
+    max_shape : tuple of int
+        The maximum texture width and height when growing (optional).
 
     Notes
     -----
@@ -661,15 +661,30 @@ class TextureAtlas(Texture2D):
         >>> bounds = atlas.get_free_region(20, 30)
         >>> atlas.set_region(bounds, np.random.rand(20, 30).T)
     """
-    def __init__(self, shape=(1024, 1024)):
+    def __init__(self, shape=(1024, 1024), max_shape=(4096, 4096)):
         shape = np.array(shape, int)
         assert shape.ndim == 1 and shape.size == 2
         shape = tuple(2 ** (np.log2(shape) + 0.5).astype(int)) + (3,)
-        self._atlas_nodes = [(0, 0, shape[1])]
+        self._max_shape = tuple(max(m, s) for m, s in zip(max_shape, shape))
+        self._shelves = []  # [y, height, x of the free space]
+        self._free_regions = []  # (x, y, w, h) of freed regions
+        self._used_area = 0
         data = np.zeros(shape, np.float32)
         super(TextureAtlas, self).__init__(data, interpolation='linear', 
                                            wrapping='clamp_to_edge')
 
+    @property
+    def occupancy(self):
+        """ The fraction of the texture that is allocated to regions
+        """
+        return self._used_area / float(self._shape[0] * self._shape[1])
+
+    @property
+    def n_shelves(self):
+        """ The number of shelves (rows of regions)
+        """
+        return len(self._shelves)
+
     def get_free_region(self, width, height):
         """Get a free region of given size and allocate it
 
@@ -686,66 +701,101 @@ class TextureAtlas(Texture2D):
             A newly allocated region as (x, y, w, h) or None
             (if failed).
         """
-        best_height = best_width = np.inf
-        best_index = -1
-        for i in range(len(self._atlas_nodes)):
-            y = self._fit(i, width, height)
-            if y >= 0:
-                node = self._atlas_nodes[i]
-                if (y+height < best_height or
-                        (y+height == best_height and node[2] < best_width)):
-                    best_height = y+height
-                    best_index = i
-                    best_width = node[2]
-                    region = node[0], y, width, height
-        if best_index == -1:
+        # A freed region with the least space left
+        best, best_area = None, np.inf
+        for i, (x, y, w, h) in enumerate(self._free_regions):
+            if w >= width and h >= height and w * h < best_area:
+                best, best_area = i, w * h
+        if best is not None:
+            x, y, w, h = self._free_regions.pop(best)
+            if w > width:  # the rest of the width is still free
+                self._free_regions.append((x + width, y, w - width, h))
+            return self._allocate(x, y, width, height)
+        # The shelf with the best fitting height, or a new one
+        best, best_height = None, np.inf
+        for shelf in self._shelves:
+            if (height <= shelf[1] < best_height and
+                    shelf[2] + width <= self._shape[1]):
+                best, best_height = shelf, shelf[1]
+        top = self._shelves[-1][0] + self._shelves[-1][1] \
+            if self._shelves else 0
+        new_shelf = (top + height <= self._shape[0] and
+                     width <= self._shape[1])
+        if new_shelf and (best is None or best_height > 2 * height):
+            best = [top, height, 0]
+            self._shelves.append(best)
+        elif best is None:
             return None
+        elif best[2] == 0 and best_height > 2 * height:
+            # split an empty shelf that is too high
+            i = self._shelves.index(best)
+            self._shelves.insert(i + 1, [best[0] + height,
+                                         best_height - height, 0])
+            best[1] = height
+        x = best[2]
+        best[2] += width
+        return self._allocate(x, best[0], width, height)
+
+    def _allocate(self, x, y, width, height):
+        self._used_area += width * height
+        return x, y, width, height
+
+    def free_region(self, region):
+        """Free a region that was allocated with get_free_region
 
-        node = region[0], region[1] + height, width
-        self._atlas_nodes.insert(best_index, node)
-        i = best_index+1
-        while i < len(self._atlas_nodes):
-            node = self._atlas_nodes[i]
-            prev_node = self._atlas_nodes[i-1]
-            if node[0] < prev_node[0]+prev_node[2]:
-                shrink = prev_node[0]+prev_node[2] - node[0]
-                x, y, w = self._atlas_nodes[i]
-                self._atlas_nodes[i] = x+shrink, y, w-shrink
-                if self._atlas_nodes[i][2] <= 0:
-                    del self._atlas_nodes[i]
-                    i -= 1
-                else:
-                    break
-            else:
+        Parameters
+        ----------
+        region : tuple
+            The region (x, y, w, h).
+        """
+        x, y, w, h = region
+        self._used_area -= w * h
+        for shelf in self._shelves:
+            if shelf[0] == y:
+                h = shelf[1]  # the whole height is free
                 break
-            i += 1
-
-        # Merge nodes
-        i = 0
-        while i < len(self._atlas_nodes)-1:
-            node = self._atlas_nodes[i]
-            next_node = self._atlas_nodes[i+1]
-            if node[1] == next_node[1]:
-                self._atlas_nodes[i] = node[0], node[1], node[2]+next_node[2]
-                del self._atlas_nodes[i+1]
+        if x + w == shelf[2]:
+            # At the end of the shelf, also give back the free regions
+            # that end up at the end
+            shelf[2] = x
+            ends = dict(((r[0] + r[2], r[1]), r) for r in self._free_regions)
+            while (shelf[2], y) in ends:
+                region = ends.pop((shelf[2], y))
+                self._free_regions.remove(region)
+                shelf[2] = region[0]
+        else:
+            self._free_regions.append((x, y, w, h))
+        if shelf[2] == 0:
+            self._merge_empty_shelves()
+
+    def _merge_empty_shelves(self):
+        """Join adjacent empty shelves, and remove empty shelves at the
+        top, so that their space can be used for higher regions"""
+        shelves = []
+        for shelf in self._shelves:
+            if shelves and shelf[2] == 0 and shelves[-1][2] == 0:
+                shelves[-1][1] += shelf[1]
             else:
-                i += 1
-
-        return region
-
-    def _fit(self, index, width, height):
-        """Test if region (width, height) fit into self._atlas_nodes[index]"""
-        node = self._atlas_nodes[index]
-        x, y = node[0], node[1]
-        width_left = width
-        if x+width > self._shape[1]:
-            return -1
-        i = index
-        while width_left > 0:
-            node = self._atlas_nodes[i]
-            y = max(y, node[1])
-            if y+height > self._shape[0]:
-                return -1
-            width_left -= node[2]
-            i += 1
-        return y
+                shelves.append(shelf)
+        if shelves and shelves[-1][2] == 0:
+            shelves.pop()
+        self._shelves = shelves
+
+    def grow(self):
+        """Double the width and height of the atlas, up to the maximum
+        shape
+
+        The allocated regions keep their place, but the data of the
+        texture is lost, so it must be set again.
+
+        Returns
+        -------
+        grown : bool
+            False if the atlas has the maximum shape already.
+        """
+        shape = tuple(min(2 * s, m) for s, m in zip(self._shape[:2],
+                                                    self._max_shape))
+        if shape == self._shape[:2]:
+            return False
+        self.resize(shape + self._shape[2:])
+        return True
@@ -37,6 +37,13 @@ class SubScene(Node):
         self._systems['mouse'] = MouseInputSystem()
         self._drawing = False
     
+    @property
+    def drawing_system(self):
+        """ The DrawingSystem that draws this subscene, e.g. to enable
+        culling of the visuals that are outside of the view.
+        """
+        return self._systems['draw']
+
     def draw(self, event):
         # Temporary workaround to avoid infinite recursion. A better solution
         # would be for ViewBox and Canvas to handle the systems, rather than
@@ -5,6 +5,9 @@
 from __future__ import division
 
 import sys
+import weakref
+
+import numpy as np
 
 from ..visuals.visual import Visual
 from ..util.logs import logger, _handle_exception
@@ -15,11 +18,166 @@ class DrawingSystem(object):
     """ Simple implementation of a drawing engine. There is one system
     per viewbox.
 
+    The first traversal of the scenegraph is recorded in a flat draw
+    list, which is replayed on subsequent draws. The list is rebuilt
+    when a child is added or removed anywhere in the recorded graph, or
+    when the visibility of a node that has children changes (such nodes
+    may draw their children themselves). Transforms are not part of the
+    list; they are resolved by the event when a node is drawn.
+
+    If culling is enabled, visuals that are entirely outside of the
+    current viewport (i.e. outside the camera's view) are not drawn. To
+    test this, the box given by ``Visual.bounds()`` is mapped to clip
+    coordinates; visuals without bounds, or with a nonlinear transform,
+    are always drawn. Culling is off by default, because the bounds do
+    not include what visuals draw around their data (e.g. markers, line
+    widths, or text at an anchor), so such parts within ``cull_margin``
+    of the view would not be drawn.
+    The numbers of drawn and culled visuals of the last draw are
+    available as ``drawn_count`` and ``culled_count``.
+
+    Parameters
+    ----------
+    retained : bool
+        Whether to record and replay a draw list. If False, the graph is
+        traversed on every draw.
+    culling : bool
+        Whether to skip visuals that are outside of the view (default
+        False).
+    cull_margin : float
+        Margin in framebuffer pixels by which the view is extended
+        for culling, to account for e.g. line widths and marker sizes.
     """
+    def __init__(self, retained=True, culling=False, cull_margin=20):
+        self.retained = retained
+        self.culling = culling
+        self.cull_margin = cull_margin
+        self.rebuild_count = 0
+        self.drawn_count = 0
+        self.culled_count = 0
+        self._corners = weakref.WeakKeyDictionary()
+        self._clip_limit = None
+        self._root = None
+        self._draw_list = None
+        self._visible_checks = []
+        self._watched = []
+
+    def invalidate(self, event=None):
+        """ Discard the draw list, so that it is rebuilt on the next draw.
+        """
+        # Nodes are unwatched on the next draw; disconnecting here could
+        # interfere with the emitter that invoked us.
+        self._draw_list = None
+        self._visible_checks = []
+
+    def _unwatch(self):
+        for node in self._watched:
+            node.events.children_change.disconnect(self.invalidate)
+        self._watched = []
+
     def process(self, event, node):
+        self.drawn_count = self.culled_count = 0
+        self._clip_limit = None
+        if not self.retained:
+            if self._watched:
+                self.invalidate()
+                self._unwatch()
+            return self._process(event, node, None)
+        if self._draw_list is not None:
+            if node is not self._root:
+                self.invalidate()
+            else:
+                for sub_node, visible in self._visible_checks:
+                    if sub_node.visible != visible:
+                        self.invalidate()
+                        break
+        if self._draw_list is None:
+            self._record(event, node)
+        else:
+            self._replay(event)
+
+    def _record(self, event, node):
+        """ Draw by traversing the graph, and record the draw list.
+        """
+        self._unwatch()
+        draw_list = []
+        self._process(event, node, draw_list)
+        self._root = node
+        self._draw_list = draw_list
+        self.rebuild_count += 1
+        for depth, sub_node, is_visual in draw_list:
+            sub_node.events.children_change.connect(self.invalidate)
+            self._watched.append(sub_node)
+            if sub_node._children:
+                self._visible_checks.append((sub_node, sub_node.visible))
+
+    def _replay(self, event):
+        """ Draw the nodes in the recorded draw list.
+        """
+        prof = Profiler()
+        depth = 0
+        try:
+            for node_depth, node, is_visual in self._draw_list:
+                if node_depth:
+                    while depth >= node_depth:
+                        event.pop_node()
+                        depth -= 1
+                    event.push_node(node)
+                    depth += 1
+                if is_visual and node.visible and self._in_view(event, node):
+                    try:
+                        node.draw(event)
+                    except Exception:
+                        _handle_exception(False, 'reminders', self, node=node)
+                    prof('draw %s', node)
+        finally:
+            while depth > 0:
+                event.pop_node()
+                depth -= 1
+
+    def _in_view(self, event, node):
+        """ Return whether the node may be visible, and count it as
+        drawn or culled.
+        """
+        if self.culling and self._outside_view(event, node):
+            self.culled_count += 1
+            return False
+        self.drawn_count += 1
+        return True
+
+    def _outside_view(self, event, node):
+        bounds = tuple([node.bounds('visual', axis) for axis in range(3)])
+        if None in bounds:
+            return False
+        cached = self._corners.get(node)
+        if cached is None or cached[0] != bounds:
+            x, y, z = [(min(b), max(b)) for b in bounds]
+            corners = np.array([(x[i], y[j], z[k], 1.) for i in (0, 1)
+                                for j in (0, 1) for k in (0, 1)])
+            cached = self._corners[node] = bounds, corners
+        transform = event.get_full_transform()
+        if not transform.Linear:
+            return False
+        if self._clip_limit is None:
+            # Size of the margin in normalized device coordinates
+            margin = event.framebuffer_to_render.map([(0, 0),
+                                                      (self.cull_margin,
+                                                       self.cull_margin)])
+            margin = np.abs(margin[1, :2] - margin[0, :2])
+            self._clip_limit = np.append(1. + margin, 1.)
+        pos = transform.map(cached[1])
+        limit = pos[:, 3:] * self._clip_limit
+        # Outside if all corners are beyond the same clipping plane
+        return bool(np.any(np.all(pos[:, :3] > limit, axis=0) |
+                           np.all(pos[:, :3] < -limit, axis=0)))
+
+    def _process(self, event, node, draw_list, depth=0):
         prof = Profiler(str(node))
+        is_visual = isinstance(node, Visual)
+        if draw_list is not None:
+            draw_list.append((depth, node, is_visual))
         # Draw this node if it is a visual
-        if isinstance(node, Visual) and node.visible:
+        if is_visual and node.visible and self._in_view(event, node):
             try:
                 node.draw(event)
                 prof('draw')
@@ -35,7 +193,7 @@ class DrawingSystem(object):
                 continue
             event.push_node(sub_node)
             try:
-                self.process(event, sub_node)
+                self._process(event, sub_node, draw_list, depth + 1)
             finally:
                 event.pop_node()
             prof('process child %s', sub_node)
@@ -0,0 +1,137 @@
+from vispy.scene.node import Node
+from vispy.scene.subscene import SubScene
+from vispy.scene.events import SceneDrawEvent
+from vispy.visuals.transforms import STTransform, LogTransform
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+class DummyCanvas(object):
+    dpi = 96
+
+    def __init__(self):
+        # 100x100 framebuffer
+        self.render_cs = Node(name='render_cs')
+        self.framebuffer_cs = Node(parent=self.render_cs)
+        self.framebuffer_cs.transform = STTransform(scale=(0.02, 0.02),
+                                                    translate=(-1, -1))
+
+
+class DrawNode(Node):
+    def __init__(self, drawn, **kwargs):
+        Node.__init__(self, **kwargs)
+        self._drawn = drawn
+
+    def draw(self, event):
+        self._drawn.append((self.name, len(event.path)))
+
+
+class BoxNode(DrawNode):
+    def __init__(self, drawn, box, **kwargs):
+        DrawNode.__init__(self, drawn, **kwargs)
+        self.box = box
+
+    def bounds(self, mode, axis):
+        return self.box[axis]
+
+
+class HandlingNode(DrawNode):
+    """ Draws its children itself """
+    def draw(self, event):
+        DrawNode.draw(self, event)
+        for child in self.children:
+            event.handled_children.append(child)
+
+
+def test_draw_list():
+    drawn = []
+    scene = SubScene()
+    a = DrawNode(drawn, name='a', parent=scene)
+    b = DrawNode(drawn, name='b', parent=a)
+    DrawNode(drawn, name='c', parent=scene)
+    system = scene._systems['draw']
+
+    def draw():
+        del drawn[:]
+        event = SceneDrawEvent(None, DummyCanvas())
+        event.push_node(scene)
+        scene.draw(event)
+        event.pop_node()
+        assert_equal(event.path, [])
+        return list(drawn)
+
+    expected = [('a', 2), ('b', 3), ('c', 2)]
+    assert_equal(draw(), expected)
+    assert_equal(system.rebuild_count, 1)
+    # Static scene: the list is replayed
+    assert_equal(draw(), expected)
+    assert_equal(system.rebuild_count, 1)
+    # Visibility of leaves is checked on each draw
+    b.visible = False
+    assert_equal(draw(), [('a', 2), ('c', 2)])
+    b.visible = True
+    assert_equal(system.rebuild_count, 1)
+    # Structure changes invalidate the list
+    DrawNode(drawn, name='d', parent=b)
+    assert_equal(draw(), expected[:2] + [('d', 4), ('c', 2)])
+    assert_equal(system.rebuild_count, 2)
+    b.parent = scene
+    assert_equal(draw(), [('a', 2), ('c', 2), ('b', 2), ('d', 3)])
+    assert_equal(system.rebuild_count, 3)
+    # Nodes that handle their children depend on their visibility
+    h = HandlingNode(drawn, name='h', parent=scene)
+    DrawNode(drawn, name='e', parent=h)
+    assert_equal(draw()[-1], ('h', 2))
+    h.visible = False
+    assert_equal(draw()[-1], ('e', 3))
+    assert_equal(system.rebuild_count, 5)
+    # Immediate mode gives the same results
+    system.retained = False
+    assert_equal(draw()[-1], ('e', 3))
+    assert_equal(system.rebuild_count, 5)
+    h.visible = True
+    assert_equal(draw()[-1], ('h', 2))
+
+
+def test_culling():
+    drawn = []
+    scene = SubScene()
+    # The view spans -10 to 10 in scene coordinates
+    scene.transform = STTransform(scale=(0.1, 0.1))
+    z = (0, 0)
+    BoxNode(drawn, ((0, 1), (0, 1), z), name='in', parent=scene)
+    BoxNode(drawn, ((12, 11), (0, 1), z), name='margin', parent=scene)
+    out = BoxNode(drawn, ((50, 60), (0, 1), z), name='out', parent=scene)
+    BoxNode(drawn, ((-20, 20), (-20, 20), z), name='around', parent=scene)
+    DrawNode(drawn, name='nobounds', parent=scene)
+    log = BoxNode(drawn, ((50, 60), (0, 1), z), name='log', parent=scene)
+    log.transform = LogTransform()
+    system = scene.drawing_system
+    assert not system.culling
+    system.culling = True
+
+    def draw():
+        del drawn[:]
+        event = SceneDrawEvent(None, DummyCanvas())
+        event.push_node(scene)
+        scene.draw(event)
+        event.pop_node()
+        return [name for name, depth in drawn]
+
+    for i in range(2):
+        assert_equal(draw(), ['in', 'margin', 'around', 'nobounds', 'log'])
+        assert_equal((system.drawn_count, system.culled_count), (6, 1))
+    # Transforms and bounds are taken into account on each draw
+    out.transform = STTransform(translate=(-55, 0))
+    assert_equal(len(draw()), 6)
+    out.transform = STTransform(translate=(0, 50))
+    assert_equal(len(draw()), 5)
+    out.box = ((0, 1), (-60, -40), z)
+    assert_equal(len(draw()), 6)
+    assert_equal(system.rebuild_count, 1)
+    system.culling = False
+    out.transform = STTransform(translate=(100, 0))
+    assert_equal(len(draw()), 6)
+    assert_equal((system.drawn_count, system.culled_count), (7, 0))
+
+
+run_tests_if_main()
@@ -184,11 +184,25 @@ class EventEmitter(object):
         String indicating the event type (e.g. mouse_press, key_release)
     event_class : subclass of Event
         The class of events that this emitter will generate.
+    reuse_events : bool
+        If True, the same Event instance is reinitialized and emitted each
+        time the emitter is called with keyword arguments, instead of
+        creating a new one. Only use this if no callback keeps a reference
+        to the event after it returns.
+
+    Notes
+    -----
+    When nothing is connected to the emitter (or it is blocked), no event is
+    created and calling the emitter with keyword arguments returns None.
     """
 
-    def __init__(self, source=None, type=None, event_class=Event):
+    def __init__(self, source=None, type=None, event_class=Event,
+                 reuse_events=False):
         self._callbacks = []
         self._callback_refs = []
+        # tuple of (callback, attr) pairs that are invoked by __call__, or
+        # None if it needs to be rebuilt (see _compile_callbacks)
+        self._callback_pass_list = None
 
         # count number of times this emitter is blocked for each callback.
         self._blocked = {None: 0}
@@ -206,6 +220,9 @@ class EventEmitter(object):
         self._ignore_callback_errors = True
         self.print_callback_errors = 'reminders'
 
+        self.reuse_events = reuse_events
+        self._event = None
+
     @property
     def ignore_callback_errors(self):
         """Whether exceptions during callbacks will be caught by the emitter
@@ -369,6 +386,7 @@ class EventEmitter(object):
         # actually add the callback
         self._callbacks.insert(idx, callback)
         self._callback_refs.insert(idx, ref)
+        self._callback_pass_list = None
         return callback  # allows connect to be used as a decorator
 
     def disconnect(self, callback=None):
@@ -387,6 +405,7 @@ class EventEmitter(object):
                 idx = self._callbacks.index(callback)
                 self._callbacks.pop(idx)
                 self._callback_refs.pop(idx)
+        self._callback_pass_list = None
 
     def __call__(self, *args, **kwargs):
         """ __call__(**kwargs)
@@ -409,40 +428,88 @@ class EventEmitter(object):
         be careful not to inadvertently modify the Event.
         """
         # This is a VERY highly used method; must be fast!
-        blocked = self._blocked
         if self._emitting:
             raise RuntimeError('EventEmitter loop detected!')
+        callbacks = self._callback_pass_list
+        if callbacks is None:
+            callbacks = self._compile_callbacks()
+        if not callbacks:
+            # nobody is listening; only pass through a given event
+            if len(args) == 1 and not kwargs and isinstance(args[0], Event):
+                return args[0]
+            return None
 
         # create / massage event as needed
         event = self._prepare_event(*args, **kwargs)
 
         # Add our source to the event; remove it after all callbacks have been
         # invoked.
-        event._push_source(self.source)
+        source = self.source
+        event._push_source(source)
         self._emitting = True
         try:
-            if blocked.get(None, 0) > 0:  # this is the same as self.blocked()
-                return event
-
-            for cb in self._callbacks:
-                if blocked.get(cb, 0) > 0:
-                    continue
-                
-                if isinstance(cb, tuple):
-                    cb = getattr(cb[0](), cb[1], None)
+            for cb, attr in callbacks:
+                if attr is not None:
+                    # cb is a weakref to the object that has the callback
+                    obj = cb()
+                    if obj is None:
+                        self._callback_pass_list = None
+                        continue
+                    cb = getattr(obj, attr, None)
                     if cb is None:
                         continue
-                
+
                 self._invoke_callback(cb, event)
                 if event.blocked:
                     break
         finally:
             self._emitting = False
-            if event._pop_source() != self.source:
+            if event._pop_source() != source:
                 raise RuntimeError("Event source-stack mismatch.")
 
         return event
 
+    def emit(self, *args, **kwargs):
+        """ Invoke all callbacks for this emitter, like calling it, but
+        always create the event and return it, also when no callbacks are
+        connected or the emitter is blocked.
+
+        Parameters
+        ----------
+        *args : Event
+            The event to emit, instead of creating a new one.
+        **kwargs : keyword arguments
+            The arguments of the event to create.
+
+        Returns
+        -------
+        event : instance of Event
+            The emitted event.
+        """
+        event = self._prepare_event(*args, **kwargs)
+        self(event)
+        return event
+
+    def _compile_callbacks(self):
+        # Build the tuple of callbacks that __call__ invokes, leaving out
+        # blocked callbacks and those of objects that have been deleted. This
+        # is redone only when callbacks are (dis)connected or (un)blocked, or
+        # when an object behind a weakref is found to be gone.
+        blocked = self._blocked
+        callbacks = []
+        if blocked.get(None, 0) == 0:
+            for cb in self._callbacks:
+                if blocked.get(cb, 0) > 0:
+                    continue
+                if isinstance(cb, tuple):
+                    if cb[0]() is None:
+                        continue
+                    callbacks.append(cb[:2])
+                else:
+                    callbacks.append((cb, None))
+        self._callback_pass_list = tuple(callbacks)
+        return self._callback_pass_list
+
     def _invoke_callback(self, cb, event):
         try:
             cb(event)
@@ -462,7 +529,13 @@ class EventEmitter(object):
         elif not args:
             args = self.default_args.copy()
             args.update(kwargs)
-            event = self.event_class(**args)
+            event = self._event
+            if event is not None and self.reuse_events:
+                event.__init__(**args)
+            else:
+                event = self.event_class(**args)
+                if self.reuse_events:
+                    self._event = event
         else:
             raise ValueError("Event emitters can be called with an Event "
                              "instance or with keyword arguments only.")
@@ -483,6 +556,7 @@ class EventEmitter(object):
         number of times as it is blocked.
         """
         self._blocked[callback] = self._blocked.get(callback, 0) + 1
+        self._callback_pass_list = None
 
     def unblock(self, callback=None):
         """ Unblock this emitter. See :func:`event.EventEmitter.block`.
@@ -500,6 +574,7 @@ class EventEmitter(object):
             del self._blocked[callback]
         else:
             self._blocked[callback] = b
+        self._callback_pass_list = None
 
     def blocker(self, callback=None):
         """Return an EventBlocker to be used in 'with' statements
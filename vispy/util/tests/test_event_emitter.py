@@ -28,6 +28,7 @@ class TestEmitters(unittest.TestCase):
 
         # type must be specified when emitting since Event requires type
         # argument and the emitter was constructed without it.
+        em.connect(self.record_event)
         try:
             em()
             assert False, "Emitting event with no type should have failed."
@@ -663,4 +664,76 @@ def test_emitter_block():
     assert_state(True, True)
 
 
+def test_emitter_callback_list():
+    """Emitter rebuilds its list of callbacks only when needed"""
+    class Listener(object):
+        def on_event(self, ev):
+            calls.append('listener')
+
+    calls = []
+    counts = [0]
+
+    class CountedEvent(Event):
+        def __init__(self, **kwargs):
+            counts[0] += 1
+            Event.__init__(self, **kwargs)
+
+    def cb(ev):
+        calls.append('cb')
+
+    em = EventEmitter(type='test_event', event_class=CountedEvent)
+    # No events are created if nobody is listening
+    assert em() is None
+    assert_equal(counts[0], 0)
+    ev = CountedEvent(type='test_event')
+    assert em(ev) is ev
+    # unless it is forced
+    ev = em.emit(value=1)
+    assert isinstance(ev, CountedEvent)
+    assert_equal(ev.value, 1)
+    assert_equal(counts[0], 2)
+    assert em.emit(ev) is ev
+    em.connect(cb)
+    listener = Listener()
+    em.connect((listener, 'on_event'))
+    assert isinstance(em(), CountedEvent)
+    assert_equal(calls, ['listener', 'cb'])
+    callbacks = em._callback_pass_list
+    assert_equal(len(callbacks), 2)
+    em()
+    assert em._callback_pass_list is callbacks
+
+    # Blocking and unblocking
+    calls[:] = []
+    em.block(cb)
+    em()
+    assert_equal(calls, ['listener'])
+    em.unblock(cb)
+    em()
+    assert_equal(calls, ['listener', 'listener', 'cb'])
+    n = counts[0]
+    with em.blocker():
+        assert em() is None
+    assert_equal(counts[0], n)
+
+    # Callbacks of deleted objects are dropped
+    calls[:] = []
+    del listener
+    em()
+    assert_equal(calls, ['cb'])
+    em()
+    assert_equal(len(em._callback_pass_list), 1)
+    em.disconnect(cb)
+    assert em() is None
+
+    # Reusing the event
+    em = EventEmitter(type='test_event', event_class=CountedEvent,
+                      reuse_events=True)
+    em.connect(cb)
+    ev = em(x=1)
+    assert em(x=2) is ev
+    assert_equal(ev.x, 2)
+    assert_equal(ev.sources, [])
+
+
 run_tests_if_main()
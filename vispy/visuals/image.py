@@ -6,7 +6,7 @@ from __future__ import division
 
 import numpy as np
 
-from ..gloo import set_state, Texture2D
+from ..gloo import set_state, Texture2D, get_current_canvas
 from ..color import get_colormap
 from .shaders import ModularProgram, Function, FunctionChain
 from .transforms import NullTransform
@@ -36,12 +36,52 @@ void main()
        texcoord.y < 0.0 || texcoord.y > 1.0) {
         discard;
     }
-    gl_FragColor = $color_transform(texture2D(u_texture, texcoord));
+    gl_FragColor = $color_transform(texture2D(u_texture, $scroll(texcoord)));
 }
 """  # noqa
 
 _null_color_transform = 'vec4 pass(vec4 color) { return color; }'
-_c2l = 'float cmap(vec4 color) { return (color.r + color.g + color.b) / 3.; }'
+_c2l = 'float cmap(vec4 color) { return color.r; }'
+
+_null_scroll = 'vec2 noscroll(vec2 texcoord) { return texcoord; }'
+
+# Rotate the texture coordinates when the texture is a circular buffer
+_scroll_texcoord = """
+    vec2 scroll(vec2 texcoord) {
+        return fract(texcoord + $offset);
+    }
+"""
+
+# Normalize luminance data to [0, 1] with the contrast limits, which are
+# in units of the sampled texture values
+_apply_clim = """
+    float apply_clim(float data) {
+        if ($clim.y == $clim.x) {
+            return data > $clim.x ? 1.0 : 0.0;
+        }
+        return clamp((data - $clim.x) / ($clim.y - $clim.x), 0.0, 1.0);
+    }
+"""
+
+# Texture internal formats for luminance data by dtype, and the scale
+# between data values and sampled values. Other dtypes are converted
+# to float32.
+_luminance_formats = {
+    np.dtype(np.uint8): ('luminance', 255.),
+    np.dtype(np.uint16): ('r16', 65535.),
+    np.dtype(np.float32): ('r32f', 1.),
+}
+
+
+def _supports_float_textures():
+    """ Whether the current canvas can use the 16-bit and float
+    formats above. If it cannot (e.g. ES 2.0 and WebGL), luminance
+    data is normalized on the CPU instead.
+    """
+    canvas = get_current_canvas()
+    if canvas is None or canvas.context.shared.parser is None:
+        return True
+    return canvas.context.shared.parser.supports_float_textures()
 
 
 class ImageVisual(Visual):
@@ -78,18 +118,36 @@ class ImageVisual(Visual):
     Notes
     -----
     The colormap functionality through ``cmap`` and ``clim`` are only used
-    if the data are 2D.
+    if the data are 2D. Such data is uploaded as is if it is of type uint8,
+    uint16 or float32 (other types are converted to float32), and the
+    colormap and limits are applied on the GPU, so that changing them does
+    not upload the data again. Where 16-bit and float textures are not
+    available, luminance data that is not uint8 is normalized with the
+    limits on the CPU, and changing the limits uploads the data again.
     """
     def __init__(self, data, method='auto', grid=(10, 10),
                  cmap='cubehelix', clim='auto', **kwargs):
         super(ImageVisual, self).__init__(**kwargs)
         self._program = ModularProgram(VERT_SHADER, FRAG_SHADER)
+        self._program.frag['scroll'] = Function(_null_scroll)
+        self._clim_func = Function(_apply_clim)
+        self._data = None
+        self._texture = None
+        # Internal format of the texture and the scale of sampled values,
+        # for luminance data
+        self._texture_format = None
+        self._texture_scale = None
+        # Whether the limits are applied on the CPU
+        self._cpu_clim = False
+        self._need_texture_upload = True
+        self._need_clim_update = True
         self.clim = clim
         self.cmap = cmap
 
-        self._data = None
+        # Slots of the first row and column if the data is scrolled
+        self._scroll = None
+        self._scroll_func = None
 
-        self._texture = None
         self._interpolation = 'nearest'
         self.set_data(data)
 
@@ -103,7 +161,74 @@ class ImageVisual(Visual):
         if self._data is None or self._data.shape != data.shape:
             self._need_vertex_update = True
         self._data = data
-        self._texture = None
+        self._need_texture_upload = True
+        self.update()
+        if self._scroll is not None:
+            self._program.frag['scroll'] = Function(_null_scroll)
+            self._scroll = None
+
+    def scroll(self, data, axis=1):
+        """ Scroll new data into the end of the image.
+
+        The image moves towards the start of the given axis by the size
+        of the new data along that axis, like in a waterfall display. The
+        texture is used as a circular buffer, so that only the new data
+        is uploaded.
+
+        Parameters
+        ----------
+        data : ndarray
+            The new data. Must have the same shape as the image data,
+            except along the given axis.
+        axis : int
+            The axis to scroll along: 1 to add columns on the right, or 0
+            to add rows at the end of the image.
+        """
+        if axis not in (0, 1):
+            raise ValueError('axis must be 0 or 1')
+        data = np.asarray(data)
+        shape = self._data.shape
+        other_shape = shape[:axis] + shape[axis + 1:]
+        if (data.ndim != len(shape) or
+                data.shape[:axis] + data.shape[axis + 1:] != other_shape):
+            raise ValueError('Scrolled data must have the shape of the image '
+                             'data, except along axis %i' % axis)
+        n = shape[axis]
+        data = data[-n:] if axis == 0 else data[:, -n:]
+        k = data.shape[axis]
+
+        if self._scroll is None:
+            # The data is kept in the order of the texture, in a copy
+            self._data = self._data.copy()
+            self._scroll = [0, 0]
+            self._scroll_func = Function(_scroll_texcoord)
+            self._program.frag['scroll'] = self._scroll_func
+
+        # Store the new data in the slots of the oldest data
+        other = 1 - axis
+        data = np.roll(data, self._scroll[other], axis=other)
+        head = self._scroll[axis]
+        slots = (head + np.arange(k)) % n
+        if axis == 0:
+            self._data[slots] = data
+        else:
+            self._data[:, slots] = data
+        if not self._need_texture_upload:
+            parts = [(head, min(head + k, n))]
+            if head + k > n:
+                parts.append((0, head + k - n))
+            for start, stop in parts:
+                if axis == 0:
+                    part, offset = self._data[start:stop], (start, 0)
+                else:
+                    part, offset = self._data[:, start:stop], (0, start)
+                self._texture.set_data(self._texture_data(part), offset,
+                                       copy=True)
+
+        self._scroll[axis] = (head + k) % n
+        self._scroll_func['offset'] = (self._scroll[1] / shape[1],
+                                       self._scroll[0] / shape[0])
+        self.update()
 
     @property
     def clim(self):
@@ -120,7 +245,9 @@ class ImageVisual(Visual):
             if clim.shape != (2,):
                 raise ValueError('clim must have two elements')
         self._clim = clim
-        self._need_vertex_update = True
+        self._need_clim_update = True
+        if self._cpu_clim:
+            self._need_texture_upload = True
         self.update()
 
     @property
@@ -130,6 +257,8 @@ class ImageVisual(Visual):
     @cmap.setter
     def cmap(self, cmap):
         self._cmap = get_colormap(cmap)
+        if self._texture_scale is not None:
+            self._program.frag['color_transform'] = self._luminance_transform()
         self.update()
 
     @property
@@ -222,33 +351,89 @@ class ImageVisual(Visual):
         self._need_vertex_update = False
 
     def _build_texture(self):
+        """ Upload the data, reusing the texture if its format allows.
+        The data is uploaded as is; luminance data is mapped to colors
+        with the contrast limits in the shader, unless the texture formats
+        for it are not available.
+        """
         data = self._data
-        if data.dtype == np.float64:
-            data = data.astype(np.float32)
-
+        luminance = data.ndim == 2 or data.shape[2] == 1
+        self._cpu_clim = (luminance and data.dtype != np.uint8 and
+                          not _supports_float_textures())
+        if self._cpu_clim:
+            self._clim = self._numeric_clim()
+        data = self._texture_data(data)
+        internalformat, scale = None, None
+        if self._cpu_clim:
+            internalformat, scale = 'luminance', 1.
+        elif luminance:
+            internalformat, scale = _luminance_formats[data.dtype]
+        texture_format = internalformat, data.shape[2:]
+        if (self._texture is None or self._texture_format != texture_format or
+                scale != self._texture_scale):
+            self._texture = Texture2D(data, interpolation=self._interpolation,
+                                      internalformat=internalformat)
+            self._program['u_texture'] = self._texture
+            self._texture_format = texture_format
+        else:
+            self._texture.set_data(data)
+        if scale != self._texture_scale:
+            if scale is None:
+                fun = Function(_null_color_transform)
+            else:
+                fun = self._luminance_transform()
+            self._program.frag['color_transform'] = fun
+            self._texture_scale = scale
+            self._need_clim_update = True
+        self._need_texture_upload = False
+
+    def _texture_data(self, data):
+        """ Convert (part of) the data to a dtype for uploading to the
+        texture.
+        """
         if data.ndim == 2 or data.shape[2] == 1:
-            # deal with clim on CPU b/c of texture depth limits :(
-            # can eventually do this by simulating 32-bit float... maybe
-            clim = self._clim
-            if isinstance(clim, string_types) and clim == 'auto':
-                clim = np.min(data), np.max(data)
-            clim = np.asarray(clim, dtype=np.float32)
-            data = data - clim[0]  # not inplace so we don't modify orig data
-            if clim[1] - clim[0] > 0:
-                data /= clim[1] - clim[0]
+            if self._cpu_clim:
+                # not inplace so we don't modify orig data
+                clim = self._clim
+                data = data.astype(np.float32) - clim[0]
+                if clim[1] > clim[0]:
+                    data /= clim[1] - clim[0]
+                else:
+                    data = (data > 0).astype(np.float32)
+            elif data.dtype not in _luminance_formats:
+                data = data.astype(np.float32)
+        elif data.dtype == np.float64:
+            data = data.astype(np.float32)
+        return data
+
+    def _luminance_transform(self):
+        return FunctionChain(None, [Function(_c2l), self._clim_func,
+                                    Function(self.cmap.glsl_map)])
+
+    def _update_clim(self):
+        """ Set the contrast limits in the shader (in units of the
+        sampled texture values).
+        """
+        if self._texture_scale is not None:
+            self._clim = self._numeric_clim()
+            if self._cpu_clim:
+                # the data is already normalized
+                self._clim_func['clim'] = (0., 1.)
             else:
-                data[:] = 1 if data[0, 0] != 0 else 0
-            fun = FunctionChain(None, [Function(_c2l),
-                                       Function(self.cmap.glsl_map)])
-            self._clim = np.array(clim)
-        else:
-            fun = Function(_null_color_transform)
-        self._program.frag['color_transform'] = fun
-        self._texture = Texture2D(data, interpolation=self._interpolation)
-        self._program['u_texture'] = self._texture 
+                self._clim_func['clim'] = tuple(self._clim /
+                                                self._texture_scale)
+        self._need_clim_update = False
+
+    def _numeric_clim(self):
+        clim = self._clim
+        if isinstance(clim, string_types) and clim == 'auto':
+            clim = np.min(self._data), np.max(self._data)
+        return np.array(clim, dtype=np.float32)
 
     def bounds(self, mode, axis):
-        if axis > 1:
+        if self._data is None:
+            return None
+        elif axis > 1:
             return (0, 0)
         else:
             return (0, self.size[axis])
@@ -260,8 +445,10 @@ class ImageVisual(Visual):
         set_state(cull_face='front_and_back')
 
         # upload texture is needed
-        if self._texture is None:
+        if self._need_texture_upload:
             self._build_texture()
+        if self._need_clim_update:
+            self._update_clim()
             
         # rebuild vertex buffers if needed
         if self._need_vertex_update:
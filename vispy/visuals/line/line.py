@@ -17,10 +17,14 @@ from ..visual import Visual
 from ...util.profiler import Profiler
 
 from .dash_atlas import DashAtlas
+from .lod import MinMaxPyramid
 from . import vertex
 from . import fragment
 
 
+# Line smoothing is desktop GL only, and not in the ES 2.0 namespace of gl
+_GL_LINE_SMOOTH = 0x0B20
+
 vec2to4 = Function("""
     vec4 vec2to4(vec2 inp) {
         return vec4(inp, 0, 1);
@@ -33,6 +37,21 @@ vec3to4 = Function("""
     }
 """)
 
+# Templates to combine the x coordinates and the other coordinates of a
+# scrolling line, by number of dimensions
+scroll_to_vec4 = {
+    2: """
+        vec4 scroll2to4(float y) {
+            return vec4($x, y, 0, 1);
+        }
+    """,
+    3: """
+        vec4 scroll3to4(vec2 yz) {
+            return vec4($x, yz, 1);
+        }
+    """,
+}
+
 
 """
 TODO:
@@ -53,6 +72,19 @@ caps = {'': 0, 'none': 0, '.': 0,
         '|': 5}
 
 
+def _append_rows(data, store, rows):
+    """ Append rows to data, which may be a view on the start of store.
+    Returns the new data and store; the store is reallocated (with room
+    to spare) if data is not a view on it, or if it is full.
+    """
+    n, m = len(data), len(data) + len(rows)
+    if store is None or data.base is not store or m > len(store):
+        store = np.empty((max(m, 2 * n),) + data.shape[1:], rows.dtype)
+        store[:n] = data
+    store[n:m] = rows
+    return store[:m], store
+
+
 class LineVisual(Visual):
     """Line visual
 
@@ -90,9 +122,14 @@ class LineVisual(Visual):
         Enables or disables antialiasing.
         For method='gl', this specifies whether to use GL's line smoothing, 
         which may be unavailable or inconsistent on some platforms.
+    lod : bool
+        Enables level-of-detail drawing for 'strip' lines with increasing
+        x coordinates (e.g. time series). A min/max pyramid of the data
+        is computed, and only the vertices of the visible part are drawn,
+        with about one min/max pair per pixel.
     """
     def __init__(self, pos=None, color=(0.5, 0.5, 0.5, 1), width=1,
-                 connect='strip', method='gl', antialias=False):
+                 connect='strip', method='gl', antialias=False, lod=False):
         Visual.__init__(self)
 
         self._changed = {'pos': False, 'color': False, 'width': False,
@@ -103,6 +140,17 @@ class LineVisual(Visual):
         self._width = None
         self._connect = None
         self._bounds = None
+        self._lod = False
+        self._lod_pyramid = None
+        self._lod_range = None
+        self._lod_index = None
+        # Index of the first vertex appended since the last draw, and
+        # arrays with room for appending
+        self._appended_from = None
+        self._pos_store = None
+        self._color_store = None
+        # Number of vertices scrolled in since the last draw
+        self._scrolled = None
         
         # don't call subclass set_data; these often have different
         # signatures.
@@ -111,6 +159,7 @@ class LineVisual(Visual):
         self._method = 'none'
         self.antialias = antialias
         self.method = method
+        self.lod = lod
 
     @property
     def _program(self):
@@ -125,6 +174,17 @@ class LineVisual(Visual):
         self._antialias = bool(aa)
         self.update()
 
+    @property
+    def lod(self):
+        """Whether level-of-detail drawing is enabled"""
+        return self._lod
+
+    @lod.setter
+    def lod(self, lod):
+        self._lod = bool(lod)
+        self._set_lod_index(None)
+        self.update()
+
     @property
     def method(self):
         """The current drawing method"""
@@ -143,8 +203,13 @@ class LineVisual(Visual):
         elif method == 'agg':
             self._line_visual = _AggLineVisual(self)
 
+        self._set_all_changed()
+
+    def _set_all_changed(self):
         for k in self._changed:
             self._changed[k] = True
+        self._appended_from = None
+        self._scrolled = None
 
     def set_data(self, pos=None, color=None, width=None, connect=None):
         """ Set the data used to draw this visual.
@@ -173,10 +238,17 @@ class LineVisual(Visual):
             self._bounds = None
             self._pos = pos
             self._changed['pos'] = True
+            self._lod_pyramid = None
+            self._lod_range = None
+            self._lod_index = None
+            self._appended_from = None
+            self._scrolled = None
 
         if color is not None:
             self._color = color
             self._changed['color'] = True
+            self._appended_from = None
+            self._scrolled = None
 
         if width is not None:
             self._width = width
@@ -185,7 +257,113 @@ class LineVisual(Visual):
         if connect is not None:
             self._connect = connect
             self._changed['connect'] = True
+            self._appended_from = None
+            self._scrolled = None
+
+        self.update()
+
+    def append(self, pos, color=None):
+        """ Append vertices to the end of the line.
+
+        Only the new part of the line is processed and uploaded, which
+        makes this much faster than calling set_data() with all vertices
+        for streaming data. Storage is reserved for further vertices.
+        Only available for lines with connect='strip'.
 
+        Parameters
+        ----------
+        pos : array
+            Array of shape (N, 2) or (N, 3) with the new vertices. It
+            must have the same number of columns as the current data.
+        color : array | None
+            Array of shape (N, 4) with the colors of the new vertices.
+            Must be given if (and only if) the line has a color per
+            vertex.
+        """
+        if self._connect != 'strip':
+            raise ValueError('Can only append to lines with connect="strip"')
+        pos = np.asarray(pos, np.float32)
+        per_vertex = self._color_per_vertex()
+        if per_vertex != (color is not None):
+            raise ValueError('A color per vertex must be given if and only '
+                             'if the line has a color per vertex')
+        if self._pos is None or not len(self._pos):
+            return self.set_data(pos=pos, color=color)
+        if pos.ndim != 2 or pos.shape[1] != self._pos.shape[1]:
+            raise ValueError('Appended vertices must have shape (N, %i)'
+                             % self._pos.shape[1])
+        n = len(self._pos)
+        self._pos, self._pos_store = _append_rows(self._pos, self._pos_store,
+                                                  pos)
+        if per_vertex:
+            color = np.asarray(color, np.float32).reshape(len(pos), -1)
+            self._color, self._color_store = _append_rows(
+                self._color, self._color_store, color)
+        if self._bounds is not None:
+            self._bounds = [(min(b[0], pos[:, d].min()),
+                             max(b[1], pos[:, d].max()))
+                            for d, b in enumerate(self._bounds)]
+        self._lod_pyramid = None
+        self._lod_range = None
+        if self._scrolled is not None:
+            self._set_all_changed()
+        elif self._appended_from is None:
+            self._appended_from = n
+        self.update()
+
+    def scroll(self, data, color=None):
+        """ Scroll new values into the end of the line.
+
+        The x coordinates of the vertices stay the same, while the other
+        coordinates move towards the start of the line by the number of
+        new values, like in an oscilloscope display. With method='gl',
+        the vertex buffer is used as a circular buffer, so that only the
+        new values are uploaded. Only available for lines with
+        connect='strip'.
+
+        Parameters
+        ----------
+        data : array
+            Array of shape (N,) with the new y coordinates, or of shape
+            (N, 2) with the new y and z coordinates of a 3D line.
+        color : array | None
+            Array of shape (N, 4) with the colors of the new vertices.
+            Must be given if (and only if) the line has a color per
+            vertex.
+        """
+        if self._connect != 'strip':
+            raise ValueError('Can only scroll lines with connect="strip"')
+        if self._pos is None or not len(self._pos):
+            raise ValueError('Can only scroll lines that have vertices')
+        per_vertex = self._color_per_vertex()
+        if per_vertex != (color is not None):
+            raise ValueError('A color per vertex must be given if and only '
+                             'if the line has a color per vertex')
+        n, ndim = self._pos.shape
+        data = np.asarray(data, np.float32).reshape(len(data), -1)
+        if data.shape[1] != ndim - 1:
+            raise ValueError('Scrolled values must have shape (N, %i)'
+                             % (ndim - 1))
+        data = data[-n:]
+        k = len(data)
+        # Shift the data in place, in a copy that this visual owns
+        if self._pos is not self._pos_store:
+            self._pos = self._pos_store = np.array(self._pos, np.float32)
+        self._pos[:n - k, 1:] = self._pos[k:, 1:]
+        self._pos[n - k:, 1:] = data
+        if per_vertex:
+            color = np.asarray(color, np.float32).reshape(len(color), -1)
+            if self._color is not self._color_store:
+                self._color = self._color_store = ColorArray(self._color).rgba
+            self._color[:n - k] = self._color[k:]
+            self._color[n - k:] = color[-k:]
+        self._bounds = None
+        self._lod_pyramid = None
+        self._lod_range = None
+        if self._appended_from is not None or self._method != 'gl':
+            self._set_all_changed()
+        else:
+            self._scrolled = min((self._scrolled or 0) + k, n)
         self.update()
 
     @property
@@ -221,6 +399,73 @@ class LineVisual(Visual):
         else:
             return self._connect
 
+    def _color_per_vertex(self):
+        return isinstance(self._color, np.ndarray) and self._color.ndim == 2
+
+    def _get_pos(self):
+        """ The positions to draw, taking level-of-detail into account.
+        """
+        if self._lod_index is None:
+            return self._pos
+        return self._pos[self._lod_index]
+
+    def _set_lod_index(self, index):
+        if index is None and self._lod_index is None:
+            return
+        self._lod_index = index
+        self._changed['pos'] = True
+        if self._color_per_vertex():
+            self._changed['color'] = True
+
+    def _update_lod(self, transforms):
+        """ Select the vertices to draw for the current view.
+        """
+        pos = self._pos
+        if (not self._lod or pos is None or self._connect != 'strip' or
+                pos.ndim != 2 or len(pos) < 2):
+            return self._set_lod_index(None)
+        if self._lod_pyramid is None:
+            x = pos[:, 0]
+            if np.all(x[1:] >= x[:-1]):
+                self._lod_pyramid = MinMaxPyramid(pos[:, 1])
+            else:
+                self._lod_pyramid = False
+        pyramid = self._lod_pyramid
+        full_tr = transforms.get_full_transform()
+        if not pyramid or pyramid.n_levels == 1 or not full_tr.Linear:
+            return self._set_lod_index(None)
+
+        # Visible range of samples
+        x = pos[:, 0]
+        corners = full_tr.imap([(-1, -1), (1, -1), (-1, 1), (1, 1)])
+        x0, x1 = corners[:, 0].min(), corners[:, 0].max()
+        i0, i1 = np.searchsorted(x, (x0, x1))
+        i0, i1 = max(i0 - 1, 0), min(i1 + 1, len(x))
+        if i1 <= i0:
+            return self._set_lod_index(None)
+
+        # Number of framebuffer pixels spanned by the visible range
+        px = transforms.document_to_framebuffer.map(
+            transforms.visual_to_document.map([(x[i0], 0), (x[i1 - 1], 0)]))
+        n_px = max(np.sqrt(((px[1, :2] - px[0, :2]) ** 2).sum()), 1.)
+        level = pyramid.choose_level((i1 - i0) / n_px)
+
+        # Only select new vertices if the view leaves the current range.
+        # The range is padded by half the view on each side, so that
+        # panning does not require an upload on each draw.
+        if self._lod_range is not None and self._lod_index is not None:
+            level_, start, stop = self._lod_range
+            if level_ == level and start <= i0 and stop >= i1:
+                return
+        pad = (i1 - i0) // 2
+        start, stop = max(i0 - pad, 0), min(i1 + pad, len(x))
+        self._lod_range = level, start, stop
+        if level == 0 and start == 0 and stop == len(x):
+            index = None
+        else:
+            index = pyramid.indices(level, start, stop)
+        self._set_lod_index(index)
+
     def _interpret_color(self):
         if isinstance(self._color, string_types):
             try:
@@ -231,7 +476,12 @@ class LineVisual(Visual):
         elif isinstance(self._color, Function):
             color = Function(self._color)
         else:
-            color = ColorArray(self._color).rgba
+            color = self._color
+            if (self._lod_index is not None and
+                    isinstance(color, np.ndarray) and color.ndim == 2 and
+                    len(color) == len(self._pos)):
+                color = color[self._lod_index]
+            color = ColorArray(color).rgba
             if len(color) == 1:
                 color = color[0]
         return color
@@ -254,9 +504,16 @@ class LineVisual(Visual):
     def draw(self, transforms):
         if self.width == 0:
             return
+        self._update_lod(transforms)
+        if self._lod_index is not None and (self._appended_from is not None or
+                                            self._scrolled is not None):
+            self._changed['pos'] = True
+            self._changed['color'] = True
         self._line_visual.draw(transforms)
         for k in self._changed:
             self._changed[k] = False
+        self._appended_from = None
+        self._scrolled = None
 
     def set_gl_state(self, **kwargs):
         Visual.set_gl_state(self, **kwargs)
@@ -267,6 +524,83 @@ class LineVisual(Visual):
         self._line_visual.update_gl_state(**kwargs)
 
 
+class _GrowableBuffer(object):
+    """ A gloo buffer with room to spare at the end, so that data can be
+    appended without uploading all data again. A copy of the data is
+    kept, to fill a larger buffer when the buffer is full.
+    """
+
+    def __init__(self, buffer_class):
+        self.buffer = buffer_class()
+        self.data = None
+        self.size = 0  # number of elements in use
+
+    def write(self, data, offset=0):
+        """ Write data at the given element offset; the data in use ends
+        after the written part. Writing at offset 0 replaces all data,
+        and the given array is used without copying.
+        """
+        data = np.ascontiguousarray(data)
+        stop = offset + len(data)
+        if offset == 0:
+            self.data = data
+            self.buffer.set_data(data)
+        elif stop > len(self.data):
+            new = np.zeros((max(stop, 2 * len(self.data)),) + data.shape[1:],
+                           data.dtype)
+            new[:offset] = self.data[:offset]
+            new[offset:stop] = data
+            self.data = new
+            self.buffer.set_data(new)
+        else:
+            self.data[offset:stop] = data
+            self.buffer.set_subdata(self.data[offset:stop], offset)
+        self.size = stop
+
+    def view(self):
+        """ The buffer, or a view on the part that is in use.
+        """
+        if self.size == self.buffer.size:
+            return self.buffer
+        return self.buffer[:self.size]
+
+
+class _RingBuffer(object):
+    """ A gloo vertex buffer used as a circular buffer of n elements, so
+    that new elements can replace the oldest ones by uploading only the
+    new elements. Each element is stored twice, at slots i and i + n, so
+    that the elements from oldest to newest are always a contiguous part
+    of the buffer (and a line strip does not connect the newest element
+    to the oldest one).
+    """
+
+    def __init__(self, data):
+        data = np.ascontiguousarray(data, np.float32)
+        self.n = len(data)
+        self.head = 0  # slot of the oldest element
+        self.buffer = gloo.VertexBuffer(np.concatenate([data, data]))
+
+    def push(self, data):
+        """ Replace the oldest elements by the given (newer) elements.
+        """
+        n, h = self.n, self.head
+        data = np.ascontiguousarray(data[-n:], np.float32)
+        k = len(data)
+        self.buffer.set_subdata(data, h)
+        # The copies of the new elements in the other half of the buffer
+        if h + k <= n:
+            self.buffer.set_subdata(data, h + n)
+        else:
+            self.buffer.set_subdata(data[:n - h], h + n)
+            self.buffer.set_subdata(data[n - h:], 0)
+        self.head = (h + k) % n
+
+    def view(self):
+        """ A view on the buffer with the elements from oldest to newest.
+        """
+        return self.buffer[self.head:self.head + self.n]
+
+
 class _GLLineVisual(Visual):
     VERTEX_SHADER = """
         varying vec4 v_color;
@@ -286,10 +620,13 @@ class _GLLineVisual(Visual):
 
     def __init__(self, parent):
         self._parent = parent
-        self._pos_vbo = gloo.VertexBuffer()
-        self._color_vbo = gloo.VertexBuffer()
+        self._pos_vbo = _GrowableBuffer(gloo.VertexBuffer)
+        self._color_vbo = _GrowableBuffer(gloo.VertexBuffer)
         self._connect_ibo = gloo.IndexBuffer()
         self._connect = None
+        # Circular buffers for scrolling lines
+        self._pos_ring = None
+        self._color_ring = None
         
         # Set up the GL program
         self._program = ModularProgram(self.VERTEX_SHADER,
@@ -304,13 +641,16 @@ class _GLLineVisual(Visual):
         if self._parent._width <= 0:
             return
         
-        if self._parent._changed['pos']:
+        start = self._parent._appended_from
+        scrolled = self._parent._scrolled
+        if self._parent._changed['pos'] or (start is not None and
+                                            self._pos_ring is not None):
             if self._parent._pos is None:
                 return
-            # todo: does this result in unnecessary copies?
-            pos = np.ascontiguousarray(self._parent._pos.astype(np.float32))
-            self._pos_vbo.set_data(pos)
-            self._program.vert['position'] = self._pos_vbo
+            pos = self._parent._get_pos().astype(np.float32)
+            self._pos_vbo.write(pos)
+            self._pos_ring = None
+            self._program.vert['position'] = self._pos_vbo.view()
             if pos.shape[-1] == 2:
                 self._program.vert['to_vec4'] = vec2to4
             elif pos.shape[-1] == 3:
@@ -318,8 +658,15 @@ class _GLLineVisual(Visual):
             else:
                 raise TypeError("Got bad position array shape: %r"
                                 % (pos.shape,))
-
-        if self._parent._changed['color']:
+        elif scrolled is not None:
+            self._scroll_pos(scrolled)
+        elif start is not None:
+            self._pos_vbo.write(self._parent._pos[start:], start)
+            self._program.vert['position'] = self._pos_vbo.view()
+
+        if self._parent._changed['color'] or (start is not None and
+                                              self._color_ring is not None):
+            self._color_ring = None
             color = self._parent._interpret_color()
             # If color is not visible, just quit now
             if isinstance(color, Color) and color.is_blank:
@@ -332,30 +679,35 @@ class _GLLineVisual(Visual):
                 if color.ndim == 1:
                     self._program.vert['color'] = color
                 else:
-                    self._color_vbo.set_data(color)
-                    self._program.vert['color'] = self._color_vbo
+                    self._color_vbo.write(color)
+                    self._program.vert['color'] = self._color_vbo.view()
+        elif scrolled is not None and self._parent._color_per_vertex():
+            color = self._parent._color
+            if self._color_ring is None:
+                self._color_ring = _RingBuffer(color)
+            else:
+                self._color_ring.push(color[len(color) - scrolled:])
+            self._program.vert['color'] = self._color_ring.view()
+        elif start is not None and self._parent._color_per_vertex():
+            color = ColorArray(self._parent._color[start:]).rgba
+            self._color_vbo.write(color, start)
+            self._program.vert['color'] = self._color_vbo.view()
 
         xform = transforms.get_full_transform()
         self._program.vert['transform'] = xform
 
-        # Do we want to use OpenGL, and can we?
-        GL = None
-        try:
-            import OpenGL.GL as GL
-        except ImportError:
-            pass
-
-        # Turn on line smooth and/or line width
-        if GL:
-            if self._parent._antialias:
-                GL.glEnable(GL.GL_LINE_SMOOTH)
-            else:
-                GL.glDisable(GL.GL_LINE_SMOOTH)
-            # this is a bit of a hack to deal with HiDPI
-            tr = transforms.document_to_framebuffer
-            px_scale = np.mean((tr.map((1, 0)) - tr.map((0, 1)))[:2])
-            width = px_scale * self._parent._width
-            GL.glLineWidth(max(width, 1.))
+        # Turn on line smooth and/or line width. These go through GLIR,
+        # so that the parser knows the GL state.
+        context = transforms.canvas.context
+        parser = context.shared.parser
+        if parser is not None and parser.convert_shaders() == 'desktop':
+            func = 'glEnable' if self._parent._antialias else 'glDisable'
+            context.glir.command('FUNC', func, _GL_LINE_SMOOTH)
+        # this is a bit of a hack to deal with HiDPI
+        tr = transforms.document_to_framebuffer
+        px_scale = np.mean((tr.map((1, 0)) - tr.map((0, 1)))[:2])
+        width = px_scale * self._parent._width
+        context.set_line_width(max(width, 1.))
 
         if self._parent._changed['connect']:
             self._connect = self._parent._interpret_connect()
@@ -378,6 +730,22 @@ class _GLLineVisual(Visual):
         
         prof('draw')
 
+    def _scroll_pos(self, scrolled):
+        """ Upload the last *scrolled* positions into the circular
+        buffer. The x coordinates are in a separate buffer that does not
+        change.
+        """
+        pos = self._parent._pos
+        if self._pos_ring is None:
+            self._pos_ring = _RingBuffer(pos[:, 1:])
+            to_vec4 = Function(scroll_to_vec4[pos.shape[1]])
+            to_vec4['x'] = gloo.VertexBuffer(
+                np.ascontiguousarray(pos[:, 0], np.float32))
+            self._program.vert['to_vec4'] = to_vec4
+        else:
+            self._pos_ring.push(pos[len(pos) - scrolled:, 1:])
+        self._program.vert['position'] = self._pos_ring.view()
+
 
 class _AggLineVisual(Visual):
     _agg_vtype = np.dtype([('a_position', 'f4', 2),
@@ -390,11 +758,11 @@ class _AggLineVisual(Visual):
 
     def __init__(self, parent):
         self._parent = parent
-        self._vbo = gloo.VertexBuffer()
-        self._ibo = gloo.IndexBuffer()
+        self._vbo = _GrowableBuffer(gloo.VertexBuffer)
+        self._ibo = _GrowableBuffer(gloo.IndexBuffer)
 
-        self._pos = None
         self._color = None
+        self._connect = None
         self._program = ModularProgram(vertex.VERTEX_SHADER,
                                        fragment.FRAGMENT_SHADER)
 
@@ -415,24 +783,22 @@ class _AggLineVisual(Visual):
         if self._parent._changed['pos']:
             if self._parent._pos is None:
                 return
-            # todo: does this result in unnecessary copies?
-            self._pos = np.ascontiguousarray(
-                self._parent._pos.astype(np.float32))
             bake = True
 
         if self._parent._changed['color']:
-            self._color = self._parent._interpret_color()
+            self._color = None
             bake = True
 
         if self._parent._changed['connect']:
-            if self._parent._connect not in [None, 'strip']:
-                raise NotImplementedError("Only 'strip' connection mode "
-                                          "allowed for agg-method lines.")
+            self._connect = self._parent._interpret_connect()
+            bake = True
 
         if bake:
-            V, I = self._agg_bake(self._pos, self._color)
-            self._vbo.set_data(V)
-            self._ibo.set_data(I)
+            self._bake()
+        elif self._parent._appended_from is not None:
+            self._bake_appended(self._parent._appended_from)
+        if not self._ibo.size:
+            return
 
         gloo.set_state('translucent', depth_test=False)
         data_doc = transforms.visual_to_document
@@ -445,7 +811,7 @@ class _AggLineVisual(Visual):
         vert['transform'] = data_doc
 
         #self._program.prepare()
-        self._program.bind(self._vbo)
+        self._program.bind(self._vbo.buffer)
         uniforms = dict(closed=False, miter_limit=4.0, dash_phase=0.0,
                         linewidth=self._parent._width)
         for n, v in uniforms.items():
@@ -453,85 +819,121 @@ class _AggLineVisual(Visual):
         for n, v in self._U.items():
             self._program[n] = v
         self._program['u_dash_atlas'] = self._dash_atlas
-        self._program.draw('triangles', self._ibo)
+        self._program.draw('triangles', self._ibo.view())
+
+    def _bake(self):
+        if self._color is None:
+            self._color = self._parent._interpret_color()
+        V, I = self._agg_bake(self._parent._get_pos(), self._color,
+                              connect=self._connect)
+        self._vbo.write(V)
+        self._ibo.write(I)
+
+    def _bake_appended(self, start):
+        """ Bake the segments that end at the vertices from *start* on,
+        and update the last segment before them, whose end now joins the
+        first new segment.
+        """
+        if start < 3 or self._connect != 'strip':
+            return self._bake()
+        # Bake from the start of the segment before the one to update, so
+        # that its join is taken into account too.
+        first = start - 3
+        color = self._color
+        if self._parent._color_per_vertex():
+            color = ColorArray(self._parent._color[first:]).rgba
+            self._color = None  # the full color array is stale
+        length = self._vbo.data['a_segment'][4 * first, 0]
+        V, I = self._agg_bake(self._parent._pos[first:], color,
+                              length_offset=length)
+        # Note that the line length of older segments is not updated; it is
+        # only used for the end cap, which the last segment gets.
+        self._vbo.write(V[4:], 4 * (first + 1))
+        self._ibo.write(I[6:] + 4 * first, 6 * (first + 1))
 
     @classmethod
-    def _agg_bake(cls, vertices, color, closed=False):
+    def _agg_bake(cls, vertices, color, closed=False, connect=None,
+                  length_offset=0.):
         """
         Bake a list of 2D vertices for rendering them as thick line. Each line
         segment must have its own vertices because of antialias (this means no
         vertex sharing between two adjacent line segments).
-        """
 
-        n = len(vertices)
-        P = np.array(vertices).reshape(n, 2).astype(float)
-        idx = np.arange(n)  # used to eventually tile the color array
-
-        dx, dy = P[0] - P[-1]
-        d = np.sqrt(dx*dx+dy*dy)
-
-        # If closed, make sure first vertex = last vertex (+/- epsilon=1e-10)
-        if closed and d > 1e-10:
-            P = np.append(P, P[0]).reshape(n+1, 2)
-            idx = np.append(idx, idx[-1])
-            n += 1
-
-        V = np.zeros(len(P), dtype=cls._agg_vtype)
-        V['a_position'] = P
-
-        # Tangents & norms
-        T = P[1:] - P[:-1]
-
-        N = np.sqrt(T[:, 0]**2 + T[:, 1]**2)
-        # T /= N.reshape(len(T),1)
-        V['a_tangents'][+1:, :2] = T
-        V['a_tangents'][0, :2] = T[-1] if closed else T[0]
-        V['a_tangents'][:-1, 2:] = T
-        V['a_tangents'][-1, 2:] = T[0] if closed else T[-1]
-
-        # Angles
-        T1 = V['a_tangents'][:, :2]
-        T2 = V['a_tangents'][:, 2:]
-        A = np.arctan2(T1[:, 0]*T2[:, 1]-T1[:, 1]*T2[:, 0],
-                       T1[:, 0]*T2[:, 0]+T1[:, 1]*T2[:, 1])
-        V['a_angles'][:-1, 0] = A[:-1]
-        V['a_angles'][:-1, 1] = A[+1:]
-
-        # Segment
-        L = np.cumsum(N)
-        V['a_segment'][+1:, 0] = L
-        V['a_segment'][:-1, 1] = L
-        #V['a_lengths'][:,2] = L[-1]
-
-        # Step 1: A -- B -- C  =>  A -- B, B' -- C
-        V = np.repeat(V, 2, axis=0)[1:-1]
-        V['a_segment'][1:] = V['a_segment'][:-1]
-        V['a_angles'][1:] = V['a_angles'][:-1]
-        V['a_texcoord'][0::2] = -1
-        V['a_texcoord'][1::2] = +1
-        idx = np.repeat(idx, 2)[1:-1]
-
-        # Step 2: A -- B, B' -- C  -> A0/A1 -- B0/B1, B'0/B'1 -- C0/C1
-        V = np.repeat(V, 2, axis=0)
-        V['a_texcoord'][0::2, 1] = -1
-        V['a_texcoord'][1::2, 1] = +1
-        idx = np.repeat(idx, 2)
-
-        I = np.resize(np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32),
-                      (n-1)*(2*3))
-        I += np.repeat(4*np.arange(n-1, dtype=np.uint32), 6)
-
-        # Length
-        V['alength'] = L[-1] * np.ones(len(V))
+        Each segment gets four vertices. A segment is joined to the previous
+        one if that ends at the vertex where it starts. *connect* can be
+        None or 'strip', 'segments', or an array of vertex index pairs.
+        *length_offset* is the length of the line up to the first vertex.
+        """
+        P = np.asarray(vertices)[:, :2].astype(np.float32)
+        n = len(P)
+
+        # Vertex indices of the segments
+        if isinstance(connect, np.ndarray):
+            a, b = connect[:, 0].astype(np.intp), connect[:, 1].astype(np.intp)
+        elif connect == 'segments':
+            a = np.arange(0, n - 1, 2)
+            b = a + 1
+        else:
+            a = np.arange(n - 1)
+            b = a + 1
+            # If closed, make sure the last segment ends at the first vertex
+            if closed and n > 2 and np.abs(P[0] - P[-1]).max() > 1e-10:
+                a = np.append(a, n - 1)
+                b = np.append(b, 0)
+        m = len(a)
+
+        # Tangents and lengths
+        T = P[b] - P[a]
+        N = np.sqrt((T * T).sum(axis=1))
+
+        # Segments that continue the previous / next segment
+        joined = np.zeros(m, bool)
+        joined[1:] = b[:-1] == a[1:]
+        joined[0] = closed and m > 1
+        joined_next = np.roll(joined, -1)
+        T_prev = np.where(joined[:, np.newaxis], np.roll(T, 1, axis=0), T)
+        T_next = np.where(joined_next[:, np.newaxis],
+                          np.roll(T, -1, axis=0), T)
+
+        # Angles of the joins at the start and end of each segment
+        def angle(t1, t2):
+            return np.arctan2(t1[:, 0] * t2[:, 1] - t1[:, 1] * t2[:, 0],
+                              t1[:, 0] * t2[:, 0] + t1[:, 1] * t2[:, 1])
+
+        # Distance along each run of joined segments, and run lengths
+        run_start = ~joined
+        run_start[:1] = True
+        run = np.cumsum(run_start) - 1
+        L = np.cumsum(N, dtype=np.float64)
+        first = np.flatnonzero(run_start)
+        L -= (L[first] - N[first])[run]
+        last = np.append(first[1:], m) - 1
+        L += length_offset
+
+        V = np.empty((m, 4), cls._agg_vtype)
+        V['a_position'][:, :2] = P[a][:, np.newaxis]
+        V['a_position'][:, 2:] = P[b][:, np.newaxis]
+        V['a_tangents'][:, :2, :2] = T_prev[:, np.newaxis]
+        V['a_tangents'][:, :2, 2:] = T[:, np.newaxis]
+        V['a_tangents'][:, 2:, :2] = T[:, np.newaxis]
+        V['a_tangents'][:, 2:, 2:] = T_next[:, np.newaxis]
+        V['a_segment'][..., 0] = (L - N)[:, np.newaxis]
+        V['a_segment'][..., 1] = L[:, np.newaxis]
+        V['a_angles'][..., 0] = angle(T_prev, T)[:, np.newaxis]
+        V['a_angles'][..., 1] = angle(T, T_next)[:, np.newaxis]
+        V['a_texcoord'] = [(-1, -1), (-1, +1), (+1, -1), (+1, +1)]
+        V['alength'].reshape(m, 4)[:] = L[last][run][:, np.newaxis]
 
         # Color
         if color.ndim == 1:
-            color = np.tile(color, (len(V), 1))
+            V['color'] = color
         elif color.ndim == 2 and len(color) == n:
-            color = color[idx]
+            V['color'][:, :2] = color[a][:, np.newaxis]
+            V['color'][:, 2:] = color[b][:, np.newaxis]
         else:
             raise ValueError('Color length %s does not match number of '
                              'vertices %s' % (len(color), n))
-        V['color'] = color
 
-        return V, I
+        I = np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32)
+        I = (I + 4 * np.arange(m, dtype=np.uint32)[:, np.newaxis]).ravel()
+        return V.ravel(), I
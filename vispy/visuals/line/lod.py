@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Level-of-detail support for lines with many vertices.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+
+class MinMaxPyramid(object):
+    """ Multi-resolution min/max envelope of a sampled signal
+
+    Level k (k >= 1) divides the samples in bins of ``factor**k``
+    samples, and stores for each bin the indices of the minimum and
+    maximum sample (in the order in which they occur). Drawing only the
+    samples at these indices as a line strip gives the same extent
+    within each bin as drawing all samples, so that peaks are preserved
+    when a bin covers at most one pixel.
+
+    Parameters
+    ----------
+    y : array
+        The sample values.
+    factor : int
+        The number of bins of a level that are combined in one bin of
+        the next level.
+    min_bins : int
+        No levels with fewer bins than this are created.
+    """
+
+    def __init__(self, y, factor=4, min_bins=256):
+        self._factor = int(factor)
+        self._n = n = len(y)
+        self._levels = []
+        if n < factor * min_bins:
+            return
+
+        # First level directly from the samples, without index arrays
+        nbins = n // factor
+        vals = y[:nbins * factor].reshape(nbins, factor)
+        offsets = np.arange(nbins) * factor
+        imin = offsets + vals.argmin(axis=1)
+        imax = offsets + vals.argmax(axis=1)
+        if n % factor:
+            rest = np.arange(nbins * factor, n)
+            imin = np.append(imin, rest[y[rest].argmin()])
+            imax = np.append(imax, rest[y[rest].argmax()])
+        level = np.column_stack((imin, imax))
+        level.sort(axis=1)
+        self._levels.append(level)
+
+        # Next levels from the candidates of the previous level
+        while len(level) >= factor * min_bins:
+            cand = level.reshape(-1)
+            m = 2 * factor
+            if len(cand) % m:
+                cand = np.append(cand, np.repeat(cand[-1],
+                                                 m - len(cand) % m))
+            cand = cand.reshape(-1, m)
+            vals = y[cand]
+            rows = np.arange(len(cand))
+            level = np.column_stack((cand[rows, vals.argmin(axis=1)],
+                                     cand[rows, vals.argmax(axis=1)]))
+            level.sort(axis=1)
+            self._levels.append(level)
+
+    @property
+    def n_levels(self):
+        """ The number of levels, including level 0 (all samples).
+        """
+        return len(self._levels) + 1
+
+    def bin_size(self, level):
+        """ The number of samples per bin at the given level.
+        """
+        return self._factor ** level
+
+    def choose_level(self, samples_per_pixel):
+        """ Get the coarsest level whose bins contain at most the given
+        number of samples.
+        """
+        level = 0
+        while (level + 1 < self.n_levels and
+               self.bin_size(level + 1) <= samples_per_pixel):
+            level += 1
+        return level
+
+    def indices(self, level, start=0, stop=None):
+        """ Get the (sorted) indices of the samples to draw at the given
+        level, for the bins that cover samples start to stop.
+        """
+        stop = self._n if stop is None else min(stop, self._n)
+        start = max(start, 0)
+        if level == 0:
+            return np.arange(start, stop)
+        b = self.bin_size(level)
+        idx = self._levels[level - 1][start // b:(stop - 1) // b + 1]
+        idx = idx.reshape(-1)
+        keep = np.ones(len(idx), bool)
+        keep[1:] = idx[1:] != idx[:-1]
+        return idx[keep]
@@ -36,6 +36,9 @@ class LinePlotVisual(Visual):
         Edge width of the marker.
     connect : str | array
         See LineVisual.
+    lod : bool
+        Enables level-of-detail drawing of the line (see LineVisual).
+        Markers are not decimated.
     **kwargs : keyword arguments
         Argements to pass to the super class.
 
@@ -58,11 +61,11 @@ class LinePlotVisual(Visual):
 
     def __init__(self, data, color='k', symbol='o', line_kind='-',
                  width=1., marker_size=10., edge_color='k', face_color='w',
-                 edge_width=1., connect='strip', **kwargs):
+                 edge_width=1., connect='strip', lod=False, **kwargs):
         Visual.__init__(self, **kwargs)
         if line_kind != '-':
             raise ValueError('Only solid lines currently supported')
-        self._line = LineVisual()
+        self._line = LineVisual(lod=lod)
         self._markers = MarkersVisual()
         self.set_data(data, color=color, symbol=symbol,
                       width=width, marker_size=marker_size,
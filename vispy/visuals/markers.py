@@ -501,6 +501,8 @@ class MarkersVisual(Visual):
         self._program.frag['v_size'] = self._v_size_var
         self._program.vert['scalarsize'] = Function(size1d)
         self._program.frag['scalarsize'] = Function(size1d)
+        self._data = None
+        self._bounds = None
         Visual.__init__(self)
         self.set_gl_state(depth_test=False, blend=True,
                           blend_func=('src_alpha', 'one_minus_src_alpha'))
@@ -574,6 +576,7 @@ class MarkersVisual(Visual):
         data['a_size'] = size
         self.antialias = 1.
         self._data = data
+        self._bounds = None
         self._vbo = VertexBuffer(data)
         self.update()
 
@@ -610,10 +613,10 @@ class MarkersVisual(Visual):
         self._program.draw('points')
 
     def bounds(self, mode, axis):
-        pos = self._data['a_position']
-        if pos is None:
+        if self._data is None or not len(self._data):
             return None
-        if pos.shape[1] > axis:
-            return (pos[:, axis].min(), pos[:, axis].max())
-        else:
-            return (0, 0)
+        if self._bounds is None:
+            pos = self._data['a_position']
+            self._bounds = [(pos[:, d].min(), pos[:, d].max())
+                            for d in range(pos.shape[1])]
+        return self._bounds[axis]
@@ -7,6 +7,7 @@ from __future__ import division
 import re
 
 from ... import gloo
+from ...ext.ordereddict import OrderedDict
 
 
 class Compiler(object):
@@ -44,7 +45,7 @@ class Compiler(object):
         """
         return self._object_names[item]
 
-    def compile(self, pretty=True):
+    def compile(self, pretty=True, cache=None):
         """ Compile all code and return a dict {name: code} where the keys
         are determined by the keyword arguments passed to __init__().
 
@@ -55,6 +56,10 @@ class Compiler(object):
             GLSL that is more readable.
             If False, then the output is mostly unreadable GLSL, but is about
             10x faster to compile.
+        cache : CompileCache | None
+            If given (and pretty is True), the result is looked up in the
+            cache using the structure of the shader objects, so that
+            identical programs are only compiled once.
 
         """
         # Authoritative mapping of {obj: name}
@@ -65,7 +70,7 @@ class Compiler(object):
         #
 
         # maps {shader_name: [deps]}
-        self._shader_deps = {}
+        self._shader_deps = OrderedDict()
 
         for shader_name, shader in self.shaders.items():
             this_shader_deps = []
@@ -79,6 +84,51 @@ class Compiler(object):
                 this_shader_deps.append(dep)
                 dep_set.add(dep)
 
+        if cache is not None and pretty:
+            key, objects = self._structure()
+            result = cache.get(key)
+            if result is not None:
+                compiled, names = result
+                self._object_names = dict(zip(objects, names))
+                self.code = dict(compiled)
+                return dict(compiled)
+            compiled = self._compile(pretty)
+            names = [self._object_names[obj] for obj in objects]
+            cache.add(key, (dict(compiled), names))
+            return compiled
+        return self._compile(pretty)
+
+    def _structure(self):
+        """ Return a key that describes the structure of the code to
+        compile, and the list of objects in the order used by the key.
+
+        Objects are numbered in the order in which they appear, and the
+        key consists of the definition of each object using these
+        numbers as names, together with the information that determines
+        the names that the objects get. Two compilations with the same
+        key thus produce the same code, and the same name per object.
+        """
+        objects = []
+        index = {}
+        for shader_name in self._shader_deps:
+            for dep in self._shader_deps[shader_name]:
+                if dep not in index:
+                    index[dep] = '\x01%i' % len(objects)
+                    objects.append(dep)
+        key = []
+        for shader_name in self._shader_deps:
+            shader_key = [shader_name]
+            for dep in self._shader_deps[shader_name]:
+                shader_key.append((index[dep], dep.__class__.__name__,
+                                   dep.name, tuple(dep.static_names()),
+                                   dep.definition(index)))
+            key.append(tuple(shader_key))
+        return tuple(key), objects
+
+    def _compile(self, pretty):
+        """ Assign names and generate the code for the collected
+        dependencies.
+        """
         #
         # 2. Assign names to all objects.
         #
@@ -214,3 +264,52 @@ class Compiler(object):
                 assert name not in ns
                 ns[name] = obj
         self._object_names[obj] = name
+
+
+class CompileCache(object):
+    """
+    Least-recently-used cache of compilation results, for use with
+    ``Compiler.compile(cache=...)``. Results are keyed by the structure of
+    the compiled shader objects, so that programs that consist of
+    identical code only need to be compiled once.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of results to keep.
+    """
+    def __init__(self, max_size=256):
+        self._results = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """ Return the result for *key*, or None if it is not in the cache.
+        """
+        try:
+            result = self._results.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._results[key] = result  # most recently used goes last
+        self.hits += 1
+        return result
+
+    def add(self, key, result):
+        """ Add a result, dropping the least recently used result(s) if
+        the cache is full.
+        """
+        self._results[key] = result
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """ Remove all results and reset the hit and miss counters.
+        """
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
@@ -511,6 +511,7 @@ class MainFunction(Function):
     """
     def __init__(self, *args, **kwargs):
         self._chains = {}
+        self._static_names = None
         Function.__init__(self, *args, **kwargs)
     
     @property
@@ -518,6 +519,9 @@ class MainFunction(Function):
         return ('main', [], 'void')
 
     def static_names(self):
+        if self._static_names is not None:
+            return self._static_names[:]
+
         # parse static variables
         names = Function.static_names(self)
         
@@ -530,7 +534,8 @@ class MainFunction(Function):
             for arg in f[1]:
                 names.append(arg[1])
         
-        return names
+        self._static_names = names
+        return names[:]
 
     def add_chain(self, var):
         """
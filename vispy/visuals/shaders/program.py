@@ -10,7 +10,7 @@ from ...util import logger
 from ...util.event import EventEmitter
 from .function import MainFunction
 from .variable import Variable
-from .compiler import Compiler
+from .compiler import Compiler, CompileCache
 
 
 class ModularProgram(Program):
@@ -19,7 +19,19 @@ class ModularProgram(Program):
 
     Automatically rebuilds program when functions have changed and uploads
     program variables.
+
+    Compilation results are shared by all ModularPrograms through the
+    ``compile_cache`` class attribute (a CompileCache, which has ``hits``
+    and ``misses`` counters), so that programs with identical code are
+    compiled only once.
+
+    The attribute and uniform variables are collected after each build.
+    Variables notify the program when their value changes, so that only
+    those are updated on drawing.
     """
+
+    compile_cache = CompileCache()
+
     def __init__(self, vcode=None, fcode=None):
         Program.__init__(self)
 
@@ -27,6 +39,8 @@ class ModularProgram(Program):
 
         # Cache state of Variables so we know which ones require update
         self._variable_state = {}
+        self._variables = None  # settable Variables, collected after build
+        self._dirty_variables = set()  # Variables whose value has changed
 
         self.vert = vcode
         self.frag = fcode
@@ -99,24 +113,51 @@ class ModularProgram(Program):
     def _build(self):
         logger.debug("Rebuild ModularProgram: %s", self)
         self.compiler = Compiler(vert=self.vert, frag=self.frag)
-        code = self.compiler.compile()
+        code = self.compiler.compile(cache=self.compile_cache)
+        # The variables of the functions are all set again after the build
+        # (in update_variables), so gloo.Program should not resend their
+        # old values, which may not match the types in the new code.
+        for name in self._variable_state:
+            self._user_variables.pop(name, None)
+        self._variable_state = {}
         self.set_shaders(code['vert'], code['frag'])
         logger.debug('==== Vertex Shader ====\n\n%s\n', code['vert'])
         logger.debug('==== Fragment shader ====\n\n%s\n', code['frag'])
-        # Note: No need to reset _variable_state, gloo.Program resends
-        # attribute/uniform data on setting shaders
+        self._collect_variables()
+
+    def _collect_variables(self):
+        """ Collect the attribute and uniform variables of the shaders,
+        and make them notify us of changes to their value.
+        """
+        for var in self._variables or ():
+            var._programs.discard(self)
+        settable_vars = 'attribute', 'uniform'
+        deps = self.vert._dependencies(False) + self.frag._dependencies(False)
+        self._variables = [dep for dep in deps if isinstance(dep, Variable)
+                           and dep.vtype in settable_vars]
+        for var in self._variables:
+            var._programs.add(self)
+        # All variables must be checked
+        self._dirty_variables = set(self._variables)
+
+    def _variable_changed(self, var):
+        """ Called by a Variable when its value changes.
+        """
+        self._dirty_variables.add(var)
 
     def update_variables(self):
         # Clear any variables that we may have set another time.
         # Otherwise we get lots of warnings.
         self._pending_variables = {}
-        # set all variables
-        settable_vars = 'attribute', 'uniform'
+        dirty = self._dirty_variables
+        if not dirty:
+            return
+        self._dirty_variables = set()
+        if len(dirty) == len(self._variables):
+            dirty = self._variables  # keep the order if we set all
+        # set variables whose value has changed
         logger.debug("Apply variables:")
-        deps = self.vert.dependencies() + self.frag.dependencies()
-        for dep in deps:
-            if not isinstance(dep, Variable) or dep.vtype not in settable_vars:
-                continue
+        for dep in dirty:
             name = self.compiler[dep]
             logger.debug("    %s = %s", name, dep.value)
             state_id = dep.state_id
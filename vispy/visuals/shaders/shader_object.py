@@ -25,6 +25,9 @@ class ShaderObject(object):
     
     Dependencies are tracked hierarchically such that changes to any object
     will be propagated up the dependency hierarchy to trigger a recompile.
+    The list of dependencies is cached, and the cache is cleared when a
+    dependency is added or removed, or when the code of a dependency
+    changes.
     """
     
     @classmethod
@@ -64,6 +67,9 @@ class ShaderObject(object):
         # objects that must be declared before this object's definition.
         # {obj: refcount}
         self._deps = OrderedDict()  # OrderedDict for consistent code output
+        
+        # cache of dependencies(), for sort=False and sort=True
+        self._dep_cache = {}
     
     @property
     def name(self):
@@ -86,6 +92,15 @@ class ShaderObject(object):
         """ Return all dependencies required to use this object. The last item 
         in the list is *self*.
         """
+        return self._dependencies(sort)[:]
+    
+    def _dependencies(self, sort):
+        """ Get the (cached) list of dependencies. Must not be modified.
+        """
+        try:
+            return self._dep_cache[sort]
+        except KeyError:
+            pass
         alldeps = []
         if sort:
             def key(obj):
@@ -100,8 +115,9 @@ class ShaderObject(object):
             deps = self._deps
         
         for dep in deps:
-            alldeps.extend(dep.dependencies(sort=sort))
+            alldeps.extend(dep._dependencies(sort))
         alldeps.append(self)
+        self._dep_cache[sort] = alldeps
         return alldeps
 
     def static_names(self):
@@ -121,6 +137,7 @@ class ShaderObject(object):
             self._deps[dep] += 1
         else:
             self._deps[dep] = 1
+            self._dep_cache.clear()
             dep.changed.connect(self._dep_changed)
 
     def _remove_dep(self, dep):
@@ -131,6 +148,7 @@ class ShaderObject(object):
         refcount = self._deps[dep]
         if refcount == 1:
             self._deps.pop(dep)
+            self._dep_cache.clear()
             dep.changed.disconnect(self._dep_changed)
         else:
             self._deps[dep] -= 1
@@ -139,6 +157,9 @@ class ShaderObject(object):
         """ Called when a dependency's expression has changed.
         """
         logger.debug("ShaderObject changed: %r" % event.source)
+        if event.code_changed:
+            # The dependencies of the dependency may have changed
+            self._dep_cache.clear()
         self.changed(event)
     
     def compile(self):
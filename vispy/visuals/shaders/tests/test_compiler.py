@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+from vispy.visuals.shaders import (Function, Variable, Compiler,
+                                   CompileCache, ModularProgram)
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+vert = """
+uniform float u_size;
+void main() {
+    gl_Position = $transform(vec4(0, 0, 0, u_size));
+}
+"""
+
+frag = """
+void main() {
+    gl_FragColor = $color;
+}
+"""
+
+scale = """
+vec4 scale_pos(vec4 pos) {
+    return pos * $scale;
+}
+"""
+
+
+def make_shaders(color='vec4(1, 1, 1, 1)', scale_dtype='float'):
+    v = Function(vert)
+    f = Function(frag)
+    s = Function(scale)
+    s['scale'] = Variable('uniform %s u_scale' % scale_dtype)
+    v['transform'] = s
+    f['color'] = color
+    return v, f, s
+
+
+def test_compile_cache():
+    cache = CompileCache()
+    v1, f1, s1 = make_shaders()
+    compiler1 = Compiler(vert=v1, frag=f1)
+    code1 = compiler1.compile(cache=cache)
+    assert_equal((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+    assert_equal(code1, Compiler(vert=v1, frag=f1).compile())
+
+    # Identical structure, different objects: the result is reused, and
+    # object names are mapped to the new objects
+    v2, f2, s2 = make_shaders()
+    compiler2 = Compiler(vert=v2, frag=f2)
+    code2 = compiler2.compile(cache=cache)
+    assert_equal((cache.hits, cache.misses), (1, 1))
+    assert_equal(code2, code1)
+    assert_equal(compiler2[s2], compiler1[s1])
+    assert_equal(compiler2[s2['scale']], 'u_scale')
+
+    # Different code or types give a different result
+    for kwargs in [dict(color='vec4(1, 0, 0, 1)'), dict(scale_dtype='vec4')]:
+        v3, f3, s3 = make_shaders(**kwargs)
+        code3 = Compiler(vert=v3, frag=f3).compile(cache=cache)
+        assert code3 != code1
+        assert_equal(code3, Compiler(vert=v3, frag=f3).compile())
+    assert_equal((cache.hits, cache.misses, len(cache)), (1, 3, 3))
+
+    # Least recently used results are dropped
+    cache.max_size = 2
+    Compiler(vert=v1, frag=f1).compile(cache=cache)
+    cache.add('foo', None)
+    assert_equal(len(cache), 2)
+    Compiler(vert=v1, frag=f1).compile(cache=cache)
+    assert_equal(cache.hits, 3)
+    cache.clear()
+    assert_equal((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+
+def test_modular_program_cache():
+    cache = ModularProgram.compile_cache
+    hits, misses = cache.hits, cache.misses
+    programs = [ModularProgram(vert, frag) for i in range(3)]
+    for program in programs:
+        program.vert['transform'] = Function(scale)
+        program.vert['transform']['scale'] = 2.0
+        program.frag['color'] = 'vec4(1, 1, 1, 1)'
+        program.build_if_needed()
+    assert_equal(cache.misses - misses, 1)
+    assert_equal(cache.hits - hits, 2)
+
+
+run_tests_if_main()
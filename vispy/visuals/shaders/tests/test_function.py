@@ -425,6 +425,34 @@ def test_FunctionChain():
     assert_in(f5, ch.dependencies())
 
 
+def test_dependency_cache():
+    f1 = Function("vec4 f1(vec4 pos) { return pos * $scale; }")
+    f2 = Function("vec4 f2(vec4 pos) { return $f(pos); }")
+    main = Function("void main() { gl_Position = $pos; }")
+    f1['scale'] = 2.0
+    f2['f'] = f1
+    main['pos'] = f2('vec4(1.0)')
+    deps = main.dependencies()
+    assert_in(f1, deps)
+    assert deps is not main.dependencies()  # a copy of the cached list
+    assert_equal(deps, main.dependencies())
+    
+    # Changes anywhere in the hierarchy invalidate the cache
+    f1['scale'] = Variable('uniform float u_scale')
+    assert_in(f1['scale'], main.dependencies())
+    assert_in(f1['scale'], main.dependencies(sort=True))
+    f3 = Function("vec4 f3(vec4 pos) { return pos; }")
+    f2['f'] = f3
+    assert_not_in(f1, main.dependencies())
+    assert_in(f3, main.dependencies())
+    ch = FunctionChain('chain', [])
+    main['pos'] = ch
+    ch.append(f1)
+    assert_in(f1, main.dependencies(sort=True))
+    ch.remove(f1)
+    assert_not_in(f1, main.dependencies(sort=True))
+
+
 def test_StatementList():
     func = Function("void func() {}")
     main = Function("void main() {}")
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import numpy as np
+
+from vispy.visuals.shaders import ModularProgram, Function, Variable
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+def test_dirty_variables():
+    vert = """
+    attribute vec2 a_pos;
+    void main() {
+        gl_Position = $transform(vec4(a_pos, 0, 1));
+    }
+    """
+    frag = "void main() { gl_FragColor = $color; }"
+    program = ModularProgram(vert, frag)
+    scale = Function("vec4 scale_pos(vec4 pos) { return pos * $scale; }")
+    scale['scale'] = Variable('uniform float u_scale', 1.0)
+    program.vert['transform'] = scale
+    program.frag['color'] = Variable('uniform vec4 u_color', (1, 1, 1, 1))
+
+    def uniforms():
+        commands = program.glir.clear()
+        return [c[2] for c in commands if c[0] == 'UNIFORM']
+
+    program.build_if_needed()
+    assert_equal(sorted(uniforms()), ['u_color', 'u_scale'])
+    assert_equal(len(program._variables), 2)
+    # Nothing changed: no variables are visited
+    program.build_if_needed()
+    assert_equal(program._dirty_variables, set())
+    assert_equal(uniforms(), [])
+    # Only changed variables are set
+    scale['scale'] = 2.0
+    assert_equal(program._dirty_variables, set([scale['scale']]))
+    program.build_if_needed()
+    assert_equal(uniforms(), ['u_scale'])
+    # Changing the code makes the variables to be collected again
+    offset = Function("vec4 offset_pos(vec4 p) { return p + $offset; }")
+    offset['offset'] = Variable('uniform vec4 u_offset', np.zeros(4))
+    program.vert['transform'] = offset
+    program.build_if_needed()
+    # (gloo.Program sends the values again for the new code)
+    assert_equal(sorted(uniforms()), ['u_color', 'u_offset'])
+    assert_equal(len(program._variables), 2)
+    # Variables that are no longer used do not notify the program
+    scale['scale'] = 3.0
+    assert_equal(program._dirty_variables, set())
+
+
+run_tests_if_main()
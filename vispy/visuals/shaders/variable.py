@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2014, Vispy Development Team.
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import weakref
+
 import numpy as np
 from ...ext.six import string_types
 from .shader_object import ShaderObject
@@ -46,6 +48,8 @@ class Variable(ShaderObject):
             raise TypeError("Variable name must be string or None.")
         
         self._state_counter = 0
+        # ModularPrograms that need to know when the value changes
+        self._programs = weakref.WeakSet()
         self._name = name
         self._vtype = vtype
         self._dtype = dtype
@@ -126,6 +130,8 @@ class Variable(ShaderObject):
 
         self._value = value
         self._state_counter += 1
+        for program in self._programs:
+            program._variable_changed(self)
         
         if self._type_locked:
             if dtype != self._dtype or vtype != self._vtype:
@@ -1,9 +1,22 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.gloo import gl
+from vispy.gloo.gl import stub
+from vispy.gloo.context import FakeCanvas
 from vispy.scene.visuals import Image
+from vispy.visuals import ImageVisual
+from vispy.visuals.transforms import TransformSystem
 from vispy.testing import (requires_application, TestingCanvas,
-                           assert_image_equal, run_tests_if_main)
+                           assert_image_equal, run_tests_if_main,
+                           assert_raises, assert_equal)
+
+
+def teardown_module():
+    # The GL call counts of the stub backend are shared by all tests
+    stub._proxy.reset()
 
 
 @requires_application()
@@ -23,4 +36,125 @@ def test_image():
             assert_image_equal("screenshot", expected)
 
 
+def test_image_clim():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        data = np.arange(80, dtype=np.uint8).reshape(8, 10)
+        image = ImageVisual(data)
+        image.draw(transforms)
+        assert_equal(image.clim, (0, 79))
+        texture = image._texture
+        # The data is uploaded as is
+        assert_equal(texture.shape, (8, 10, 1))
+        assert_allclose(image._clim_func['clim'].value, (0, 79 / 255.))
+        # Changing the limits or colormap does not upload the data
+        image.clim = (10, 20)
+        image.cmap = 'grays'
+        assert_equal(len(texture._glir._commands), 0)
+        image.draw(transforms)
+        assert_allclose(image._clim_func['clim'].value, (10 / 255., 20 / 255.))
+        # The texture is reused for data of the same kind
+        image.set_data(data[:4])
+        image.draw(transforms)
+        assert image._texture is texture
+        assert_equal(texture.shape, (4, 10, 1))
+        # Other types are uploaded as float32
+        image.set_data(data.astype(np.int64))
+        image.draw(transforms)
+        assert image._texture is not texture
+        assert_equal(image._texture_format, ('r32f', ()))
+        assert_allclose(image._clim_func['clim'].value, (10, 20))
+    finally:
+        gl.use_gl()
+
+
+def test_image_clim_cpu():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+
+        # Without 16-bit and float textures, as in ES 2.0 and WebGL
+        parser = canvas.context.shared.parser
+        parser.supports_float_textures = lambda: False
+        commands = []
+        parser.parse = commands.extend
+
+        def uploaded(texture):
+            data = [c[-1] for c in commands
+                    if c[0] == 'DATA' and c[1] == texture.id]
+            commands[:] = []
+            return data
+
+        data = np.arange(80, dtype=np.uint16).reshape(8, 10)
+        image = ImageVisual(data, clim=(10, 20))
+        image.draw(transforms)
+        assert_equal(image._texture_format, ('luminance', ()))
+        texture = image._texture
+        upload, = uploaded(texture)
+        assert_allclose(upload[..., 0], (data - 10.) / 10.)
+        assert_allclose(image._clim_func['clim'].value, (0, 1))
+        # Changing the limits uploads the data again
+        image.clim = (0, 40)
+        image.draw(transforms)
+        assert image._texture is texture
+        upload, = uploaded(texture)
+        assert_allclose(upload[..., 0], data / 40.)
+        # uint8 data is still uploaded as is
+        image.set_data(data.astype(np.uint8))
+        image.draw(transforms)
+        assert image._texture is not texture
+        upload, = uploaded(image._texture)
+        assert_equal(upload.dtype, np.uint8)
+        assert_allclose(image._clim_func['clim'].value, (0, 40 / 255.))
+    finally:
+        gl.use_gl()
+
+
+def test_image_scroll():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        data = np.random.uniform(size=(8, 40))
+        image = ImageVisual(data[:, :10], clim=(0, 1))
+        image.draw(transforms)
+        texture = data[:, :10].copy()
+        i = 10
+        for k in (3, 4, 7, 12):
+            image.scroll(data[:, i:i + k])
+            i += k
+            # Only the new columns are uploaded
+            for command in image._texture._glir._commands:
+                if command[0] == 'DATA':
+                    (r, c), part = command[2], command[3][..., 0]
+                    assert part.shape[1] <= k
+                    texture[r:r + part.shape[0], c:c + part.shape[1]] = part
+            image.draw(transforms)
+            offset = image._scroll_func['offset'].value
+            head = int(round(offset[0] * 10))
+            assert_allclose(np.roll(texture, -head, axis=1),
+                            data[:, i - 10:i], rtol=1e-6)
+        # Rows
+        image = ImageVisual(data[:4, :10], clim=(0, 1))
+        image.scroll(data[4:7, :10], axis=0)
+        assert_array_equal(image._scroll, [3, 0])
+        assert_allclose(image._scroll_func['offset'].value, (0, 0.75))
+        assert_raises(ValueError, image.scroll, data[:3, :3], axis=0)
+        assert_raises(ValueError, image.scroll, data[:4, :3], axis=2)
+        # Setting data stops scrolling
+        image.set_data(data[:4, :10])
+        assert image._scroll is None
+    finally:
+        gl.use_gl()
+
+
 run_tests_if_main()
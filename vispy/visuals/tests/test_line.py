@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.gloo import gl
+from vispy.gloo.gl import stub
+from vispy.gloo.context import FakeCanvas
+from vispy.visuals import LineVisual
+from vispy.visuals.line.line import _AggLineVisual, _RingBuffer
+from vispy.visuals.line.lod import MinMaxPyramid
+from vispy.visuals.transforms import TransformSystem, STTransform
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def setup_module():
+    stub._proxy.reset()
+
+
+def teardown_module():
+    # The GL call counts of the stub backend are shared by all tests
+    stub._proxy.reset()
+
+
+def test_minmax_pyramid():
+    y = np.random.normal(size=100003)
+    pyramid = MinMaxPyramid(y, factor=4, min_bins=100)
+    assert_equal(pyramid.n_levels, 5)
+    assert_equal(pyramid.choose_level(1), 0)
+    assert_equal(pyramid.choose_level(20), 2)
+    assert_equal(pyramid.choose_level(1e9), 4)
+    for level in range(pyramid.n_levels):
+        b = pyramid.bin_size(level)
+        idx = pyramid.indices(level, 1000, 60000)
+        assert np.all(np.diff(idx) > 0)
+        if level == 0:
+            assert_equal(len(idx), 59000)
+        else:
+            assert 2 * (59000 // b) <= len(idx) <= 2 * (59000 // b + 2)
+        # Each bin holds its minimum and maximum
+        for i in range(1000 // b, 60000 // b, max(59000 // b // 100, 1)):
+            sel = y[i * b:(i + 1) * b]
+            in_bin = idx[(idx >= i * b) & (idx < (i + 1) * b)]
+            assert_equal(y[in_bin].min(), sel.min())
+            assert_equal(y[in_bin].max(), sel.max())
+    # The last (partial) bin is included
+    assert_equal(pyramid.indices(1, 100000)[-1] >= 100000, True)
+    # Small data gets no levels
+    assert_equal(MinMaxPyramid(y[:100]).n_levels, 1)
+
+
+def test_line_lod():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (1000, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        n = 1000000
+        pos = np.empty((n, 2), np.float32)
+        pos[:, 0] = np.arange(n)
+        pos[:, 1] = np.random.normal(size=n)
+        pos[n // 3, 1] = 100
+        color = np.ones((n, 4), np.float32)
+        line = LineVisual(pos, color=color, lod=True)
+        # All data in 1000 pixels
+        transforms.visual_to_document = STTransform(scale=(1000. / n, 1))
+        line.draw(transforms)
+        drawn = line._get_pos()
+        assert len(drawn) < 10000
+        assert_equal(drawn[:, 1].max(), 100)
+        assert_equal(len(line._interpret_color()), len(drawn))
+        # Zoom in on a small part: higher resolution, but still few vertices
+        transforms.visual_to_document = STTransform(scale=(1, 1),
+                                                    translate=(-n // 2, 0))
+        line.draw(transforms)
+        drawn = line._get_pos()
+        assert len(drawn) < 10000
+        assert drawn[0, 0] < n // 2 < drawn[-1, 0]
+        assert_array_equal(np.diff(drawn[:, 0]), 1)
+        # Small pans reuse the uploaded vertices
+        index = line._lod_index
+        transforms.visual_to_document = STTransform(
+            scale=(1, 1), translate=(-n // 2 - 100, 0))
+        line.draw(transforms)
+        assert line._lod_index is index
+        # Disabled
+        line.lod = False
+        line.draw(transforms)
+        assert_equal(len(line._get_pos()), n)
+    finally:
+        gl.use_gl()
+
+
+def test_line_append():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        pos = np.random.normal(size=(20, 2)).astype(np.float32)
+        color = np.random.uniform(size=(20, 4)).astype(np.float32)
+        for method in ('agg', 'gl'):
+            line = LineVisual(pos[:10], color=color[:10], method=method)
+            line.draw(transforms)
+            line.append(pos[10:15], color[10:15])
+            line.draw(transforms)
+            line.append(pos[15:], color[15:])
+            line.draw(transforms)
+            assert_array_equal(line.pos, pos)
+            full = LineVisual(pos, color=color, method=method)
+            full.draw(transforms)
+            if method == 'agg':
+                a, b = line._line_visual._vbo, full._line_visual._vbo
+                assert_equal(a.size, b.size)
+                for name in ('a_position', 'a_tangents', 'a_angles',
+                             'color'):
+                    assert_array_equal(a.data[name][:a.size], b.data[name])
+                a, b = line._line_visual._ibo, full._line_visual._ibo
+                assert_array_equal(a.data[:a.size], b.data)
+            else:
+                a, b = line._line_visual._pos_vbo, full._line_visual._pos_vbo
+                assert_array_equal(a.data[:a.size], b.data)
+        # Only strips can be appended to
+        line = LineVisual(pos, connect='segments')
+        assert_raises(ValueError, line.append, pos)
+        # Color per vertex must match
+        line = LineVisual(pos, color=color)
+        assert_raises(ValueError, line.append, pos)
+    finally:
+        gl.use_gl()
+
+
+def test_line_gl_state():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        pos = np.random.normal(size=(10, 2)).astype(np.float32)
+        line = LineVisual(pos, width=3, method='gl', antialias=True)
+        line.draw(transforms)
+        # The line width and smoothing are set through GLIR, so that the
+        # state shadow of the parser stays in sync
+        state = canvas.context.shared.parser.env['state']
+        assert_equal(state['glLineWidth'], (3.,))
+        assert_equal(state[0x0B20], True)  # GL_LINE_SMOOTH
+        line.antialias = False
+        line.set_data(width=1)
+        line.draw(transforms)
+        assert_equal(state['glLineWidth'], (1.,))
+        assert_equal(state[0x0B20], False)
+    finally:
+        gl.use_gl()
+
+
+def test_agg_bake_connect():
+    pos = np.random.normal(size=(10, 2)).astype(np.float32)
+    color = np.ones(4, np.float32)
+    V, I = _AggLineVisual._agg_bake(pos, color)
+    assert_equal(len(V), 4 * 9)
+    assert_equal(len(I), 6 * 9)
+    # Two separate strips: the segments are not joined across the gap
+    connect = np.array([[0, 1], [1, 2], [5, 6]])
+    V, I = _AggLineVisual._agg_bake(pos, color, connect=connect)
+    assert_equal(len(V), 4 * 3)
+    assert_array_equal(V['a_angles'][8:, 0], 0)
+    assert_array_equal(V['a_segment'][8:, 0], 0)
+    V, I = _AggLineVisual._agg_bake(pos, color, connect='segments')
+    assert_equal(len(V), 4 * 5)
+
+
+def _replay_data(buffer, mem):
+    """ Apply the DATA commands of a buffer to an array. """
+    for command in buffer._glir.clear():
+        if command[0] == 'DATA':
+            data = command[3].view(np.uint8).ravel()
+            mem.view(np.uint8)[command[2]:command[2] + len(data)] = data
+
+
+def test_ring_buffer():
+    ring = _RingBuffer(np.arange(10))
+    mem = np.zeros(20, np.float32)
+    _replay_data(ring.buffer, mem)
+    expected = np.arange(10)
+    for k in (3, 4, 7, 12, 1, 10):
+        new = np.arange(k) + expected[-1] + 1
+        expected = np.concatenate([expected, new])[-10:]
+        ring.push(new)
+        _replay_data(ring.buffer, mem)
+        view = ring.view()
+        assert_equal(view.size, 10)
+        start = view.offset // 4
+        assert_array_equal(mem[start:start + 10], expected)
+
+
+def test_line_scroll():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        pos = np.zeros((10, 2), np.float32)
+        pos[:, 0] = np.arange(10)
+        color = np.random.uniform(size=(10, 4)).astype(np.float32)
+        y = np.arange(100, dtype=np.float32)
+        new_color = np.random.uniform(size=(100, 4)).astype(np.float32)
+        for method in ('gl', 'agg'):
+            line = LineVisual(pos, color=color, method=method)
+            line.draw(transforms)
+            line.scroll(y[:3], new_color[:3])
+            line.draw(transforms)
+            line.scroll(y[3:7], new_color[3:7])
+            line.draw(transforms)
+            assert_array_equal(line.pos[:, 0], pos[:, 0])
+            assert_array_equal(line.pos[:, 1], np.append(pos[7:, 1], y[:7]))
+            assert_array_equal(line.color, np.append(color[7:],
+                                                     new_color[:7], axis=0))
+            if method == 'gl':
+                # The circular buffers are set up on the first scroll
+                assert_equal(line._line_visual._pos_ring.head, 4)
+                assert_equal(line._line_visual._color_ring.head, 4)
+            # More values than vertices
+            line.scroll(y[7:20], new_color[7:20])
+            line.draw(transforms)
+            assert_array_equal(line.pos[:, 1], y[10:20])
+        # The given data is not modified
+        assert_array_equal(pos[:, 1], 0)
+        # Appending switches back to a normal buffer
+        line = LineVisual(pos)
+        line.scroll(y[:3])
+        line.draw(transforms)
+        line.append([[10, 1]])
+        line.draw(transforms)
+        assert line._line_visual._pos_ring is None
+        assert_equal(len(line.pos), 11)
+        assert_raises(ValueError, line.scroll, np.zeros((3, 2)))
+        assert_raises(ValueError, line.scroll, y[:3], new_color[:3])
+    finally:
+        gl.use_gl()
+
+
+run_tests_if_main()
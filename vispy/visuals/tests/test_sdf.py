@@ -5,30 +5,30 @@ import numpy as np
 from numpy.testing import assert_allclose
 
 from vispy.app import Canvas
-from vispy.visuals.text._sdf import SDFRenderer
+from vispy.visuals.text._sdf import SDFRenderer, _calc_distance_field
 from vispy import gloo
 from vispy.testing import requires_application, run_tests_if_main
 
+# test a simple cases
+data = (np.array([[0, 0, 0, 0, 0, 0, 0, 0, 0],
+                  [0, 0, 0, 0, 0, 0, 0, 0, 0],
+                  [0, 0, 1, 1, 1, 1, 1, 0, 0],
+                  [0, 0, 1, 1, 1, 1, 1, 0, 0],
+                  [0, 0, 1, 1, 1, 1, 1, 0, 0],
+                  [0, 0, 1, 1, 1, 1, 1, 0, 0]]) * 255).astype(np.uint8)
+expd = (np.array([[8, 5, 4, 4, 4, 4, 4, 5, 8],
+                  [5, 2, 1, 1, 1, 1, 1, 2, 5],
+                  [4, 1, 0, 0, 0, 0, 0, 1, 4],
+                  [4, 1, 0, -1, -4, -1, 0, 1, 4],  # XXX artifact
+                  [4, 1, 0, -1, -4, -1, 0, 1, 4],
+                  [4, 1, 0, -1, -4, -1, 0, 1, 4]]))
+expd = 0.5 - (np.sqrt(np.abs(expd)) * np.sign(expd)) / 256. * 8
+expd = np.round(256 * expd).astype(np.int)
+
 
 @requires_application()
 def test_sdf():
     """Test basic text support - sdf"""
-    # test a simple cases
-    data = (np.array([[0, 0, 0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 1, 1, 1, 1, 1, 0, 0],
-                      [0, 0, 1, 1, 1, 1, 1, 0, 0],
-                      [0, 0, 1, 1, 1, 1, 1, 0, 0],
-                      [0, 0, 1, 1, 1, 1, 1, 0, 0]]) * 255).astype(np.uint8)
-    expd = (np.array([[8, 5, 4, 4, 4, 4, 4, 5, 8],
-                      [5, 2, 1, 1, 1, 1, 1, 2, 5],
-                      [4, 1, 0, 0, 0, 0, 0, 1, 4],
-                      [4, 1, 0, -1, -4, -1, 0, 1, 4],  # XXX artifact
-                      [4, 1, 0, -1, -4, -1, 0, 1, 4],
-                      [4, 1, 0, -1, -4, -1, 0, 1, 4]]))
-    expd = 0.5 - (np.sqrt(np.abs(expd)) * np.sign(expd)) / 256. * 8
-    expd = np.round(256 * expd).astype(np.int)
-
     with Canvas(size=(100, 100)):
         tex = gloo.Texture2D(data.shape + (3,), format='rgb')
         SDFRenderer().render_to_texture(data, tex, (0, 0), data.shape[::-1])
@@ -40,4 +40,16 @@ def test_sdf():
         assert_allclose(result, expd, atol=1)
 
 
+def test_sdf_cpu():
+    """Test the CPU SDF"""
+    result = np.round(256 * _calc_distance_field(data, 9, 6)).astype(np.int)
+    # the exact distance transform does not have the artifact
+    expd_cpu = expd.copy()
+    expd_cpu[3, 4] = expd[3, 3]
+    assert_allclose(result, expd_cpu, atol=1)
+    # at a lower resolution, the nearest pixels are used
+    result = np.round(256 * _calc_distance_field(data, 3, 2)).astype(np.int)
+    assert_allclose(result, expd_cpu[1::3, 1::3], atol=1)
+
+
 run_tests_if_main()
@@ -1,7 +1,28 @@
 # -*- coding: utf-8 -*-
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from vispy.ext.six import unichr
+from vispy.gloo import gl, TextureAtlas
+from vispy.gloo.gl import stub
+from vispy.gloo.context import FakeCanvas
 from vispy.scene.visuals import Text
+from vispy.visuals import TextVisual
+from vispy.visuals.text import build_glyph_cache
+from vispy.visuals.text import _cache
+from vispy.visuals.text.text import FontManager, _layout
+from vispy.visuals.transforms import TransformSystem
 from vispy.testing import (requires_application, TestingCanvas,
-                           assert_image_equal, run_tests_if_main)
+                           assert_image_equal, run_tests_if_main,
+                           assert_equal, assert_raises, SkipTest)
+from vispy.util import _TempDir
+
+temp_dir = _TempDir()
+
+
+def teardown_module():
+    # The GL call counts of the stub backend are shared by all tests
+    stub._proxy.reset()
 
 
 @requires_application()
@@ -17,4 +38,244 @@ def test_text():
         assert_image_equal("screenshot", 'visuals/text1.png')
 
 
+def _get_font(manager):
+    font = manager.get_font('DejaVu Sans')
+    try:
+        font['a']
+    except Exception:
+        raise SkipTest('Font not available')
+    return font
+
+
+def _layout_char(text, font, anchor_x, anchor_y):
+    """Lay out one text a char at a time"""
+    ratio, slop = 1. / font.ratio, font.slop
+    position = []
+    x_off, prev = -slop, None
+    for char in text:
+        glyph = font[char]
+        kerning = glyph['kerning'].get(prev, 0.) * ratio
+        x0 = x_off + glyph['offset'][0] * ratio + kerning
+        y0 = glyph['offset'][1] * ratio + slop
+        x1 = x0 + glyph['size'][0]
+        y1 = y0 - glyph['size'][1]
+        position += [[x0, y0], [x0, y1], [x1, y1], [x1, y0]]
+        x_off += glyph['advance'] * ratio + kerning
+        prev = char
+    position = np.array(position)
+    width = x_off + slop - font['y']['advance'] * ratio + \
+        font['y']['size'][0] - 2 * slop
+    if anchor_x == 'right':
+        position[:, 0] -= width
+    if anchor_y == 'top':
+        ascender = max(position[:, 1].max(),
+                       font['h']['offset'][1] * ratio + slop) - slop
+        position[:, 1] -= ascender
+    return position / font._lowres_size
+
+
+def test_text_layout():
+    """Test laying out several texts at once"""
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()  # noqa
+        font = _get_font(FontManager(cache=False))
+        texts = [u'AVAWA To', u'', u'x', u'Wörld']
+        for anchor_x, anchor_y in (('left', 'baseline'), ('right', 'top')):
+            position, texcoord, counts, ids = _layout(texts, font,
+                                                      anchor_x, anchor_y, 64)
+            assert_array_equal(counts, [8, 0, 1, 5])
+            assert_equal(position.shape, (56, 2))
+            starts = 4 * np.concatenate([[0], np.cumsum(counts)])
+            for i, text in enumerate(texts):
+                if text:
+                    expected = _layout_char(text, font, anchor_x, anchor_y)
+                    assert_allclose(position[starts[i]:starts[i + 1]],
+                                    expected, atol=1e-5)
+        x, y, w, h = font._regions[u'x']
+        x0, y0, x1, y1 = x + 1, y + 1, x + w - 1, y + h - 1
+        assert_allclose(texcoord[32:36], [[x0, y0], [x0, y1],
+                                          [x1, y1], [x1, y0]])
+        # the kerning is in the tables too
+        ids = font.get_glyph_ids(u'AV')
+        assert_equal(font.get_kerning(ids[:1], ids[1:])[0],
+                     font['V']['kerning']['A'])
+    finally:
+        gl.use_gl()
+
+
+def test_text_labels():
+    """Test drawing many texts in one call"""
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        _get_font(FontManager(cache=False))
+        pos = np.random.uniform(0, 100, (10, 2))
+        sizes = np.arange(10) + 6.
+        text = TextVisual(['label %d' % i for i in range(10)],
+                          face='DejaVu Sans', pos=pos, font_size=sizes,
+                          color=['red'] * 5 + ['blue'] * 5)
+        text.draw(transforms)
+        data = text._vertex_data
+        assert_equal(len(data), 4 * 70)
+        assert_allclose(data['a_pos'][::28, :2], pos)
+        assert_allclose(data['a_font_size'][::28], sizes)
+        assert_allclose(data['a_color'][-1], (0, 0, 1, 1))
+        uploads = []
+        text._vertices.set_subdata = lambda data, offset: uploads.append(
+            (offset, len(data)))
+        # Changing a text of the same length only uploads its vertices
+        values = text._text_values()
+        text.set_labels([3, 4], text='LABEL ?', color='green')
+        text.set_labels(7, pos=(1, 2, 3))
+        assert text._text_values() is values
+        text._upload_gap = 0
+        text.draw(transforms)
+        assert_equal(uploads, [(4 * 21, 56), (4 * 49, 28)])
+        assert_allclose(text._vertex_data['a_color'][4 * 21:4 * 35],
+                        np.tile((0, 0.5, 0, 1), (56, 1)), atol=0.01)
+        assert_allclose(text._vertex_data['a_pos'][4 * 49], (1, 2, 3))
+        assert_allclose(text._vertex_data['a_pos'][4 * 49 - 1, :2], pos[6])
+        assert_equal(text.text[3], 'LABEL ?')
+        assert_allclose(text.color.rgba[7], (0, 0, 1, 1))
+        # Runs of changed texts close together are uploaded at once
+        del text._upload_gap
+        uploads[:] = []
+        text.set_labels(1, font_size=30)
+        text.set_labels(4, color='red')
+        text.draw(transforms)
+        assert_equal(uploads, [(4 * 7, 112)])
+        assert_allclose(text._vertex_data['a_font_size'][4 * 7], 30)
+        assert_allclose(text.font_size[:3], (6, 30, 8))
+        # Another length needs a new layout
+        text.set_labels(0, text='x')
+        text.draw(transforms)
+        assert_equal(len(text._vertex_data), 4 * 64)
+        assert_raises(ValueError, setattr, text, 'pos', np.zeros((3, 4)))
+        text.pos = np.zeros((3, 2))
+        assert_raises(ValueError, text.draw, transforms)
+
+        # Texts in the same context share the glyph atlas
+        text2 = TextVisual('label', face='DejaVu Sans')
+        text2.draw(transforms)
+        assert text2._font is text._font
+        assert_equal(text2.text, 'label')
+    finally:
+        gl.use_gl()
+
+
+def test_glyph_cache():
+    """Test loading glyphs from the on-disk cache"""
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()  # noqa
+        font = _get_font(FontManager(cache=False))
+        chars = u'AVAWA To'
+        ids = font.get_glyph_ids(chars)
+        # The cache is built without GL, when glyphs are missing
+        build_glyph_cache(u'AV', face='DejaVu Sans', directory=temp_dir)
+        load_glyph = _cache._load_glyph
+
+        def check_load_glyph(font, char, glyphs_dict):
+            # All backends may use the metrics of the other glyphs
+            for glyph in glyphs_dict.values():
+                for key in ('char', 'offset', 'advance', 'kerning'):
+                    assert key in glyph
+            load_glyph(font, char, glyphs_dict)
+
+        _cache._load_glyph = check_load_glyph
+        try:
+            font_cached = FontManager(cache=temp_dir).get_font('DejaVu Sans')
+            ids_cached = font_cached.get_glyph_ids(chars)
+        finally:
+            _cache._load_glyph = load_glyph
+        assert_equal(len(font_cached._cache), 6)
+        for name in ('_advance', '_offset', '_size'):
+            assert_allclose(getattr(font_cached, name)[ids_cached],
+                            getattr(font, name)[ids])
+        assert_allclose(font_cached.get_kerning(ids_cached[:-1],
+                                                ids_cached[1:]),
+                        font.get_kerning(ids[:-1], ids[1:]))
+        # Warm: no rasterization
+        _cache._load_glyph = None
+        try:
+            font_warm = FontManager(cache=temp_dir).get_font('DejaVu Sans')
+            ids_warm = font_warm.get_glyph_ids(chars[::-1])[::-1]
+        finally:
+            _cache._load_glyph = load_glyph
+        assert_allclose(font_warm.get_kerning(ids_warm[:-1], ids_warm[1:]),
+                        font.get_kerning(ids[:-1], ids[1:]))
+
+        # The kerning of a character with itself is taken from the cache
+        def kern_load_glyph(font, char, glyphs_dict):
+            load_glyph(font, char, glyphs_dict)
+            glyphs_dict[char]['kerning'][char] = -3.
+
+        _cache._load_glyph = kern_load_glyph
+        try:
+            font_kern = FontManager(cache=_TempDir()).get_font('DejaVu Sans')
+            ids_kern = font_kern.get_glyph_ids(u'xx')
+        finally:
+            _cache._load_glyph = load_glyph
+        assert_equal(font_kern._cache.get_kerning(u'x', u'x'), -3.)
+        assert_allclose(font_kern.get_kerning(ids_kern[:1], ids_kern[1:]),
+                        [-3.])
+        sdf = font_cached._cache.get(u'A')['sdf']
+        assert_equal(sdf.shape, (font['A']['size'][1], font['A']['size'][0]))
+        assert_equal(sdf[0, 0], 0.)  # far outside, in the border
+        assert sdf.max() > 0.5
+    finally:
+        gl.use_gl()
+
+
+def test_glyph_eviction():
+    """Test growing the atlas and evicting glyphs"""
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        font = FontManager(cache=temp_dir).get_font('DejaVu Sans')
+        font._atlas = TextureAtlas((128, 128), max_shape=(256, 256))
+        text = TextVisual(u'abc', face='DejaVu Sans')
+        text._font = font
+        text.draw(transforms)
+        assert_equal(font.n_grows, 1)
+        assert_equal(font._atlas.shape[:2], (256, 256))
+        region = font._regions[u'a']
+        font.get_glyph_ids(u'defgi')
+        # the glyphs keep their place (in texels) when the atlas grows
+        assert_equal(font._regions[u'a'], region)
+        assert_equal(font.n_evictions, 0)
+        assert 0.3 < font._atlas.occupancy < 1
+        # When the atlas is full, the glyphs that were not used recently
+        # are evicted
+        data = text._vertex_data
+        text.draw(transforms)  # abc is used
+        assert text._vertex_data is data
+        font.get_glyph_ids(u'jklmnop')
+        assert font.n_evictions > 0
+        for char in u'abcjklmnop':
+            assert char in font._regions
+        evicted = [c for c in font._glyph_ids if c not in font._regions]
+        assert_equal(len(evicted), font.n_evictions)
+        assert set(evicted) <= set(u'defgihy')  # hy: only for metrics
+        font.get_glyph_ids(evicted[0])
+        assert evicted[0] in font._regions
+        # Visuals lay out their text again after evictions
+        text.draw(transforms)
+        assert text._vertex_data is not data
+        ids = font.get_glyph_ids(u'abc')
+        assert_allclose(text._vertex_data['a_texcoord'][0::4],
+                        font._texcoords[ids][:, :2])
+        assert_raises(RuntimeError, font.get_glyph_ids,
+                      u''.join(unichr(c) for c in range(0x4e00, 0x4e40)))
+    finally:
+        gl.use_gl()
+
+
 run_tests_if_main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import gc
+import time
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.gloo import gl
+from vispy.gloo.gl import stub
+from vispy.gloo.context import FakeCanvas
+from vispy.visuals import TiledImageVisual
+from vispy.visuals.tiled_image import ImagePyramid
+from vispy.visuals.transforms import TransformSystem, STTransform
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+def teardown_module():
+    # The GL call counts of the stub backend are shared by all tests
+    stub._proxy.reset()
+
+
+def test_image_pyramid():
+    data = np.random.uniform(size=(1000, 700)).astype(np.float32)
+    pyramid = ImagePyramid(data, tile_size=64, cache_size=10)
+    assert_equal(pyramid.n_levels, 5)
+    assert_equal(pyramid.level_shape(1), (500, 350))
+    assert_equal(pyramid.level_shape(4), (63, 44))
+    assert_equal(pyramid.n_tiles(0), (16, 11))
+    assert_equal(pyramid.n_tiles(4), (1, 1))
+    assert_equal(pyramid.tile_rect(1, 1, 2), (256, 128, 128, 128))
+    assert_equal(pyramid.tile_rect(0, 15, 10), (640, 960, 60, 40))
+    assert_array_equal(pyramid.get_tile(0, 1, 2), data[64:128, 128:192])
+    # Tiles above level 0 are the mean of 2x2 pixels
+    tile = pyramid.get_tile(1, 1, 2)
+    assert_equal(tile.shape, (64, 64))
+    expected = data[128:256, 256:384].reshape(64, 2, 64, 2).mean(axis=(1, 3))
+    assert_allclose(tile, expected, rtol=1e-5)
+    tile = pyramid.get_tile(4, 0, 0)
+    assert_equal(tile.shape, (63, 44))
+    assert_allclose(tile.mean(), data.mean(), rtol=1e-2)
+    assert len(pyramid._cache) <= 10
+    # Integer data keeps its dtype
+    pyramid = ImagePyramid(data.astype(np.uint8), tile_size=64)
+    assert_equal(pyramid.get_tile(2, 0, 0).dtype, np.uint8)
+
+
+def test_tiled_image():
+    gl.use_gl('stub')
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        data = np.random.randint(0, 255, (1000, 700)).astype(np.uint8)
+        image = TiledImageVisual(data, tile_size=64, threaded=False)
+        assert_equal(image.bounds('visual', 0), (0, 700))
+        assert_equal(image.bounds('visual', 1), (0, 1000))
+        # Zoomed out: a coarse level
+        transforms.visual_to_document = STTransform(scale=(0.1, 0.1))
+        level, visible = image._visible_tiles(transforms)
+        assert_equal(level, 3)
+        assert_equal(len(visible), 4)
+        image.draw(transforms)
+        assert_equal(image.n_resident, 5)  # and the top tile
+        # Zoomed in: level 0, only the tiles in view
+        transforms.visual_to_document = STTransform(scale=(1, 1),
+                                                    translate=(-300, -300))
+        level, visible = image._visible_tiles(transforms)
+        assert_equal(level, 0)
+        assert_equal(visible, [(0, r, c) for r in (4, 5, 6)
+                               for c in (4, 5, 6)])
+        image.draw(transforms)
+        assert_equal(image.n_resident, 14)
+        # Textures that are not in view are deleted to fit the budget
+        image.gpu_budget = 64 * 64 * 6
+        image.draw(transforms)
+        assert_equal(image.n_resident, 10)
+        # Limits from the top tile
+        assert_allclose(image._clim_func['clim'].value[1] * 255,
+                        image.pyramid.get_tile(4, 0, 0).max())
+        image.clim = 0, 255
+        assert_allclose(image._clim_func['clim'].value, (0, 1))
+
+        # Loading in a background thread
+        image = TiledImageVisual(data, tile_size=64)
+        for i in range(100):
+            image.draw(transforms)
+            if image.n_resident == 10:
+                break
+            time.sleep(0.01)
+        assert_equal(image.n_resident, 10)
+        assert not image._loader.busy
+        image._loader.stop()
+        image._loader._thread.join(1.)
+        assert not image._loader._thread.is_alive()
+
+        # The thread ends when the visual is deleted
+        image = TiledImageVisual(data, tile_size=64)
+        image.draw(transforms)
+        thread = image._loader._thread
+        assert thread.is_alive()
+        del image
+        gc.collect()
+        thread.join(1.)
+        assert not thread.is_alive()
+    finally:
+        gl.use_gl()
+
+
+run_tests_if_main()
@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import os
+from tempfile import mkdtemp
+from shutil import rmtree
+
 import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.gloo import gl
+from vispy.gloo.context import FakeCanvas
 from vispy.scene.visuals import Volume
+from vispy.visuals import VolumeVisual
+from vispy.visuals.transforms import TransformSystem, STTransform
 
-from vispy.testing import run_tests_if_main, requires_pyopengl
+from vispy.testing import run_tests_if_main, requires_pyopengl, assert_equal
 from vispy.testing import TestingCanvas, requires_application
 #from vispy.gloo.util import _screenshot
 from nose.tools import assert_raises
@@ -52,4 +62,123 @@ def test_volume_draw():
         # If the draw went without errors, we are happy for the test ...
 
 
+def test_volume_bricks():
+    gl.use_gl('stub')
+    tempdir = mkdtemp()
+    try:
+        canvas = FakeCanvas()
+        canvas.size = (100, 100)
+        canvas.dpi = 96
+        transforms = TransformSystem(canvas)
+        transforms.visual_to_document = STTransform(scale=(1, 1, 1))
+
+        # Bricks are read from a memmap
+        fname = os.path.join(tempdir, 'vol.dat')
+        vol = np.memmap(fname, np.uint16, 'w+', shape=(40, 50, 60))
+        vol[:] = 10
+        vol[5:15, 5:15, 5:15] = 1000
+        vol[16:, 40:, 40:] = 500
+        V = VolumeVisual(vol, brick_size=16, gpu_budget=3 * 17 ** 3 * 2)
+        bricks = V._bricks
+        assert_equal(bricks.grid, (3, 4, 4))
+        assert_equal(bricks.capacity, 3)
+        assert_equal(bricks.mins[0, 0, 0], 10)
+        assert_equal(bricks.maxs[0, 0, 0], 1000)
+        assert_equal(bricks.maxs[0, 2, 2], 500)  # shares a voxel
+        assert_equal(bricks.maxs[0, 1, 1], 10)
+        assert_equal(V.clim, (10, 1000))
+        assert_allclose(V.threshold, (vol.mean() - 10) / 990.)
+        assert_equal(V._tex.shape[:3], (17, 34, 34))
+        assert_allclose(V._clim_func['clim'].value,
+                        np.array([10, 1000]) / 65535., rtol=1e-5)
+
+        # Only bricks that are not empty under the contrast limits
+        V.clim = 500, 1000
+        needed = V._needed_bricks(transforms)
+        assert_array_equal(np.argwhere(needed), [[0, 0, 0]])
+        assert not bricks.update(needed)
+        assert_equal(bricks.n_uploads, 1)
+        assert_equal(bricks._table[0, 0, 0, 3], 255)
+        assert_equal(bricks._table.sum(axis=-1).astype(bool).sum(), 1)
+
+        # Or under the threshold
+        V.clim = 0, 1000
+        V.method = 'iso'
+        V.threshold = 0.4
+        needed = V._needed_bricks(transforms)
+        assert_equal(needed.sum(), 1 + 3 * 2 * 2)
+        # The atlas is too small; bricks that do not fit are not drawn
+        assert not bricks.update(needed)
+        assert_equal(bricks.n_resident, 3)
+        assert_equal(bricks.n_uploads, 3)
+        assert_equal((bricks._table[..., 3] == 255).sum(), 3)
+        assert not bricks.update(needed)
+        assert_equal(bricks.n_uploads, 3)
+
+        # Bricks out of view are not needed, and can be evicted
+        transforms.visual_to_document = STTransform(scale=(10, 10, 10))
+        needed = V._needed_bricks(transforms)
+        assert_array_equal(np.argwhere(needed), [[0, 0, 0]])
+        V.threshold = 0.001
+        needed = V._needed_bricks(transforms)
+        assert_array_equal(np.argwhere(needed), [[0, 0, 0], [1, 0, 0],
+                                                 [2, 0, 0]])
+        bricks.update(needed)
+        assert_equal(sorted(bricks._resident), [(0, 0, 0), (1, 0, 0),
+                                                (2, 0, 0)])
+        assert_equal(bricks.n_uploads, 5)
+        # When all needed bricks are resident, nothing can be evicted
+        transforms.visual_to_document = STTransform(scale=(1, 1, 1))
+        assert not bricks.update(V._needed_bricks(transforms))
+        assert_equal(bricks.n_uploads, 5)
+        # The number of uploads per frame is limited
+        V2 = VolumeVisual(vol, method='iso', threshold=-1, brick_size=16)
+        assert_equal(V2._bricks.capacity, 48)
+        needed = V2._needed_bricks(transforms)
+        assert V2._bricks.update(needed, max_uploads=40)
+        assert not V2._bricks.update(needed, max_uploads=40)
+        assert_equal(V2._bricks.n_resident, 48)
+
+        # The shaders build
+        V._program.vert['transform'] = transforms.get_full_transform()
+        V._program.vert['viewtransformf'] = transforms.visual_to_document
+        V._program.vert['viewtransformi'] = \
+            transforms.visual_to_document.inverse
+        V._program.build_if_needed()
+        assert_raises(ValueError, VolumeVisual, vol, brick_size=16,
+                      emulate_texture=True)
+        del V, V2, bricks, vol
+    finally:
+        gl.use_gl()
+        rmtree(tempdir, ignore_errors=True)
+
+
+def test_volume_dtype():
+    gl.use_gl('stub')
+    try:
+        vol = np.zeros((20, 20, 20), np.uint8)
+        vol[8:16, 8:16, :] = 200
+        V = VolumeVisual(vol)
+        assert_equal(V._tex._internalformat, 'luminance')
+        assert_equal(V.clim, (0, 200))
+        assert_allclose(V._clim_func['clim'].value, (0, 200 / 255.))
+        # Changing the limits does not upload the data again
+        tex = V._tex
+        V.clim = 10, 100
+        assert V._tex is tex
+        assert_allclose(V._clim_func['clim'].value, (10 / 255., 100 / 255.))
+        V.set_data(vol.astype(np.float64))
+        assert V._tex is not tex
+        assert_equal(V._tex._internalformat, 'r32f')
+        assert_allclose(V._clim_func['clim'].value, (10, 100))
+        # Float data with several channels
+        for n, fmt in ((2, 'rg32f'), (3, 'rgb32f'), (4, 'rgba32f')):
+            vol = np.random.rand(8, 8, 8, n).astype(np.float32)
+            V = VolumeVisual(vol)
+            assert_equal(V._tex._internalformat, fmt)
+            assert_equal(V._tex.shape, (8, 8, 8, n))
+    finally:
+        gl.use_gl()
+
+
 run_tests_if_main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+On-disk cache of SDF glyphs, so that glyphs are rasterized and converted
+to a SDF only once.
+"""
+
+import os
+from os import path as op
+
+import numpy as np
+
+from ._sdf import _calc_distance_field
+from ...ext.six import unichr
+from ...util import logger
+from ...util.config import config
+from ...util.fonts import _load_glyph
+
+
+def _get_cache_dir():
+    """Get the default directory of the glyph caches (or None)"""
+    if config['data_path'] is None:
+        return None
+    return op.join(config['data_path'], 'glyph_cache')
+
+
+class GlyphCache(object):
+    """SDF glyphs and their metrics for one font, stored in a NPZ file
+
+    The glyphs are stored at the size they have in the atlas of a
+    TextureFont, as uint8. Glyphs that are not in the cache yet are
+    computed with a CPU implementation of the SDF, which does not need
+    a GL context, so that the cache can also be built beforehand.
+
+    Parameters
+    ----------
+    font : dict
+        Dict with entries "face", "size", "bold", "italic".
+    spread : int
+        The SDF border at the high-res font size.
+    lowres_size : int
+        The size of the glyphs in the atlas.
+    directory : str | None
+        The directory of the cache files. None uses the glyph_cache
+        directory in ``config['data_path']``.
+    """
+    def __init__(self, font, spread, lowres_size, directory=None):
+        self._font = dict(font)
+        self._spread = spread
+        self._ratio = font['size'] // lowres_size
+        directory = _get_cache_dir() if directory is None else directory
+        self._fname = None
+        if directory is not None:
+            name = '%s-%s-%s-%s-%s-%s.npz' % (font['face'], font['bold'],
+                                              font['italic'], font['size'],
+                                              spread, lowres_size)
+            self._fname = op.join(directory, name.replace(' ', '_'))
+        self._index = {}
+        self._advance = np.zeros(0, np.float32)
+        self._offset = np.zeros((0, 2), np.float32)
+        self._shape = np.zeros((0, 2), np.intp)
+        self._starts = np.zeros(1, np.intp)
+        self._pixels = np.zeros(0, np.uint8)
+        self._kerning = {}
+        if self._fname is not None and op.isfile(self._fname):
+            try:
+                self._read()
+            except Exception as exp:
+                logger.warning('Could not read glyph cache %s: %s'
+                               % (self._fname, exp))
+
+    def _read(self):
+        with np.load(self._fname) as data:
+            codes = data['codes']
+            self._advance = data['advance']
+            self._offset = data['offset']
+            self._shape = data['shape']
+            self._starts = data['starts']
+            self._pixels = data['pixels']
+            kerning_pairs = data['kerning_pairs']
+            kerning = data['kerning']
+        chars = [unichr(c) for c in codes]
+        self._index = dict((c, i) for i, c in enumerate(chars))
+        self._kerning = dict(((chars[i], chars[j]), k) for (i, j), k
+                             in zip(kerning_pairs, kerning))
+
+    def save(self):
+        """Write the cache file"""
+        if self._fname is None:
+            return
+        chars = sorted(self._index, key=self._index.get)
+        index = self._index
+        pairs = [(index[a], index[b]) for a, b in self._kerning]
+        directory = op.dirname(self._fname)
+        try:
+            if not op.isdir(directory):
+                os.makedirs(directory)
+            # Write to another file first, so that a cache file is never
+            # read while it is incomplete
+            tmp_fname = self._fname[:-4] + '-%s.tmp.npz' % os.getpid()
+            codes = np.array([ord(c) for c in chars], np.uint32)
+            pairs = np.array(pairs, np.uint32).reshape(-1, 2)
+            kerning = np.array(list(self._kerning.values()), np.float32)
+            np.savez_compressed(tmp_fname, codes=codes, advance=self._advance,
+                                offset=self._offset, shape=self._shape,
+                                starts=self._starts, pixels=self._pixels,
+                                kerning_pairs=pairs, kerning=kerning)
+            if op.isfile(self._fname):
+                os.remove(self._fname)
+            os.rename(tmp_fname, self._fname)
+        except (IOError, OSError) as exp:
+            logger.warning('Could not write glyph cache %s: %s'
+                           % (self._fname, exp))
+            self._fname = None  # do not try again
+
+    def __contains__(self, char):
+        return char in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, char):
+        """Get a glyph from the cache
+
+        Parameters
+        ----------
+        char : str
+            A single character.
+
+        Returns
+        -------
+        glyph : dict
+            Entries "offset" and "advance" (at the high-res font size),
+            and "sdf", the float32 SDF at the size of the atlas.
+        """
+        i = self._index[char]
+        sdf = self._pixels[self._starts[i]:self._starts[i + 1]]
+        sdf = sdf.reshape(self._shape[i]) / np.float32(255.)
+        return dict(offset=tuple(self._offset[i]),
+                    advance=float(self._advance[i]), sdf=sdf)
+
+    def get_kerning(self, prev, char):
+        """Get the kerning of a char after another (both in the cache)"""
+        return self._kerning.get((prev, char), 0.)
+
+    def add(self, chars, save=True):
+        """Compute the glyphs of some chars and add them to the cache
+
+        Parameters
+        ----------
+        chars : str
+            The characters. Those that are in the cache already are
+            skipped.
+        save : bool
+            Whether to write the cache file if glyphs were added.
+        """
+        # Kerning is computed by _load_glyph with all glyphs in the dict,
+        # so start with the glyphs in the cache (without bitmap). The
+        # metrics are needed too, e.g. the advance on OSX.
+        glyphs = dict((c, dict(char=c, offset=tuple(self._offset[i]),
+                               advance=float(self._advance[i]), kerning={}))
+                      for c, i in self._index.items())
+        added = []
+        for char in chars:
+            if char in glyphs:
+                continue
+            _load_glyph(self._font, char, glyphs)
+            glyph = glyphs[char]
+            bitmap = glyph['bitmap']
+            data = np.zeros((bitmap.shape[0] + 2*self._spread,
+                             bitmap.shape[1] + 2*self._spread), np.uint8)
+            data[self._spread:-self._spread,
+                 self._spread:-self._spread] = bitmap
+            sdf = _calc_distance_field(data, data.shape[1] // self._ratio,
+                                       data.shape[0] // self._ratio)
+            self._index[char] = len(self._index)
+            self._advance = np.append(self._advance, glyph['advance'])
+            self._offset = np.append(self._offset, [glyph['offset']], axis=0)
+            self._shape = np.append(self._shape, [sdf.shape], axis=0)
+            self._starts = np.append(self._starts,
+                                     self._starts[-1] + sdf.size)
+            added.append(np.round(sdf.ravel() * 255).astype(np.uint8))
+            del glyph['bitmap']
+        if not added:
+            return
+        self._pixels = np.concatenate([self._pixels] + added)
+        for char, glyph in glyphs.items():
+            for prev, kerning in glyph['kerning'].items():
+                if kerning != 0:
+                    self._kerning[(prev, char)] = kerning
+        if save:
+            self.save()
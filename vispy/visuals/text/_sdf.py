@@ -229,6 +229,69 @@ void main( void )
 """
 
 
+def _distance_to_seeds(seeds, rows, cols):
+    """Exact Euclidean distance from some pixels to the nearest seed pixel
+
+    Parameters
+    ----------
+    seeds : array
+        2D boolean array, True for the seed pixels.
+    rows : array
+        The rows of the pixels to compute the distance for.
+    cols : array
+        The columns of the pixels to compute the distance for.
+
+    Returns
+    -------
+    distance : array
+        The (len(rows), len(cols)) distances, in pixels.
+    """
+    # Distance along the columns, then the minimum over each row of
+    # sqrt(column_distance ** 2 + row_distance ** 2)
+    far = seeds.shape[0] + seeds.shape[1]
+    index = np.arange(seeds.shape[0])[:, np.newaxis]
+    above = np.maximum.accumulate(np.where(seeds, index, -far), axis=0)
+    below = np.where(seeds, index, 2 * far)[::-1]
+    below = np.minimum.accumulate(below, axis=0)[::-1]
+    dist_y = np.minimum(index - above, below - index)[rows].astype(np.float64)
+    dist_x = cols[:, np.newaxis] - np.arange(seeds.shape[1])
+    dist2 = dist_y[:, np.newaxis, :] ** 2 + dist_x[np.newaxis] ** 2
+    return np.sqrt(dist2.min(axis=-1))
+
+
+def _calc_distance_field(data, width, height):
+    """Compute a SDF on the CPU, like SDFRenderer does on the GPU
+
+    Parameters
+    ----------
+    data : array
+        Must be 2D with type np.ubyte.
+    width : int
+        Width of the SDF.
+    height : int
+        Height of the SDF.
+
+    Returns
+    -------
+    sdf : array
+        The (height, width) float32 SDF, with values in [0, 1].
+    """
+    # The pixels of the data that are nearest to the center of the pixels
+    # of the SDF, like nearest interpolation does
+    rows = ((np.arange(height) + 0.5) * data.shape[0] // height).astype(int)
+    cols = ((np.arange(width) + 0.5) * data.shape[1] // width).astype(int)
+    inside = data >= 128
+    pos_dist = _distance_to_seeds(inside, rows, cols)
+    neg_dist = _distance_to_seeds(~inside, rows, cols)
+    # Same scaling as frag_insert: 1 px distance is 8. / 256 in the SDF
+    shrink = 8.
+    rescale = 256. / shrink
+    sdf = np.where(inside[rows][:, cols],
+                   0.5 - (shrink - 1.) / 256. + neg_dist / rescale,
+                   0.5 - pos_dist / rescale)
+    return np.clip(sdf, 0., 1.).astype(np.float32)
+
+
 class SDFRenderer(object):
     def __init__(self):
         self.program_seed = Program(vert_seed, frag_seed)
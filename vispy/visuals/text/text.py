@@ -16,15 +16,16 @@ from os import path as op
 import sys
 
 from ._sdf import SDFRenderer
+from ._cache import GlyphCache
 from ...gloo import (TextureAtlas, set_state, IndexBuffer, VertexBuffer,
                      set_viewport)
 from ...gloo import gl
 from ...gloo.wrappers import _check_valid
-from ...ext.six import string_types
+from ...ext.six import string_types, unichr
 from ...util.fonts import _load_glyph
 from ..transforms import STTransform
 from ..shaders import ModularProgram
-from ...color import Color
+from ...color import Color, ColorArray
 from ..visual import Visual
 from ...io import _data_dir
 
@@ -36,24 +37,49 @@ class TextureFont(object):
     ----------
     font : dict
         Dict with entries "face", "size", "bold", "italic".
-    renderer : instance of SDFRenderer
-        SDF renderer to use.
+    renderer : instance of SDFRenderer | None
+        SDF renderer to use. Not used if there is a cache.
+    cache : instance of GlyphCache | None
+        Cache to load the glyphs from. Glyphs that are not in the cache
+        are added to it.
     """
-    def __init__(self, font, renderer):
+    _highres_size = 256  # use high resolution point size for SDF
+    _lowres_size = 64  # end at this point size for storage
+    # spread/border at the high-res for SDF calculation; must be chosen
+    # relative to fragment_insert.glsl multiplication factor to ensure we
+    # get to zero at the edges of characters
+    _spread = 32
+
+    def __init__(self, font, renderer, cache=None):
         self._atlas = TextureAtlas()
         self._atlas.wrapping = 'clamp_to_edge'
         self._kernel = np.load(op.join(_data_dir, 'spatial-filters.npy'))
         self._renderer = renderer
+        self._cache = cache
         self._font = deepcopy(font)
-        self._font['size'] = 256  # use high resolution point size for SDF
-        self._lowres_size = 64  # end at this point size for storage
+        self._font['size'] = self._highres_size
         assert (self._font['size'] % self._lowres_size) == 0
-        # spread/border at the high-res for SDF calculation; must be chosen
-        # relative to fragment_insert.glsl multiplication factor to ensure we
-        # get to zero at the edges of characters
-        self._spread = 32
         assert self._spread % self.ratio == 0
         self._glyphs = {}
+        # Metrics of the glyphs (a row per glyph, in order of loading),
+        # to lay out many characters at once
+        self._glyph_ids = {}
+        self._advance = np.zeros(0, np.float32)
+        self._offset = np.zeros((0, 2), np.float32)
+        self._size = np.zeros((0, 2), np.float32)
+        self._texcoords = np.zeros((0, 4), np.float32)  # in texels
+        # Nonzero kerning by (previous id << 32) + id, sorted
+        self._kerning_keys = np.zeros(0, np.int64)
+        self._kerning_values = np.zeros(0, np.float32)
+        # The atlas regions of the glyphs that are in the atlas, and when
+        # each glyph was last used. When the atlas is full, it grows, and
+        # when it cannot grow, the least recently used glyphs are evicted.
+        self._regions = {}
+        self._last_use = np.zeros(0, np.int64)
+        self._clock = 0
+        self._generation = 0  # increased when glyphs are evicted
+        self.n_grows = 0
+        self.n_evictions = 0
 
     @property
     def ratio(self):
@@ -70,119 +96,367 @@ class TextureFont(object):
             raise TypeError('index must be a 1-character string')
         if char not in self._glyphs:
             self._load_char(char)
+        elif char not in self._regions:
+            self._store(char)
         return self._glyphs[char]
 
-    def _load_char(self, char):
+    def _load_char(self, char, keep=()):
         """Build and store a glyph corresponding to an individual character
 
         Parameters:
         -----------
         char : str
             A single character to be represented.
+        keep : set
+            Characters that must not be evicted to make room.
         """
         assert isinstance(char, string_types) and len(char) == 1
         assert char not in self._glyphs
-        # load new glyph data from font
-        _load_glyph(self._font, char, self._glyphs)
-        # put new glyph into the texture
-        glyph = self._glyphs[char]
-        bitmap = glyph['bitmap']
-
-        # convert to padded array
+        if self._cache is None:
+            # load new glyph data from font
+            _load_glyph(self._font, char, self._glyphs)
+            glyph = self._glyphs[char]
+            # Store, while scaling down to proper size
+            height, width = [size // self.ratio for size in
+                             self._padded_bitmap(char).shape]
+        else:
+            # load the SDF and metrics from the cache
+            if char not in self._cache:
+                self._cache.add(char)
+            glyph = self._cache.get(char)
+            glyph.update(char=char, kerning={})
+            # including the kerning of the character with itself
+            self._glyphs[char] = glyph
+            for other, other_glyph in self._glyphs.items():
+                glyph['kerning'][other] = self._cache.get_kerning(other, char)
+                other_glyph['kerning'][char] = \
+                    self._cache.get_kerning(char, other)
+            height, width = glyph.pop('sdf').shape
+        glyph['size'] = (width, height)
+        self._store(char, keep)
+        self._add_metrics(char)
+
+    def _padded_bitmap(self, char):
+        """The high-res bitmap of a glyph, padded for the SDF"""
+        bitmap = self._glyphs[char]['bitmap']
         data = np.zeros((bitmap.shape[0] + 2*self._spread,
                          bitmap.shape[1] + 2*self._spread), np.uint8)
         data[self._spread:-self._spread, self._spread:-self._spread] = bitmap
+        return data
 
-        # Store, while scaling down to proper size
-        height = data.shape[0] // self.ratio
-        width = data.shape[1] // self.ratio
+    def _store(self, char, keep=()):
+        """Put a glyph into the atlas, growing the atlas or evicting the
+        least recently used glyphs if it is full"""
+        width, height = self._glyphs[char]['size']
         region = self._atlas.get_free_region(width + 2, height + 2)
-        if region is None:
-            raise RuntimeError('Cannot store glyph')
-        x, y, w, h = region
+        while region is None:
+            if self._atlas.grow():
+                self.n_grows += 1
+                for other in self._regions:
+                    self._upload(other)
+            elif not self._evict(keep):
+                raise RuntimeError('Cannot store glyph')
+            region = self._atlas.get_free_region(width + 2, height + 2)
+        self._regions[char] = region
+        self._upload(char)
+
+    def _upload(self, char):
+        """Put the SDF of a glyph into its region of the atlas"""
+        x, y, w, h = self._regions[char]
+        # the border of the region is zero, for linear interpolation
+        data = np.zeros((h, w, 3), np.float32)
+        if self._cache is not None:
+            data[1:-1, 1:-1] = self._cache.get(char)['sdf'][:, :, np.newaxis]
+        self._atlas.set_data(data, offset=(y, x))
         x, y, w, h = x + 1, y + 1, w - 2, h - 2
-
-        self._renderer.render_to_texture(data, self._atlas, (x, y), (w, h))
+        if self._cache is None:
+            self._renderer.render_to_texture(self._padded_bitmap(char),
+                                             self._atlas, (x, y), (w, h))
+        # the normalized texcoords change when the atlas grows
         u0 = x / float(self._atlas.shape[1])
         v0 = y / float(self._atlas.shape[0])
         u1 = (x+w) / float(self._atlas.shape[1])
         v1 = (y+h) / float(self._atlas.shape[0])
-        texcoords = (u0, v0, u1, v1)
-        glyph.update(dict(size=(w, h), texcoords=texcoords))
+        self._glyphs[char]['texcoords'] = (u0, v0, u1, v1)
+        if char in self._glyph_ids:
+            self._texcoords[self._glyph_ids[char]] = (x, y, x + w, y + h)
+
+    def _evict(self, keep):
+        """Remove the least recently used glyph from the atlas
+
+        Returns
+        -------
+        evicted : bool
+            False if there is no glyph to evict.
+        """
+        chars = [char for char in self._regions
+                 if char not in keep and char in self._glyph_ids]
+        if not chars:
+            return False
+        char = min(chars, key=lambda c: self._last_use[self._glyph_ids[c]])
+        self._atlas.free_region(self._regions.pop(char))
+        self.n_evictions += 1
+        self._generation += 1
+        return True
+
+    def _add_metrics(self, char):
+        """Add a row for a loaded glyph to the metrics arrays"""
+        glyph = self._glyphs[char]
+        index = len(self._glyph_ids)
+        self._glyph_ids[char] = index
+        self._advance = np.append(self._advance, glyph['advance'])
+        self._offset = np.append(self._offset, [glyph['offset']], axis=0)
+        self._size = np.append(self._size, [glyph['size']], axis=0)
+        x, y, w, h = self._regions[char]
+        self._texcoords = np.append(self._texcoords,
+                                    [(x + 1, y + 1, x + w - 1, y + h - 1)],
+                                    axis=0)
+        self._last_use = np.append(self._last_use, self._clock)
+        # kerning after (and before) the glyphs that have rows already
+        keys, values = [], []
+        for other, other_index in self._glyph_ids.items():
+            pairs = (((other_index << 32) + index,
+                      glyph['kerning'].get(other, 0.)),
+                     ((index << 32) + other_index,
+                      self._glyphs[other]['kerning'].get(char, 0.)))
+            for key, kerning in pairs[:1 if other == char else 2]:
+                if kerning != 0:
+                    keys.append(key)
+                    values.append(kerning)
+        if keys:
+            keys = np.append(self._kerning_keys, keys)
+            order = np.argsort(keys)
+            self._kerning_keys = keys[order]
+            self._kerning_values = np.append(self._kerning_values,
+                                             values)[order]
+
+    def get_glyph_ids(self, text):
+        """Get the rows of the characters of a string in the glyph metrics
+        arrays, loading the glyphs that are not loaded yet
+
+        Parameters
+        ----------
+        text : str
+            The characters.
+
+        Returns
+        -------
+        ids : ndarray
+            Index for each character.
+        """
+        codes = np.frombuffer(text.encode('utf-32-le'), np.uint32)
+        chars, inverse = np.unique(codes, return_inverse=True)
+        chars = [unichr(c) for c in chars]
+        missing = [char for char in chars if char not in self._regions]
+        if missing:
+            keep = set(chars)
+            orig_viewport = None
+            if self._cache is not None:
+                # compute the glyphs that are not cached yet in one go
+                self._cache.add(u''.join(missing))
+            else:
+                # Need to store the original viewport, because loading a
+                # glyph will trigger SDF rendering, which changes our
+                # viewport
+                orig_viewport = gl.glGetParameter(gl.GL_VIEWPORT)
+            for char in missing:
+                if char in self._glyphs:  # evicted before
+                    self._store(char, keep)
+                else:
+                    self._load_char(char, keep)
+            if orig_viewport is not None:
+                set_viewport(*orig_viewport)
+        ids = np.array([self._glyph_ids[char] for char in chars], np.intp)
+        self.mark_used(ids)
+        return ids[inverse]
+
+    def mark_used(self, ids):
+        """Mark glyphs as used, so that they are the last to be evicted
+        from the atlas
+
+        Parameters
+        ----------
+        ids : ndarray
+            Ids of the glyphs.
+        """
+        self._clock += 1
+        self._last_use[ids] = self._clock
+
+    def get_kerning(self, prev, ids):
+        """Get the kerning of glyphs that follow other glyphs
+
+        Parameters
+        ----------
+        prev : ndarray
+            Ids of the previous glyphs.
+        ids : ndarray
+            Ids of the glyphs.
+
+        Returns
+        -------
+        kerning : ndarray
+            The kerning for each pair, at the high-res font size.
+        """
+        keys = (np.asarray(prev, np.int64) << 32) + ids
+        index = np.searchsorted(self._kerning_keys, keys)
+        index = np.minimum(index, len(self._kerning_keys) - 1)
+        kerning = np.zeros(len(keys), np.float32)
+        if len(self._kerning_keys):
+            found = self._kerning_keys[index] == keys
+            kerning[found] = self._kerning_values[index[found]]
+        return kerning
 
 
 class FontManager(object):
-    """Helper to create TextureFont instances and reuse them when possible"""
-    # todo: store a font-manager on each context,
-    # or let TextureFont use a TextureAtlas for each context
-    def __init__(self):
+    """Helper to create TextureFont instances and reuse them when possible
+
+    By default, text visuals use the FontManager that is stored on the
+    shared namespace of their GL context, so that all text that is drawn
+    in a context (or in contexts that share objects) uses the same glyph
+    atlases.
+
+    Parameters
+    ----------
+    cache : bool | str
+        Whether to use the on-disk glyph cache, or the directory of the
+        cache. If True, the cache is stored in ``config['data_path']``.
+        Glyphs that are not in the cache are then computed on the CPU
+        and added to it; otherwise, they are computed on the GPU.
+    """
+    def __init__(self, cache=True):
         self._fonts = {}
-        self._renderer = SDFRenderer()
+        self._cache = cache
+        self._renderer = None if cache else SDFRenderer()
 
     def get_font(self, face, bold=False, italic=False):
         """Get a font described by face and size"""
         key = '%s-%s-%s' % (face, bold, italic)
         if key not in self._fonts:
             font = dict(face=face, bold=bold, italic=italic)
-            self._fonts[key] = TextureFont(font, self._renderer)
+            cache = None
+            if self._cache:
+                directory = None if self._cache is True else self._cache
+                cache = _get_glyph_cache(face, bold, italic, directory)
+            self._fonts[key] = TextureFont(font, self._renderer, cache)
         return self._fonts[key]
 
 
+def _get_glyph_cache(face, bold, italic, directory):
+    """Get the GlyphCache for the TextureFont of a font"""
+    font = dict(face=face, size=TextureFont._highres_size, bold=bold,
+                italic=italic)
+    return GlyphCache(font, TextureFont._spread, TextureFont._lowres_size,
+                      directory)
+
+
+def build_glyph_cache(chars, face='OpenSans', bold=False, italic=False,
+                      directory=None):
+    """Add glyphs to the on-disk glyph cache of a font
+
+    This does not need a GL context, so that the cache can be built
+    before (or apart from) the application that draws the text.
+
+    Parameters
+    ----------
+    chars : str
+        The characters to add.
+    face : str
+        Font face.
+    bold : bool
+        Bold face.
+    italic : bool
+        Italic face.
+    directory : str | None
+        The directory of the cache. None uses ``config['data_path']``.
+    """
+    cache = _get_glyph_cache(face, bold, italic, directory)
+    cache.add(chars)
+
+
 ##############################################################################
 # The visual
 
 
-def _text_to_vbo(text, font, anchor_x, anchor_y, lowres_size):
-    """Convert text characters to VBO"""
-    text_vtype = np.dtype([('a_position', 'f4', 2),
-                           ('a_texcoord', 'f4', 2)])
-    vertices = np.zeros(len(text) * 4, dtype=text_vtype)
-    prev = None
-    width = height = ascender = descender = 0
-    ratio, slop = 1. / font.ratio, font.slop
-    x_off = -slop
-    # Need to make sure we have a unicode string here (Py2.7 mis-interprets
-    # characters like "•" otherwise)
-    if sys.version[0] == '2' and isinstance(text, str):
-        text = text.decode('utf-8')
-    # Need to store the original viewport, because the font[char] will
-    # trigger SDF rendering, which changes our viewport
-    # todo: get rid of call to glGetParameter!
-    orig_viewport = gl.glGetParameter(gl.GL_VIEWPORT)
-    for ii, char in enumerate(text):
-        glyph = font[char]
-        kerning = glyph['kerning'].get(prev, 0.) * ratio
-        x0 = x_off + glyph['offset'][0] * ratio + kerning
-        y0 = glyph['offset'][1] * ratio + slop
-        x1 = x0 + glyph['size'][0]
-        y1 = y0 - glyph['size'][1]
-        u0, v0, u1, v1 = glyph['texcoords']
-        position = [[x0, y0], [x0, y1], [x1, y1], [x1, y0]]
-        texcoords = [[u0, v0], [u0, v1], [u1, v1], [u1, v0]]
-        vi = ii * 4
-        vertices['a_position'][vi:vi+4] = position
-        vertices['a_texcoord'][vi:vi+4] = texcoords
-        x_move = glyph['advance'] * ratio + kerning
-        x_off += x_move
-        ascender = max(ascender, y0 - slop)
-        descender = min(descender, y1 + slop)
-        width += x_move
-        height = max(height, glyph['size'][1] - 2*slop)
-        prev = char
+def _get_font_manager(context):
+    """Get the FontManager stored on the shared namespace of a context"""
+    shared = context.shared
+    if getattr(shared, 'font_manager', None) is None:
+        shared.font_manager = FontManager()
+    return shared.font_manager
+
+
+def _layout(texts, font, anchor_x, anchor_y, lowres_size):
+    """Lay out the characters of several strings at once
+
+    Parameters
+    ----------
+    texts : list of str
+        The strings.
+    font : instance of TextureFont
+        The font to use.
+    anchor_x : str
+        Horizontal anchor of each string.
+    anchor_y : str
+        Vertical anchor of each string.
+    lowres_size : int
+        The point size of the glyphs in the atlas.
+
+    Returns
+    -------
+    position : ndarray
+        The (4 * n_chars, 2) corners of the glyph quads, in units of the
+        font size, relative to the anchor of their string.
+    texcoord : ndarray
+        The (4 * n_chars, 2) corners of the glyphs in the atlas, in texels.
+    counts : ndarray
+        The number of characters of each string.
+    ids : ndarray
+        The glyph id of each character.
+    """
+    counts = np.array([len(text) for text in texts], np.intp)
     # Also analyse chars with large ascender and descender, otherwise the
     # vertical alignment can be very inconsistent
-    for char in 'hy':
-        glyph = font[char]
-        y0 = glyph['offset'][1] * ratio + slop
-        y1 = y0 - glyph['size'][1]
-        ascender = max(ascender, y0 - slop)
-        descender = min(descender, y1 + slop)
-        height = max(height, glyph['size'][1] - 2*slop)
-    set_viewport(*orig_viewport)
+    ids = font.get_glyph_ids(u''.join(texts) + u'hy')
+    ids, hy = ids[:-2], ids[-2:]
+    starts = np.cumsum(counts) - counts
+    nonempty = counts > 0
+    labels = np.repeat(np.arange(len(texts)), counts)
+    ratio, slop = 1. / font.ratio, font.slop
 
+    # Horizontal positions: the first char of each string has no kerning
+    prev = np.zeros_like(ids)
+    prev[1:] = ids[:-1]
+    kerning = font.get_kerning(prev, ids).astype(np.float64) * ratio
+    kerning[starts[nonempty]] = 0
+    x_move = font._advance[ids] * ratio + kerning
+    x_off = np.cumsum(x_move) - x_move
+    x_off -= x_off[starts[labels]] + slop
+    offset, size = font._offset[ids], font._size[ids]
+    x0 = x_off + offset[:, 0] * ratio + kerning
+    y0 = offset[:, 1] * ratio + slop
+    x1 = x0 + size[:, 0]
+    y1 = y0 - size[:, 1]
+
+    # Extents of each string
+    y0_hy = font._offset[hy, 1] * ratio + slop
+    y1_hy = y0_hy - font._size[hy, 1]
+    ascender = np.zeros(len(texts))
+    descender = np.zeros(len(texts))
+    height = np.zeros(len(texts))
+    width = np.zeros(len(texts))
+    if nonempty.any():
+        first = starts[nonempty]
+        ascender[nonempty] = np.maximum.reduceat(y0 - slop, first)
+        descender[nonempty] = np.minimum.reduceat(y1 + slop, first)
+        height[nonempty] = np.maximum.reduceat(size[:, 1] - 2*slop, first)
+        width[nonempty] = np.add.reduceat(x_move, first)
+    ascender = np.maximum(ascender, (y0_hy - slop).max())
+    descender = np.minimum(descender, (y1_hy + slop).min())
+    height = np.maximum(height, (font._size[hy, 1] - 2*slop).max())
     # Tight bounding box (loose would be width, font.height /.asc / .desc)
-    width -= glyph['advance'] * ratio - (glyph['size'][0] - 2*slop)
-    dx = dy = 0
+    width -= font._advance[hy[1]] * ratio - (font._size[hy[1], 0] - 2*slop)
+    dx = np.zeros(len(texts))
+    dy = np.zeros(len(texts))
     if anchor_y == 'top':
         dy = -ascender
     elif anchor_y in ('center', 'middle'):
@@ -196,54 +470,79 @@ def _text_to_vbo(text, font, anchor_x, anchor_y, lowres_size):
         dx = -width
     elif anchor_x == 'center':
         dx = -width / 2.
-    vertices['a_position'] += (dx, dy)
-    vertices['a_position'] /= lowres_size
-    return VertexBuffer(vertices)
+    x0, x1 = x0 + dx[labels], x1 + dx[labels]
+    y0, y1 = y0 + dy[labels], y1 + dy[labels]
+
+    position = np.empty((len(ids), 4, 2), np.float32)
+    position[:, :, 0] = np.array([x0, x0, x1, x1]).T
+    position[:, :, 1] = np.array([y0, y1, y1, y0]).T
+    position /= lowres_size
+    u0, v0, u1, v1 = font._texcoords[ids].T
+    texcoord = np.empty((len(ids), 4, 2), np.float32)
+    texcoord[:, :, 0] = np.array([u0, u0, u1, u1]).T
+    texcoord[:, :, 1] = np.array([v0, v1, v1, v0]).T
+    return position.reshape(-1, 2), texcoord.reshape(-1, 2), counts, ids
 
 
 class TextVisual(Visual):
     """Visual that displays text
 
+    Several strings (labels) can be given at once; they are laid out
+    together and drawn in a single call, with a position, font size and
+    color for each of them.
+
     Parameters
     ----------
-    text : str
-        Text to display.
-    color : instance of Color
-        Color to use.
+    text : str | list of str
+        Text to display, or a list of texts.
+    color : instance of Color | instance of ColorArray
+        Color to use, or a color for each text.
     bold : bool
         Bold face.
     italic : bool
         Italic face.
     face : str
         Font face to use.
-    font_size : float
-        Point size to use.
-    pos : tuple
-        Position (x, y) of the text.
+    font_size : float | ndarray
+        Point size to use, or a point size for each text.
+    pos : tuple | ndarray
+        Position (x, y) or (x, y, z) of the text, or an (N, 2) or (N, 3)
+        array with the position of each text.
     rotation : float
         Rotation (in degrees) of the text clockwise.
     anchor_x : str
         Horizontal text anchor.
     anchor_y : str
         Vertical text anchor.
+    font_manager : instance of FontManager | None
+        The manager of the glyph atlases. If None, the FontManager that
+        is shared by all text in the GL context is used.
     """
 
     VERTEX_SHADER = """
-        uniform vec2 u_pos;  // anchor position
         uniform float u_rotation;  // rotation in rad
-        attribute vec2 a_position; // in point units
-        attribute vec2 a_texcoord;
+        uniform float u_dpi;
+        uniform vec2 u_font_atlas_shape;
+        attribute vec2 a_position; // in units of the font size
+        attribute vec2 a_texcoord;  // in texels
+        attribute vec3 a_pos;  // anchor position
+        attribute float a_font_size;  // in points
+        attribute vec4 a_color;
         varying vec2 v_texcoord;
+        varying vec4 v_color;
+        varying float v_npix;
 
         void main(void) {
             // Eventually "rot" should be handled by SRTTransform or so...
             mat4 rot = mat4(cos(u_rotation), -sin(u_rotation), 0, 0,
                             sin(u_rotation), cos(u_rotation), 0, 0,
                             0, 0, 1, 0, 0, 0, 0, 1);
-            vec4 pos = $transform(vec4(u_pos, 0.0, 1.0)) +
-                       $text_scale(rot * vec4(a_position, 0, 0));
+            vec4 pos = $transform(vec4(a_pos, 1.0)) +
+                       $text_scale(rot * vec4(a_position * a_font_size, 0, 0));
             gl_Position = pos;
-            v_texcoord = a_texcoord;
+            v_texcoord = a_texcoord / u_font_atlas_shape;
+            v_color = a_color;
+            v_npix = a_font_size * u_dpi / 72.0;  // logical pix
         }
         """
 
@@ -255,11 +554,11 @@ class TextVisual(Visual):
 
         uniform sampler2D u_font_atlas;
         uniform vec2 u_font_atlas_shape;
-        uniform vec4 u_color;
-        uniform float u_npix;
         uniform sampler2D u_kernel;
 
         varying vec2 v_texcoord;
+        varying vec4 v_color;
+        varying float v_npix;
         const float center = 0.5;
 
         // CatRom interpolation code
@@ -326,12 +625,12 @@ class TextVisual(Visual):
         }
 
         void main(void) {
-            vec4 color = u_color;
+            vec4 color = v_color;
             vec2 uv = v_texcoord.xy;
             vec4 rgb;
 
             // Use interpolation at high font sizes
-            if(u_npix >= 50.0)
+            if(v_npix >= 50.0)
                 rgb = CatRom(u_font_atlas, u_font_atlas_shape, uv);
             else
                 rgb = texture2D(u_font_atlas, uv);
@@ -343,7 +642,7 @@ class TextVisual(Visual):
             // Regular SDF
             float alpha = contour(distance, width);
 
-            if (u_npix < 30.) {
+            if (v_npix < 30.) {
                 // Supersample, 4 extra points
                 // Half of 1/sqrt2; you can play with this
                 float dscale = 0.5 * M_SQRT1_2;
@@ -362,6 +661,16 @@ class TextVisual(Visual):
         }
         """
 
+    _vtype = np.dtype([('a_position', np.float32, 2),
+                       ('a_texcoord', np.float32, 2),
+                       ('a_pos', np.float32, 3),
+                       ('a_font_size', np.float32),
+                       ('a_color', np.float32, 4)])
+
+    # Runs of changed texts that are at most this many glyphs apart are
+    # uploaded with one command, together with the texts in between
+    _upload_gap = 64
+
     def __init__(self, text, color='black', bold=False,
                  italic=False, face='OpenSans', font_size=12, pos=(0, 0),
                  rotation=0., anchor_x='center', anchor_y='center',
@@ -372,17 +681,33 @@ class TextVisual(Visual):
         _check_valid('anchor_y', anchor_y, valid_keys)
         valid_keys = ('left', 'center', 'right')
         _check_valid('anchor_x', anchor_x, valid_keys)
-        # Init font handling stuff
-        # _font_manager is a temporary solution to use global mananger
-        self._font_manager = font_manager or FontManager()
-        self._font = self._font_manager.get_font(face, bold, italic)
+        # Init font handling stuff; the font is looked up on the first
+        # draw, to use the font manager of the context if none is given
+        self._font_manager = font_manager
+        self._font_key = (face, bold, italic)
+        self._font = None
         self._program = ModularProgram(self.VERTEX_SHADER,
                                        self.FRAGMENT_SHADER)
+        # CPU copy of the vertices, with the first glyph of each text
+        # and the text of each vertex
+        self._vertex_data = None
+        self._glyph_starts = None
+        self._vertex_texts = None
         self._vertices = None
+        self._changed_texts = set()  # need uploading (and relayout)
+        self._relayout_texts = set()
+        # The (N, 3) positions, (N,) font sizes and (N, 4) colors of the
+        # texts, made from the properties when needed
+        self._values = None
+        self._color = None
+        # The glyphs that are used, and the generation of the font's atlas
+        # for which they were laid out (glyphs may be evicted since)
+        self._used_ids = None
+        self._font_generation = None
         self._anchors = (anchor_x, anchor_y)
         # Init text properties
-        self.color = color
         self.text = text
+        self.color = color
         self.font_size = font_size
         self.pos = pos
         self.rotation = rotation
@@ -390,34 +715,60 @@ class TextVisual(Visual):
 
     @property
     def text(self):
-        """The text string"""
-        return self._text
+        """The text string, or the list of text strings"""
+        if self._single:
+            return self._texts[0]
+        return list(self._texts)
 
     @text.setter
     def text(self, text):
+        self._single = isinstance(text, string_types)
+        texts = [text] if self._single else list(text)
+        if self._values is not None and len(texts) != len(self._texts):
+            self._reset_values()
+        self._texts = [self._check_text(t) for t in texts]
+        self._vertex_data = None
+
+    @staticmethod
+    def _check_text(text):
         assert isinstance(text, string_types)
-        self._text = text
-        self._vertices = None
+        # Need to make sure we have a unicode string here (Py2.7
+        # mis-interprets characters like "•" otherwise)
+        if sys.version[0] == '2' and isinstance(text, str):
+            text = text.decode('utf-8')
+        return text
 
     @property
     def font_size(self):
-        """ The font size (in points) of the text
+        """ The font size (in points) of the text, or of each text
         """
         return self._font_size
 
     @font_size.setter
     def font_size(self, size):
-        self._font_size = max(0.0, float(size))
+        if np.ndim(size) == 0:
+            self._font_size = max(0.0, float(size))
+        else:
+            self._font_size = np.maximum(np.array(size, np.float32), 0.)
+        self._reset_values()
+        self._changed_texts.update(range(len(self._texts)))
 
     @property
     def color(self):
-        """ The color of the text
+        """ The color of the text, or of each text
         """
+        if self._color is None:
+            self._color = ColorArray(self._values['color'])
         return self._color
 
     @color.setter
     def color(self, color):
-        self._color = Color(color)
+        try:
+            self._color = Color(color)
+        except ValueError:
+            self._color = ColorArray(color)
+        self._values = None
+        self._changed_texts.update(range(len(self._texts)))
 
     @property
     def rotation(self):
@@ -431,48 +782,204 @@ class TextVisual(Visual):
 
     @property
     def pos(self):
-        """ The position of the text anchor in the local coordinate frame
+        """ The position of the text anchor in the local coordinate frame,
+        or an array with the position of each text
         """
         return self._pos
 
     @pos.setter
     def pos(self, pos):
-        pos = [float(p) for p in pos]
-        assert len(pos) == 2
-        self._pos = tuple(pos)
+        if np.ndim(pos) == 1:
+            pos = tuple(float(p) for p in pos)
+            assert len(pos) in (2, 3)
+        else:
+            pos = np.array(pos, np.float32)
+            if pos.ndim != 2 or pos.shape[1] not in (2, 3):
+                raise ValueError('pos must be an (N, 2) or (N, 3) array')
+        self._pos = pos
+        self._reset_values()
+        self._changed_texts.update(range(len(self._texts)))
+
+    def set_labels(self, index, text=None, pos=None, font_size=None,
+                   color=None):
+        """Change some of the texts
+
+        Only the vertices of these texts are uploaded on the next draw,
+        unless a new text has another number of characters.
+
+        Parameters
+        ----------
+        index : int | list of int
+            The index of the texts to change.
+        text : str | list of str | None
+            The new text(s).
+        pos : tuple | ndarray | None
+            The new position(s).
+        font_size : float | ndarray | None
+            The new point size(s).
+        color : instance of Color | instance of ColorArray | None
+            The new color(s).
+        """
+        index = np.atleast_1d(np.asarray(index, np.intp)) % len(self._texts)
+        if text is not None:
+            if isinstance(text, string_types):
+                text = [text] * len(index)
+            for i, t in zip(index, text):
+                t = self._check_text(t)
+                if len(t) != len(self._texts[i]):
+                    self._vertex_data = None  # the glyphs do not fit
+                self._texts[i] = t
+            self._relayout_texts.update(index)
+        values = self._text_values()
+        if pos is not None:
+            pos = np.atleast_2d(pos)
+            values['pos'][index, :pos.shape[1]] = pos
+            values['pos'][index, pos.shape[1]:] = 0.
+        if font_size is not None:
+            values['font_size'][index] = font_size
+        if color is not None:
+            values['color'][index] = ColorArray(color).rgba
+            self._color = None
+        self._pos = values['pos']
+        self._font_size = values['font_size']
+        self._changed_texts.update(index)
+
+    def _text_values(self):
+        """Get the (N, 3) positions, (N,) font sizes and (N, 4) colors of
+        the texts, which set_labels changes in place"""
+        if self._values is None:
+            self._values = self._make_text_values()
+        return self._values
+
+    def _reset_values(self):
+        # Make the values again from the properties on the next use
+        if self._color is None:
+            self._color = ColorArray(self._values['color'])
+        self._values = None
+
+    def _make_text_values(self):
+        n = len(self._texts)
+        values = dict(pos=np.zeros((n, 3), np.float32),
+                      font_size=np.zeros(n, np.float32),
+                      color=np.zeros((n, 4), np.float32))
+        for name, value in (('pos', np.atleast_2d(self._pos)),
+                            ('font_size', self._font_size),
+                            ('color', np.atleast_2d(self._color.rgba))):
+            if np.ndim(value) > 0 and len(value) not in (1, n):
+                raise ValueError('%s must have one value or one for each of '
+                                 'the %d texts, not %d' % (name, n,
+                                                           len(value)))
+            if name == 'pos':
+                values[name][:, :value.shape[1]] = value
+            else:
+                values[name][...] = value
+        return values
+
+    def _get_font(self, transforms):
+        if self._font is None:
+            manager = self._font_manager
+            if manager is None:
+                manager = _get_font_manager(transforms.canvas.context)
+            self._font = manager.get_font(*self._font_key)
+        return self._font
+
+    def _build_vertices(self, font):
+        """Lay out all texts and upload all vertices"""
+        position, texcoord, counts, ids = _layout(self._texts, font,
+                                                  self._anchors[0],
+                                                  self._anchors[1],
+                                                  font._lowres_size)
+        self._used_ids = np.unique(ids)
+        self._font_generation = font._generation
+        self._glyph_starts = np.concatenate([[0], np.cumsum(counts)])
+        self._vertex_texts = np.repeat(np.arange(len(self._texts)),
+                                       4 * counts)
+        self._vertex_data = np.zeros(len(position), self._vtype)
+        self._vertex_data['a_position'] = position
+        self._vertex_data['a_texcoord'] = texcoord
+        self._set_text_values(slice(None))
+        self._vertices = VertexBuffer(self._vertex_data)
+        idx = (np.array([0, 1, 2, 0, 2, 3], np.uint32) +
+               np.arange(0, len(position), 4,
+                         dtype=np.uint32)[:, np.newaxis])
+        self._ib = IndexBuffer(idx.ravel())
+        self._program.bind(self._vertices)
+        self._changed_texts = set()
+        self._relayout_texts = set()
+
+    def _set_text_values(self, vertices):
+        """Copy the values of the texts to some of the vertices"""
+        values = self._text_values()
+        texts = self._vertex_texts[vertices]
+        for name in ('pos', 'font_size', 'color'):
+            self._vertex_data['a_' + name][vertices] = values[name][texts]
+
+    def _update_vertices(self, font):
+        """Upload the vertices of the texts that have changed"""
+        texts = sorted(self._changed_texts)
+        starts = self._glyph_starts
+        relayout = sorted(self._relayout_texts)
+        if relayout:
+            position, texcoord, counts, ids = _layout(
+                [self._texts[i] for i in relayout], font, self._anchors[0],
+                self._anchors[1], font._lowres_size)
+            self._used_ids = np.union1d(self._used_ids, ids)
+            vertices = np.concatenate([np.arange(4 * starts[i],
+                                                 4 * starts[i + 1])
+                                       for i in relayout])
+            self._vertex_data['a_position'][vertices] = position
+            self._vertex_data['a_texcoord'][vertices] = texcoord
+        if len(texts) == len(self._texts):
+            self._set_text_values(slice(None))
+            self._vertices.set_data(self._vertex_data)
+        else:
+            # Upload runs of texts that are close together with one
+            # command each
+            texts = np.array(texts, np.intp)
+            gaps = starts[texts[1:]] - starts[texts[:-1] + 1]
+            splits = np.where(gaps > self._upload_gap)[0] + 1
+            for run in np.split(texts, splits):
+                start, stop = 4 * starts[run[0]], 4 * starts[run[-1] + 1]
+                if stop > start:
+                    self._set_text_values(slice(start, stop))
+                    self._vertices.set_subdata(
+                        self._vertex_data[start:stop], offset=start)
+        self._changed_texts = set()
+        self._relayout_texts = set()
 
     def draw(self, transforms):
         # attributes / uniforms are not available until program is built
-        if len(self.text) == 0:
+        if sum(len(text) for text in self._texts) == 0:
             return
-        if self._vertices is None:
+        font = self._get_font(transforms)
+        if self._used_ids is not None:
+            font.mark_used(self._used_ids)
+        if self._font_generation != font._generation:
+            self._vertex_data = None  # glyphs may have been evicted
+        if self._vertex_data is None or self._changed_texts:
             # we delay creating vertices because it requires a context,
             # which may or may not exist when the object is initialized
             transforms.canvas.context.flush_commands()  # flush GLIR commands
-            self._vertices = _text_to_vbo(self._text, self._font,
-                                          self._anchors[0], self._anchors[1],
-                                          self._font._lowres_size)
-            idx = (np.array([0, 1, 2, 0, 2, 3], np.uint32) +
-                   np.arange(0, 4*len(self._text), 4,
-                             dtype=np.uint32)[:, np.newaxis])
-            self._ib = IndexBuffer(idx.ravel())
-            self._program.bind(self._vertices)
+            if self._vertex_data is not None:
+                self._update_vertices(font)
+            if self._font_generation != font._generation:
+                self._vertex_data = None
+            if self._vertex_data is None:
+                self._build_vertices(font)
 
         # todo: do some testing to verify that the scaling is correct
-        n_pix = (self._font_size / 72.) * transforms.dpi  # logical pix
+        n_pix = transforms.dpi / 72.  # logical pix per point
         tr = (transforms.document_to_framebuffer *
               transforms.framebuffer_to_render)
         px_scale = (tr.map((1, 0)) - tr.map((0, 1)))[:2]
         self._program.vert['transform'] = transforms.get_full_transform()
         self._text_scale.scale = px_scale * n_pix
         self._program.vert['text_scale'] = self._text_scale
-        self._program['u_npix'] = n_pix
-        self._program['u_kernel'] = self._font._kernel
+        self._program['u_dpi'] = transforms.dpi
+        self._program['u_kernel'] = font._kernel
         self._program['u_rotation'] = self._rotation
-        self._program['u_pos'] = self._pos
-        self._program['u_color'] = self._color.rgba
-        self._program['u_font_atlas'] = self._font._atlas
-        self._program['u_font_atlas_shape'] = self._font._atlas.shape[:2]
+        self._program['u_font_atlas'] = font._atlas
+        self._program['u_font_atlas_shape'] = font._atlas.shape[1::-1]
         set_state(blend=True, depth_test=False,
                   blend_func=('src_alpha', 'one_minus_src_alpha'))
         self._program.draw('triangles', self._ib)
@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Image visual for images that are too large for a single texture, drawn
+from a pyramid of tiles.
+"""
+
+from __future__ import division
+
+import threading
+import weakref
+
+import numpy as np
+
+from ..gloo import set_state, Texture2D
+from ..color import get_colormap
+from ..ext.ordereddict import OrderedDict
+from ..ext.six import string_types
+from .shaders import ModularProgram, Function, FunctionChain
+from .visual import Visual
+from .image import (_null_color_transform, _c2l, _apply_clim,
+                    _luminance_formats)
+
+
+VERT_SHADER = """
+attribute vec2 a_position;
+uniform vec4 u_rect;
+varying vec2 v_texcoord;
+
+void main() {
+    v_texcoord = a_position;
+    vec2 pos = u_rect.xy + a_position * u_rect.zw;
+    gl_Position = $transform(vec4(pos, 0., 1.));
+}
+"""
+
+FRAG_SHADER = """
+uniform sampler2D u_texture;
+varying vec2 v_texcoord;
+
+void main()
+{
+    gl_FragColor = $color_transform(texture2D(u_texture, v_texcoord));
+}
+"""
+
+
+class ImagePyramid(object):
+    """ A pyramid of downsampled versions of an image, split into square
+    tiles.
+
+    Level 0 is the image itself; each next level is half the size of the
+    previous one, up to a level that fits in a single tile. The tiles of
+    the levels above 0 are computed when they are first needed, as the
+    mean of 2x2 pixels of the level below, and the most recently used
+    ones are kept in memory. Only the parts of the image that are needed
+    for a tile are read, so the image can be a ``np.memmap``.
+
+    Parameters
+    ----------
+    data : ndarray
+        The image, of shape (M, N) or (M, N, C).
+    tile_size : int
+        The size of the (square) tiles in pixels.
+    cache_size : int
+        The number of computed tiles to keep in memory.
+    """
+
+    def __init__(self, data, tile_size=256, cache_size=256):
+        if data.ndim not in (2, 3):
+            raise ValueError('Image data must have 2 or 3 dimensions')
+        self._data = data
+        self._tile_size = int(tile_size)
+        self._cache_size = int(cache_size)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Shapes (rows, columns) of the levels
+        shape = data.shape[:2]
+        self._shapes = [shape]
+        while max(shape) > self._tile_size:
+            shape = tuple([(n + 1) // 2 for n in shape])
+            self._shapes.append(shape)
+
+    @property
+    def data(self):
+        """ The image data at level 0 """
+        return self._data
+
+    @property
+    def tile_size(self):
+        return self._tile_size
+
+    @property
+    def n_levels(self):
+        return len(self._shapes)
+
+    def level_shape(self, level):
+        """ The shape (rows, columns) of the image at the given level """
+        return self._shapes[level]
+
+    def n_tiles(self, level):
+        """ The number of tiles (rows, columns) at the given level """
+        t = self._tile_size
+        return tuple([(n + t - 1) // t for n in self._shapes[level]])
+
+    def tile_rect(self, level, row, col):
+        """ The area (x, y, width, height) covered by a tile, in pixels of
+        level 0.
+        """
+        t = self._tile_size
+        rows, cols = self._shapes[level]
+        scale = 2 ** level
+        h, w = min(t, rows - row * t), min(t, cols - col * t)
+        return (col * t * scale, row * t * scale, w * scale, h * scale)
+
+    def get_tile(self, level, row, col):
+        """ Get the data of a tile, with the dtype of the image.
+        """
+        t = self._tile_size
+        if level == 0:
+            return np.array(self._data[row * t:(row + 1) * t,
+                                       col * t:(col + 1) * t])
+        key = level, row, col
+        with self._lock:
+            tile = self._cache.pop(key, None)
+            if tile is not None:
+                self._cache[key] = tile
+                return tile
+        # Stitch the (up to four) tiles below, and take the mean of 2x2
+        # pixels, repeating the last row or column of odd-sized parts
+        below = self.n_tiles(level - 1)
+        parts = [[self.get_tile(level - 1, r, c)
+                  for c in range(2 * col, min(2 * col + 2, below[1]))]
+                 for r in range(2 * row, min(2 * row + 2, below[0]))]
+        block = np.concatenate([np.concatenate(p, axis=1) for p in parts])
+        block = block.astype(np.float32)
+        if block.shape[0] % 2:
+            block = np.concatenate([block, block[-1:]], axis=0)
+        if block.shape[1] % 2:
+            block = np.concatenate([block, block[:, -1:]], axis=1)
+        tile = (block[0::2, 0::2] + block[1::2, 0::2] +
+                block[0::2, 1::2] + block[1::2, 1::2]) / 4.
+        if self._data.dtype.kind in 'iub':
+            tile = np.round(tile)
+        tile = tile.astype(self._data.dtype)
+        with self._lock:
+            self._cache[key] = tile
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return tile
+
+
+class _LoadQueue(object):
+    # The tiles to load and the loaded tiles, shared by a _TileLoader
+    # and its thread
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.wanted = []
+        self.loading = None
+        self.loaded = []
+        self.stopped = False
+
+    def stop(self, *args):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+def _load_tiles(loader_ref, queue):
+    # Thread function of a _TileLoader. It only holds the loader by
+    # weakref, so that the thread ends when the loader is deleted.
+    while True:
+        with queue.condition:
+            while not queue.wanted and not queue.stopped:
+                queue.condition.wait()
+            if queue.stopped:
+                return
+            key = queue.loading = queue.wanted.pop(0)
+        loader = loader_ref()
+        if loader is None:
+            return
+        data = loader._pyramid.get_tile(*key)
+        del loader
+        with queue.condition:
+            queue.loaded.append((key, data))
+            queue.loading = None
+
+
+class _TileLoader(object):
+    """ Loads tiles from an ImagePyramid, in a background thread if
+    threaded. The tiles to load are replaced on each request, so that
+    tiles that are no longer needed are not loaded. The thread stops
+    when the loader is stopped or deleted.
+    """
+
+    def __init__(self, pyramid, threaded=True):
+        self._pyramid = pyramid
+        self._queue = queue = _LoadQueue()
+        self._thread = None
+        if threaded:
+            loader_ref = weakref.ref(self, queue.stop)
+            self._thread = threading.Thread(target=_load_tiles,
+                                            args=(loader_ref, queue))
+            self._thread.daemon = True
+            self._thread.start()
+
+    @property
+    def busy(self):
+        """ Whether there are tiles to be loaded, or tiles that were
+        loaded and not yet returned by request().
+        """
+        queue = self._queue
+        with queue.condition:
+            return bool(queue.wanted or queue.loading or queue.loaded)
+
+    def request(self, keys):
+        """ Set the tiles to load, as (level, row, col) tuples in order
+        of priority, and return a list of (key, data) for the tiles that
+        were loaded since the last call.
+        """
+        if self._thread is None:
+            return [(key, self._pyramid.get_tile(*key)) for key in keys]
+        queue = self._queue
+        with queue.condition:
+            loaded, queue.loaded = queue.loaded, []
+            done = [key for key, data in loaded] + [queue.loading]
+            queue.wanted = [key for key in keys if key not in done]
+            queue.condition.notify()
+        return loaded
+
+    def stop(self):
+        """ Stop the background thread """
+        self._queue.stop()
+
+
+class TiledImageVisual(Visual):
+    """ Visual that displays a large image as a set of tiles.
+
+    The image is split into tiles of a pyramid of downsampled images (see
+    ImagePyramid). On each draw, the level with about one pixel per screen
+    pixel is selected, and only the tiles that are in view are drawn. The
+    tiles are loaded in a background thread; until a tile is loaded, the
+    area is drawn with a coarser tile. The textures of the most recently
+    used tiles are kept on the GPU, up to a memory budget.
+
+    Parameters
+    ----------
+    data : ndarray
+        Image data of shape (M, N), (M, N, 3), or (M, N, 4). Can be a
+        ``np.memmap`` for images that do not fit in memory.
+    tile_size : int
+        The size of the (square) tiles in pixels.
+    cmap : str | ColorMap
+        Colormap to use for luminance images.
+    clim : str | tuple
+        Limits to use for the colormap. Can be 'auto' to use the min and
+        max of the coarsest level of the pyramid.
+    gpu_budget : int
+        The maximum number of bytes of tile textures to keep on the GPU.
+        The tiles that are in view are always kept.
+    threaded : bool
+        Whether to load tiles in a background thread.
+
+    Notes
+    -----
+    Levels and visible tiles can only be determined for linear transforms.
+    With other transforms, the coarsest level is drawn.
+    """
+    def __init__(self, data, tile_size=256, cmap='cubehelix', clim='auto',
+                 gpu_budget=256 * 1024 ** 2, threaded=True, **kwargs):
+        super(TiledImageVisual, self).__init__(**kwargs)
+        self._program = ModularProgram(VERT_SHADER, FRAG_SHADER)
+        self._program['a_position'] = np.array([[0, 0], [1, 0], [0, 1],
+                                                [1, 1]], np.float32)
+        self._clim_func = Function(_apply_clim)
+        self._tile_size = tile_size
+        self._threaded = threaded
+        self.gpu_budget = gpu_budget
+        self._pyramid = None
+        self._loader = None
+        # Resident tiles: (level, row, col) -> (texture, nbytes), from
+        # least to most recently used
+        self._tiles = OrderedDict()
+        self._tiles_nbytes = 0
+        self._scale = None
+        self._clim = None
+        self._auto_clim = None  # min and max of the top tile
+        self.clim = clim
+        self.cmap = cmap
+        self.set_data(data)
+
+    def set_data(self, data):
+        """ Set the image data.
+
+        Parameters
+        ----------
+        data : ndarray
+            Image data of shape (M, N), (M, N, 3), or (M, N, 4).
+        """
+        if self._loader is not None:
+            self._loader.stop()
+        for texture, nbytes in self._tiles.values():
+            texture.delete()
+        self._tiles.clear()
+        self._tiles_nbytes = 0
+        self._auto_clim = None
+        self._pyramid = ImagePyramid(data, self._tile_size)
+        self._loader = _TileLoader(self._pyramid, self._threaded)
+
+        if data.ndim == 2 or data.shape[2] == 1:
+            dtype = data.dtype
+            if dtype not in _luminance_formats:
+                dtype = np.dtype(np.float32)
+            self._internalformat, self._scale = _luminance_formats[dtype]
+            fun = FunctionChain(None, [Function(_c2l), self._clim_func,
+                                       Function(self._cmap.glsl_map)])
+        else:
+            self._internalformat = self._scale = None
+            fun = Function(_null_color_transform)
+        self._program.frag['color_transform'] = fun
+        self._update_clim()
+        self.update()
+
+    @property
+    def pyramid(self):
+        """ The ImagePyramid of the image """
+        return self._pyramid
+
+    @property
+    def clim(self):
+        return (self._clim if isinstance(self._clim, string_types) else
+                tuple(self._clim))
+
+    @clim.setter
+    def clim(self, clim):
+        if isinstance(clim, string_types):
+            if clim != 'auto':
+                raise ValueError('clim must be "auto" if a string')
+        else:
+            clim = np.array(clim, float)
+            if clim.shape != (2,):
+                raise ValueError('clim must have two elements')
+        self._clim = clim
+        self._update_clim()
+        self.update()
+
+    @property
+    def cmap(self):
+        return self._cmap
+
+    @cmap.setter
+    def cmap(self, cmap):
+        self._cmap = get_colormap(cmap)
+        if self._scale is not None:
+            self._program.frag['color_transform'] = FunctionChain(
+                None, [Function(_c2l), self._clim_func,
+                       Function(self._cmap.glsl_map)])
+        self.update()
+
+    @property
+    def size(self):
+        return self._pyramid.data.shape[:2][::-1]
+
+    @property
+    def n_resident(self):
+        """ The number of tiles that have a texture on the GPU """
+        return len(self._tiles)
+
+    def _update_clim(self):
+        """ Set the contrast limits in the shader. With clim='auto', this
+        waits until the top tile of the pyramid is loaded.
+        """
+        if self._scale is None:
+            return
+        clim = self._clim
+        if isinstance(clim, string_types):
+            clim = self._auto_clim
+            if clim is None:
+                return
+        self._clim_func['clim'] = tuple(np.array(clim, float) / self._scale)
+
+    def _visible_tiles(self, transforms):
+        """ Return the level to draw and the tiles (level, row, col) of
+        that level that are in view.
+        """
+        pyramid = self._pyramid
+        top = pyramid.n_levels - 1
+        full_tr = transforms.get_full_transform()
+        if not full_tr.Linear:
+            return top, [(top, 0, 0)]
+
+        # Framebuffer pixels per image pixel
+        px = transforms.document_to_framebuffer.map(
+            transforms.visual_to_document.map([(0, 0), (1, 0), (0, 1)]))
+        scale = max(np.sqrt(((px[1:, :2] - px[0, :2]) ** 2).sum(axis=1)))
+        level = 0
+        if scale > 0:
+            level = int(np.clip(np.floor(-np.log2(scale)), 0, top))
+
+        # Area in view
+        corners = full_tr.imap([(-1, -1), (1, -1), (-1, 1), (1, 1)])
+        corners = corners[:, :2] / corners[:, 3:4]
+        x0, y0 = corners.min(axis=0)
+        x1, y1 = corners.max(axis=0)
+        size = pyramid.tile_size * 2 ** level
+        n_rows, n_cols = pyramid.n_tiles(level)
+        c0, c1 = [int(np.clip(np.floor(x / size), 0, n_cols))
+                  for x in (x0, x1 + size)]
+        r0, r1 = [int(np.clip(np.floor(y / size), 0, n_rows))
+                  for y in (y0, y1 + size)]
+        return level, [(level, r, c) for r in range(r0, r1)
+                       for c in range(c0, c1)]
+
+    def _fallback(self, key):
+        """ The nearest resident tile above the given tile, or None """
+        level, row, col = key
+        while level < self._pyramid.n_levels - 1:
+            level, row, col = level + 1, row // 2, col // 2
+            if (level, row, col) in self._tiles:
+                return level, row, col
+        return None
+
+    def _add_tile(self, key, data):
+        if data.dtype == np.float64 or (self._scale is not None and
+                                        data.dtype not in _luminance_formats):
+            data = data.astype(np.float32)
+        texture = Texture2D(data, internalformat=self._internalformat)
+        self._tiles[key] = texture, data.nbytes
+        self._tiles_nbytes += data.nbytes
+
+    def _evict(self, keep):
+        """ Delete the least recently used textures that are not in keep,
+        until the textures fit in the budget.
+        """
+        for key in list(self._tiles.keys()):
+            if self._tiles_nbytes <= self.gpu_budget:
+                break
+            if key in keep:
+                continue
+            texture, nbytes = self._tiles.pop(key)
+            texture.delete()
+            self._tiles_nbytes -= nbytes
+
+    def bounds(self, mode, axis):
+        if axis > 1:
+            return (0, 0)
+        return (0, self.size[axis])
+
+    def draw(self, transforms):
+        level, visible = self._visible_tiles(transforms)
+        top = (self._pyramid.n_levels - 1, 0, 0)
+
+        # Request the missing tiles; the top tile is always loaded, so
+        # that there is a fallback for all tiles
+        wanted = [top] + visible
+        missing = [key for key in wanted if key not in self._tiles]
+        for key, data in self._loader.request(missing):
+            self._add_tile(key, data)
+            if key == top and self._scale is not None:
+                self._auto_clim = data.min(), data.max()
+                self._update_clim()
+        if self._loader.busy:
+            self.update()  # draw again when the tiles are loaded
+
+        # The tiles to draw: coarser tiles in place of missing ones
+        # first, then the resident tiles of the selected level
+        fallbacks = set()
+        for key in visible:
+            if key not in self._tiles:
+                fallback = self._fallback(key)
+                if fallback is not None:
+                    fallbacks.add(fallback)
+        keys = sorted(fallbacks, reverse=True)
+        keys += [key for key in visible if key in self._tiles]
+        for key in keys:
+            # Mark as most recently used
+            self._tiles[key] = self._tiles.pop(key)
+        self._evict(set(keys + [top]))
+        if self._scale is not None and isinstance(self._clim, string_types):
+            if self._auto_clim is None:
+                return  # no limits yet
+
+        set_state(cull_face='front_and_back')
+        self._program.vert['transform'] = transforms.get_full_transform()
+        for key in keys:
+            self._program['u_texture'] = self._tiles[key][0]
+            self._program['u_rect'] = self._pyramid.tile_rect(*key)
+            self._program.draw('triangle_strip')
@@ -32,15 +32,36 @@ output for rays that are faced in the wrong direction, allowing us to
 discard the front-facing sides of the cuboid by discarting fragments for
 which the number of steps is very small.
 
+The data is uploaded in its own dtype (when the GPU supports it), and the
+contrast limits are applied when sampling, so changing them does not
+require an upload.
+
+Bricked volumes
+---------------
+
+Volumes that are larger than the GPU can hold can be split into bricks.
+The minimum and maximum of each brick is computed up front. The bricks
+that are not empty under the current contrast limits (or threshold, for
+the 'iso' method) and that are in view are uploaded to slots of an atlas
+texture, as far as they fit. A small brick table texture holds the slot
+of each brick, or marks it as empty. When sampling, the position in the
+volume is looked up in the table and mapped into the atlas, and the ray
+caster skips the steps that are in empty bricks. The data of a brick is
+only read when it is uploaded, so the volume can be a memmap.
+
 """
 
+from __future__ import division
+
+import numpy as np
+
 from ..gloo import Texture3D, TextureEmulated3D, VertexBuffer, IndexBuffer
+from ..ext.ordereddict import OrderedDict
 from . import Visual
 from .shaders import Function, ModularProgram
+from .image import _luminance_formats
 from ..color import get_colormap
 
-import numpy as np
-
 # todo: implement more render methods (port from visvis)
 # todo: allow anisotropic data
 # todo: what to do about lighting? ambi/diffuse/spec/shinynes on each visual?
@@ -149,6 +170,14 @@ void main() {{
         {{
             // Calculate location and sample color
             vec3 loc = edgeloc + float(iter) * ray;
+            
+            // Skip the part of the ray that is in empty space
+            int skip = $skip_steps(loc, -ray);
+            if (skip > 0) {{
+                iter -= skip;
+                continue;
+            }}
+            
             vec4 color = $sample(u_volumetex, loc);
             float val = color.g;
             
@@ -363,6 +392,260 @@ ISO_FRAG_SHADER = FRAG_SHADER.format(**ISO_SNIPPETS)
 
 frag_dict = {'mip': MIP_FRAG_SHADER, 'iso': ISO_FRAG_SHADER}
 
+# Map sampled values to 0..1 with the contrast limits (in units of the
+# sampled values)
+_apply_clim = """
+    vec4 apply_clim(vec4 color) {
+        if ($clim.y == $clim.x) {
+            return vec4(vec3(greaterThan(color.rgb, vec3($clim.x))),
+                        color.a);
+        }
+        return vec4(clamp((color.rgb - $clim.x) / ($clim.y - $clim.x),
+                          0.0, 1.0), color.a);
+    }
+"""
+
+# Sample a texture that holds the whole volume. The sampler type is
+# filled in with the %-operator.
+_sample_texture = """
+    vec4 sample_texture(%s tex, vec3 loc) {
+        return $clim($sample(tex, loc));
+    }
+"""
+
+_skip_none = """
+    int skip_none(vec3 loc, vec3 step) {
+        return 0;
+    }
+"""
+
+# Sample a bricked volume: look up the slot of the brick in the atlas
+_sample_bricked = """
+    vec4 sample_bricked(sampler3D atlas, vec3 loc) {
+        // The brick that holds this location (in voxels)
+        vec3 voxel = loc * $shape - 0.5;
+        vec3 brick = clamp(floor(voxel / $brick_size), vec3(0.0),
+                           $grid - 1.0);
+        vec4 entry = texture3D($table, (brick + 0.5) / $grid);
+        if (entry.a < 0.5) {
+            // Empty, or not loaded
+            return vec4(0.0, 0.0, 0.0, 1.0);
+        }
+        // Bricks have a border of one voxel in the atlas, so that they
+        // can be interpolated up to the next brick
+        vec3 slot = floor(entry.rgb * 255.0 + 0.5);
+        vec3 local = clamp(voxel - brick * $brick_size + 0.5,
+                           0.5, $brick_size + 0.5);
+        vec3 coord = (slot * ($brick_size + 1.0) + local) / $atlas_shape;
+        return $clim(texture3D(atlas, coord));
+    }
+"""
+
+# The number of steps that a ray stays in the current brick, if that
+# brick is empty
+_skip_bricked = """
+    int skip_bricked(vec3 loc, vec3 step) {
+        vec3 voxel = loc * $shape - 0.5;
+        vec3 brick = clamp(floor(voxel / $brick_size), vec3(0.0),
+                           $grid - 1.0);
+        if (texture3D($table, (brick + 0.5) / $grid).a > 0.5) {
+            return 0;
+        }
+        // The first bricks extend to the edge of the volume
+        vec3 lo = brick * $brick_size - 0.5 * vec3(lessThan(brick, vec3(0.5)));
+        vec3 hi = (brick + 1.0) * $brick_size;
+        vec3 d = step * $shape;
+        d += vec3(equal(d, vec3(0.0))) * 1e-9;
+        vec3 t = max((lo - voxel) / d, (hi - voxel) / d);
+        return int(max(min(t.x, min(t.y, t.z)), 0.0));
+    }
+"""  # noqa
+
+
+def _texture_format(dtype, nchannels):
+    """ Get the dtype to upload volume data with, the internal format of
+    the texture, and the scale between data values and sampled values.
+    """
+    dtype = np.dtype(dtype)
+    if nchannels == 1:
+        if dtype not in _luminance_formats:
+            dtype = np.dtype(np.float32)
+        return (dtype,) + _luminance_formats[dtype]
+    elif dtype == np.uint8:
+        return dtype, None, 255.
+    internalformat = ('rg32f', 'rgb32f', 'rgba32f')[nchannels - 2]
+    return np.dtype(np.float32), internalformat, 1.
+
+
+class _BrickAtlas(object):
+    """ The bricks of a volume, and the textures to draw them from.
+
+    The volume is split into cubes of ``brick_size`` voxels, which have
+    one extra voxel of the next brick so that they can be interpolated
+    seamlessly. The bricks that are needed for drawing are uploaded to
+    the slots of an atlas texture, evicting bricks that are not needed
+    if the atlas is full. The table texture holds the slot of each brick
+    (rgb), and whether it is to be drawn (alpha).
+
+    Parameters
+    ----------
+    data : ndarray
+        The volume (ZYX), e.g. a memmap. Bricks are read when they are
+        uploaded.
+    brick_size : int
+        The size of the bricks in voxels.
+    budget : int
+        The maximum size of the atlas in bytes.
+    """
+
+    def __init__(self, data, brick_size, budget):
+        self.data = data
+        self.brick_size = b = int(brick_size)
+        self.shape = data.shape[:3]
+        self.grid = tuple(-(-s // b) for s in self.shape)
+        self.dtype, internalformat, self.scale = \
+            _texture_format(data.dtype, 1)
+        self._compute_stats()
+
+        # Arrange the slots in a grid of about the same size in x, y, z
+        block = b + 1
+        n_bricks = int(np.prod(self.grid))
+        brick_bytes = block ** 3 * self.dtype.itemsize
+        self.capacity = int(max(1, min(n_bricks, budget // brick_bytes)))
+        nx = int(np.ceil(self.capacity ** (1. / 3) - 1e-6))
+        ny = min(nx, -(-self.capacity // nx))
+        nz = -(-self.capacity // (nx * ny))
+        self.slots = nz, ny, nx
+        self.atlas = Texture3D((nz * block, ny * block, nx * block),
+                               interpolation='linear',
+                               wrapping='clamp_to_edge',
+                               internalformat=internalformat)
+        self._table = np.zeros(self.grid + (4,), np.uint8)
+        self.table = Texture3D(self._table, interpolation='nearest',
+                               wrapping='clamp_to_edge')
+
+        # Brick index -> slot, least recently used first
+        self._resident = OrderedDict()
+        self._free = list(range(self.capacity))[::-1]
+        self.n_uploads = 0
+
+    def _compute_stats(self):
+        """ Get the minimum and maximum of each brick (including the
+        voxels it shares with the next one), and the mean of the volume.
+        The data is read one layer of bricks at a time.
+        """
+        b = self.brick_size
+        self.mins = np.empty(self.grid)
+        self.maxs = np.empty(self.grid)
+        total = 0.
+        for k in range(self.grid[0]):
+            slab = np.asarray(self.data[k * b:(k + 1) * b + 1])
+            total += slab[:b].sum(dtype=np.float64)
+            slab_min, slab_max = slab.min(axis=0), slab.max(axis=0)
+            for j in range(self.grid[1]):
+                for i in range(self.grid[2]):
+                    area = (slice(j * b, (j + 1) * b + 1),
+                            slice(i * b, (i + 1) * b + 1))
+                    self.mins[k, j, i] = slab_min[area].min()
+                    self.maxs[k, j, i] = slab_max[area].max()
+        self.mean = total / np.prod(self.shape)
+
+    @property
+    def n_resident(self):
+        """ The number of bricks in the atlas.
+        """
+        return len(self._resident)
+
+    def brick_bounds(self):
+        """ Get the extent of each brick in visual coordinates (x, y, z),
+        as two arrays of shape grid + (3,).
+        """
+        b = self.brick_size
+        edges = [np.minimum(np.arange(g + 1) * b, s) - 0.5
+                 for g, s in zip(self.grid, self.shape)]
+        z, y, x = np.meshgrid(edges[0][:-1], edges[1][:-1], edges[2][:-1],
+                              indexing='ij')
+        lo = np.concatenate([x[..., np.newaxis], y[..., np.newaxis],
+                             z[..., np.newaxis]], axis=-1)
+        z, y, x = np.meshgrid(edges[0][1:], edges[1][1:], edges[2][1:],
+                              indexing='ij')
+        hi = np.concatenate([x[..., np.newaxis], y[..., np.newaxis],
+                             z[..., np.newaxis]], axis=-1)
+        return lo, hi
+
+    def _slot_position(self, slot):
+        """ Position of a slot in the grid of slots (x, y, z).
+        """
+        nz, ny, nx = self.slots
+        return slot % nx, (slot // nx) % ny, slot // (nx * ny)
+
+    def _upload(self, index, slot):
+        b = self.brick_size
+        area = tuple(slice(i * b, (i + 1) * b + 1) for i in index)
+        data = np.asarray(self.data[area], dtype=self.dtype)
+        pad = [(0, b + 1 - s) for s in data.shape]
+        if any(p[1] for p in pad):
+            data = np.pad(data, pad, mode='edge')
+        x, y, z = self._slot_position(slot)
+        self.atlas.set_data(data, offset=(z * (b + 1), y * (b + 1),
+                                          x * (b + 1)), copy=True)
+        self._resident[index] = slot
+        self.n_uploads += 1
+
+    def update(self, needed, max_uploads=64):
+        """ Upload the needed bricks that are not in the atlas yet, as
+        far as they fit, and update the brick table.
+
+        Parameters
+        ----------
+        needed : ndarray
+            Boolean array of the shape of the grid.
+        max_uploads : int
+            The maximum number of bricks to upload.
+
+        Returns
+        -------
+        more : bool
+            Whether there are bricks left that can be uploaded.
+        """
+        indices = list(zip(*np.nonzero(needed)))
+        keep = set(indices)
+        missing = []
+        for index in indices:
+            if index in self._resident:
+                # Mark as recently used
+                self._resident[index] = self._resident.pop(index)
+            else:
+                missing.append(index)
+
+        n_uploads = 0
+        for index in missing:
+            if n_uploads == max_uploads:
+                break
+            if self._free:
+                slot = self._free.pop()
+            else:
+                old = next((key for key in self._resident
+                            if key not in keep), None)
+                if old is None:
+                    break  # the atlas is full of needed bricks
+                slot = self._resident.pop(old)
+            self._upload(index, slot)
+            n_uploads += 1
+
+        table = np.zeros_like(self._table)
+        for index, slot in self._resident.items():
+            if index in keep:
+                table[index] = self._slot_position(slot) + (255,)
+        if not np.array_equal(table, self._table):
+            self._table = table
+            self.table.set_data(table)
+        return n_uploads == max_uploads and len(missing) > n_uploads
+
+    def delete(self):
+        self.atlas.delete()
+        self.table.delete()
+
 
 class VolumeVisual(Visual):
     """ Displays a 3D Volume
@@ -390,13 +673,27 @@ class VolumeVisual(Visual):
     emulate_texture : bool
         Use 2D textures to emulate a 3D texture. OpenGL ES 2.0 compatible,
         but has lower performance on desktop platforms.
+    brick_size : int | None
+        If given, the volume is split into bricks of this size (in voxels),
+        which are uploaded when they are needed, and empty bricks are
+        skipped during raycasting. The volume must have one channel, and
+        can be a memmap. Cannot be combined with emulate_texture.
+    gpu_budget : int
+        The maximum number of bytes to use for the bricks on the GPU.
+        Bricks that do not fit are not drawn. Default 256 MB.
     """
 
     def __init__(self, vol, clim=None, method='mip', threshold=None, 
                  relative_step_size=0.8, cmap='grays',
-                 emulate_texture=False):
+                 emulate_texture=False, brick_size=None,
+                 gpu_budget=256 * 1024 ** 2):
         Visual.__init__(self)
-        tex_cls = TextureEmulated3D if emulate_texture else Texture3D
+        if brick_size is not None and emulate_texture:
+            raise ValueError('Bricked volumes cannot use emulated 3D '
+                             'textures.')
+        self._emulate_texture = emulate_texture
+        self._brick_size = brick_size
+        self._gpu_budget = gpu_budget
 
         # Storage of information of volume
         self._vol_shape = ()
@@ -408,12 +705,19 @@ class VolumeVisual(Visual):
 
         # Create gloo objects
         self._vbo = None
-        self._tex = tex_cls((10, 10, 10), interpolation='linear', 
-                            wrapping='clamp_to_edge')
+        self._tex = None
+        self._tex_format = None
+        self._bricks = None
+
+        # The functions to sample the volume with, and that apply the
+        # contrast limits
+        self._clim_func = Function(_apply_clim)
+        self._sample_func = None
+        self._skip_func = None
+        self._scale = None
 
         # Create program
         self._program = ModularProgram(VERT_SHADER)
-        self._program['u_volumetex'] = self._tex
         self._index_buffer = None
         
         # Set data
@@ -422,7 +726,10 @@ class VolumeVisual(Visual):
         # Set params
         self.method = method
         self.relative_step_size = relative_step_size
-        self.threshold = threshold if (threshold is not None) else vol.mean()
+        if threshold is None:
+            mean = vol.mean() if self._bricks is None else self._bricks.mean
+            threshold = self._normalize(mean)
+        self.threshold = threshold
     
     def set_data(self, vol, clim=None):
         """ Set the volume data. 
@@ -432,6 +739,8 @@ class VolumeVisual(Visual):
             raise ValueError('Volume visual needs a numpy array.')
         if not ((vol.ndim == 3) or (vol.ndim == 4 and vol.shape[-1] <= 4)):
             raise ValueError('Volume visual needs a 3D image.')
+        if self._brick_size is not None and vol.ndim != 3:
+            raise ValueError('Bricked volumes must have one channel.')
         
         # Handle clim
         if clim is not None:
@@ -439,29 +748,111 @@ class VolumeVisual(Visual):
             if not (clim.ndim == 1 and clim.size == 2):
                 raise ValueError('clim must be a 2-element array-like')
             self._clim = tuple(clim)
-        if self._clim is None:
-            self._clim = vol.min(), vol.max()
-        
-        # Apply clim
-        vol = np.array(vol, dtype='float32', copy=False)
-        vol -= self._clim[0]
-        vol *= 1.0 / (self._clim[1] - self._clim[0])
         
         # Apply to texture
-        self._tex.set_data(vol)  # will be efficient if vol is same shape
+        if self._brick_size is None:
+            self._build_texture(vol)
+        else:
+            self._build_bricks(vol)
+        if self._clim is None:
+            if self._bricks is None:
+                self._clim = vol.min(), vol.max()
+            else:
+                self._clim = self._bricks.mins.min(), self._bricks.maxs.max()
+        self._update_clim()
         self._program['u_shape'] = vol.shape[2], vol.shape[1], vol.shape[0]
         self._vol_shape = vol.shape[:3]
         
         # Create vertices?
         if self._index_buffer is None:
             self._create_vertex_data()
+
+    def _build_texture(self, vol):
+        """ Upload the volume in its own dtype if possible, reusing the
+        texture if its format allows.
+        """
+        nchannels = vol.shape[3] if vol.ndim == 4 else 1
+        dtype, internalformat, self._scale = \
+            _texture_format(vol.dtype, nchannels)
+        vol = np.asarray(vol, dtype=dtype)
+        tex_format = internalformat, vol.shape[3:]
+        if self._tex is None or self._tex_format != tex_format:
+            tex_cls = TextureEmulated3D if self._emulate_texture \
+                else Texture3D
+            self._tex = tex_cls(vol, interpolation='linear',
+                                wrapping='clamp_to_edge',
+                                internalformat=internalformat)
+            self._tex_format = tex_format
+            self._program['u_volumetex'] = self._tex
+            code = _sample_texture % self._tex.glsl_sampler_type
+            self._sample_func = Function(code)
+            self._sample_func['sample'] = self._tex.glsl_sample
+            self._sample_func['clim'] = self._clim_func
+            self._skip_func = Function(_skip_none)
+            self._set_sample_functions()
+        else:
+            self._tex.set_data(vol)  # will be efficient if same shape
+
+    def _build_bricks(self, vol):
+        """ Split the volume in bricks; these are uploaded when drawing.
+        """
+        if self._bricks is not None:
+            self._bricks.delete()
+        self._bricks = bricks = _BrickAtlas(vol, self._brick_size,
+                                            self._gpu_budget)
+        self._tex = bricks.atlas
+        self._scale = bricks.scale
+        self._program['u_volumetex'] = self._tex
+        self._sample_func = Function(_sample_bricked)
+        self._skip_func = Function(_skip_bricked)
+        for func in (self._sample_func, self._skip_func):
+            func['shape'] = tuple(float(s) for s in bricks.shape[::-1])
+            func['grid'] = tuple(float(g) for g in bricks.grid[::-1])
+            func['brick_size'] = float(bricks.brick_size)
+            func['table'] = bricks.table
+        atlas_shape = bricks.atlas.shape[:3]
+        self._sample_func['atlas_shape'] = tuple(float(s) for s in
+                                                 atlas_shape[::-1])
+        self._sample_func['clim'] = self._clim_func
+        self._set_sample_functions()
+
+    def _set_sample_functions(self):
+        if self._program.frag is None:
+            return
+        self._program.frag['sampler_type'] = self._tex.glsl_sampler_type
+        self._program.frag['sample'] = self._sample_func
+        self._program.frag['skip_steps'] = self._skip_func
+
+    def _update_clim(self):
+        """ Set the contrast limits in the shader (in units of the
+        sampled texture values).
+        """
+        clim = np.array(self._clim, dtype=np.float32)
+        self._clim_func['clim'] = tuple(clim / self._scale)
+
+    def _normalize(self, value):
+        """ Map data values to 0..1 with the contrast limits, as done
+        when sampling (without clipping).
+        """
+        c0, c1 = self._clim
+        if c1 == c0:
+            return (np.asarray(value) > c0).astype(float)
+        return (np.asarray(value, float) - c0) / (c1 - c0)
     
     @property
     def clim(self):
-        """ The contrast limits that were applied to the volume data.
-        Settable via set_data().
+        """ The contrast limits that are applied to the volume data.
         """
         return self._clim
+
+    @clim.setter
+    def clim(self, clim):
+        clim = np.array(clim, float)
+        if not (clim.ndim == 1 and clim.size == 2):
+            raise ValueError('clim must be a 2-element array-like')
+        self._clim = tuple(clim)
+        self._update_clim()
+        self.update()
     
     @property
     def cmap(self):
@@ -500,14 +891,14 @@ class VolumeVisual(Visual):
 
         self._program.frag = frag_dict[method]
         self._program.frag['calculate_steps'] = Function(calc_steps)
-        self._program.frag['sampler_type'] = self._tex.glsl_sampler_type
-        self._program.frag['sample'] = self._tex.glsl_sample
+        self._set_sample_functions()
         self._program.frag['cmap'] = Function(self._cmap.glsl_map)
         self.update()
     
     @property
     def threshold(self):
         """ The threshold value to apply for the isosurface render method.
+        This applies to the values after mapping with the contrast limits.
         """
         return self._threshold
     
@@ -609,6 +1000,36 @@ class VolumeVisual(Visual):
         self._index_buffer = IndexBuffer(indices)
         self._vertex_cache_id = vertex_cache_id
     
+    def _visible_bricks(self, transforms):
+        """ Get which bricks have corners in view, or behind the camera.
+        """
+        lo, hi = self._bricks.brick_bounds()
+        corners = np.ones(lo.shape[:3] + (8, 4))
+        for i in range(8):
+            corner = np.where([i & 1, i & 2, i & 4], hi, lo)
+            corners[..., i, :3] = corner
+        tr = transforms.get_full_transform()
+        pos = tr.map(corners.reshape(-1, 4)).reshape(corners.shape)
+        w = pos[..., 3]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ndc = pos[..., :2] / w[..., np.newaxis]
+        in_view = ((ndc.min(axis=-2) <= 1) &
+                   (ndc.max(axis=-2) >= -1)).all(axis=-1)
+        return in_view | (w <= 0).any(axis=-1)
+
+    def _needed_bricks(self, transforms):
+        """ Get the bricks that are in view and not empty under the
+        current contrast limits (and threshold, for 'iso').
+        """
+        bricks = self._bricks
+        lo = self._normalize(bricks.mins)
+        hi = self._normalize(bricks.maxs)
+        threshold = 0.
+        if self._method == 'iso':
+            threshold = self._threshold
+        not_empty = np.clip(np.maximum(lo, hi), 0, 1) > threshold
+        return not_empty & self._visible_bricks(transforms)
+
     def bounds(self, mode, axis):
         # Not sure if this is right. Do I need to take the transform if this
         # node into account?
@@ -635,5 +1056,10 @@ class VolumeVisual(Visual):
         if self._method == 'iso':
             self._program['u_threshold'] = self._threshold
         
+        # Upload the bricks that are needed
+        if self._bricks is not None:
+            if self._bricks.update(self._needed_bricks(transforms)):
+                self.update()
+        
         # Draw!
         self._program.draw('triangle_strip', self._index_buffer)